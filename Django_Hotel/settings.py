@@ -60,6 +60,7 @@ INSTALLED_APPS = [
     'dashboard',
     'chatbot',
     'presence',
+    'sequences',
 ]
 
 MIDDLEWARE = [
@@ -179,9 +180,52 @@ EMAIL_USE_TLS = True
 
 # Lookup API Token
 LOOKUP_API_TOKEN = config('LOOKUP_API_TOKEN')
+# Consulta de documentos (ver reservations/document_lookup.py): proveedor, timeout en segundos,
+# conexiones keep-alive por host y validez de la caché (encontrados / no encontrados)
+LOOKUP_PROVIDER = config('LOOKUP_PROVIDER', default='reservations.document_lookup.HttpProvider')
+LOOKUP_TIMEOUT = config('LOOKUP_TIMEOUT', default=5, cast=float)
+LOOKUP_POOL_SIZE = config('LOOKUP_POOL_SIZE', default=4, cast=int)
+LOOKUP_CACHE_TTL = config('LOOKUP_CACHE_TTL', default=30 * 24 * 3600, cast=int)
+LOOKUP_NEGATIVE_TTL = config('LOOKUP_NEGATIVE_TTL', default=3600, cast=int)
 
 # Google Gemini API Key
 GEMINI_API_KEY = config('GEMINI_API_KEY')
+# Modelo preferido del chatbot (opcional; si no, se prueba la lista de chatbot/gemini.py)
+GEMINI_MODEL = config('GEMINI_MODEL', default=None)
+# Snapshot del hotel para el chatbot: alias de caché y segundos de validez (ver chatbot/context.py)
+CHATBOT_CONTEXT_CACHE_ALIAS = config('CHATBOT_CONTEXT_CACHE_ALIAS', default='default')
+CHATBOT_CONTEXT_TTL = config('CHATBOT_CONTEXT_TTL', default=60, cast=int)
+# Memoria de sesión del chatbot: tokens de historial reciente por petición y caracteres de la
+# transcripción acotada de turnos antiguos
+CHATBOT_HISTORY_TOKEN_BUDGET = config('CHATBOT_HISTORY_TOKEN_BUDGET', default=1500, cast=int)
+CHATBOT_SUMMARY_MAX_CHARS = config('CHATBOT_SUMMARY_MAX_CHARS', default=2000, cast=int)
+# Caché de respuestas del chatbot (entradas por proceso y segundos de validez)
+CHATBOT_RESPONSE_CACHE_SIZE = config('CHATBOT_RESPONSE_CACHE_SIZE', default=256, cast=int)
+CHATBOT_RESPONSE_CACHE_TTL = config('CHATBOT_RESPONSE_CACHE_TTL', default=300, cast=int)
+
+# Analytics de lavandería (ver lavanderia/analytics.py): días analizados, días recalculados
+# en cada refresh (cron: refresh_laundry_analytics), carga inicial y proyección de check-outs
+LAUNDRY_ANALYTICS_WINDOW_DAYS = config('LAUNDRY_ANALYTICS_WINDOW_DAYS', default=90, cast=int)
+LAUNDRY_ANALYTICS_LOOKBACK_DAYS = config('LAUNDRY_ANALYTICS_LOOKBACK_DAYS', default=3, cast=int)
+LAUNDRY_ANALYTICS_HISTORY_DAYS = config('LAUNDRY_ANALYTICS_HISTORY_DAYS', default=365, cast=int)
+LAUNDRY_ANALYTICS_FORECAST_DAYS = config('LAUNDRY_ANALYTICS_FORECAST_DAYS', default=14, cast=int)
+
+# Almacén de adjuntos de mensajería (ver messaging/attachments.py)
+MESSAGING_ATTACHMENT_STORE = config('MESSAGING_ATTACHMENT_STORE', default='messaging.attachments.LocalAttachmentStore')
+MESSAGING_ATTACHMENT_ROOT = config('MESSAGING_ATTACHMENT_ROOT', default=os.path.join(BASE_DIR, 'media', 'attachments'))
+MESSAGING_ATTACHMENT_MAX_BYTES = config('MESSAGING_ATTACHMENT_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+# Validez en segundos de las URLs firmadas de descarga de adjuntos
+MESSAGING_ATTACHMENT_URL_MAX_AGE = config('MESSAGING_ATTACHMENT_URL_MAX_AGE', default=24 * 3600, cast=int)
+
+# Números correlativos reservados por worker en cada acceso a la tabla sequences (1 = sin bloques)
+SEQUENCE_BLOCK_SIZE = config('SEQUENCE_BLOCK_SIZE', default=1, cast=int)
+
+# Caché de tokens de Firebase verificados (ver authentication/token_cache.py)
+FIREBASE_TOKEN_CACHE_SIZE = config('FIREBASE_TOKEN_CACHE_SIZE', default=1024, cast=int)
+# Alias de un caché de Django compartido entre workers (opcional, p. ej. 'default' con Redis)
+FIREBASE_TOKEN_CACHE_ALIAS = config('FIREBASE_TOKEN_CACHE_ALIAS', default=None)
+# Tolerancia de desfase de reloj al validar iat/exp (Firebase admite hasta 60 segundos)
+FIREBASE_CLOCK_SKEW_SECONDS = config('FIREBASE_CLOCK_SKEW_SECONDS', default=5, cast=int)
 
 # Ruta al archivo de service account key
 FIREBASE_CREDENTIALS_JSON = config('FIREBASE_CREDENTIALS_JSON', default=None)
@@ -233,3 +277,9 @@ else:
             'BACKEND': 'channels.layers.InMemoryChannelLayer',
         },
     }
+
+# Registro de presencia (ver presence/registry.py): Redis si hay URL o la capa de canales es Redis,
+# memoria en otro caso
+PRESENCE_REDIS_URL = config('PRESENCE_REDIS_URL', default=REDIS_URL)
+# Segundos sin ping tras los que una conexión se considera muerta
+PRESENCE_TTL_SECONDS = config('PRESENCE_TTL_SECONDS', default=90, cast=int)
@@ -27,4 +27,5 @@ urlpatterns = [
     path('api/mantenimiento/', include('mantenimiento.urls')),
     path('api/dashboard/', include('dashboard.urls')),
     path('api/chatbot/', include('chatbot.urls')),
+    path('api/presence/', include('presence.urls')),
 ]
@@ -0,0 +1,92 @@
+"""
+Caché de tokens de Firebase ya verificados.
+
+Los tokens se guardan por su hash SHA-256 (nunca el token en claro) hasta su
+claim `exp`, con desalojo LRU en memoria. Si FIREBASE_TOKEN_CACHE_ALIAS apunta
+a un caché de Django (p. ej. Redis), se usa además como backend compartido
+entre workers.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from firebase_admin import auth as firebase_auth
+
+
+class VerifiedTokenCache:
+    """Caché LRU en memoria de claims decodificados, acotada por el exp de cada token"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now=None):
+        now = now or time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            exp, claims = entry
+            if exp <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def set(self, key, claims, exp):
+        with self._lock:
+            self._entries[key] = (exp, claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local_cache = VerifiedTokenCache(getattr(settings, 'FIREBASE_TOKEN_CACHE_SIZE', 1024))
+
+
+def _token_key(token):
+    return 'firebase_token:' + hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _shared_cache():
+    alias = getattr(settings, 'FIREBASE_TOKEN_CACHE_ALIAS', None)
+    if not alias:
+        return None
+    from django.core.cache import caches
+    return caches[alias]
+
+
+def verify_id_token(token):
+    """Verifica un ID token de Firebase reutilizando verificaciones previas.
+
+    Acepta un desfase de reloj de FIREBASE_CLOCK_SKEW_SECONDS segundos en lugar
+    de reintentar tras un sleep cuando el token se usa "demasiado pronto".
+    """
+    key = _token_key(token)
+    now = time.time()
+
+    claims = _local_cache.get(key, now)
+    if claims is not None:
+        return claims
+
+    shared = _shared_cache()
+    if shared is not None:
+        claims = shared.get(key)
+        if claims is not None and claims.get('exp', 0) > now:
+            _local_cache.set(key, claims, claims['exp'])
+            return claims
+
+    skew = getattr(settings, 'FIREBASE_CLOCK_SKEW_SECONDS', 5)
+    claims = firebase_auth.verify_id_token(token, clock_skew_seconds=skew)
+    exp = claims.get('exp')
+    if exp:
+        _local_cache.set(key, claims, exp)
+        if shared is not None:
+            shared.set(key, claims, timeout=max(1, int(exp - now)))
+    return claims
@@ -0,0 +1,24 @@
+"""
+Comando de Django para reconstruir el acumulado diario de ingresos (daily_revenue)
+Ejecutar con: python manage.py rebuild_revenue_rollup [--since YYYY-MM-DD]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from cajacobros import revenue
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el acumulado diario de ingresos por fecha, método y estado desde la tabla de pagos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Recalcular solo desde esta fecha (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options.get('since'):
+            since = parse_date(options['since'])
+            if not since:
+                raise CommandError('Fecha inválida para --since')
+        self.stdout.write(self.style.SUCCESS('Reconstruyendo acumulado diario de ingresos...'))
+        buckets = revenue.rebuild(since)
+        self.stdout.write(self.style.SUCCESS(f'✓ Acumulado reconstruido: {buckets} buckets'))
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:21
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_daily_revenue(apps, schema_editor):
+    """Pobla el acumulado diario con los pagos existentes"""
+    Payment = apps.get_model('cajacobros', 'Payment')
+    DailyRevenue = apps.get_model('cajacobros', 'DailyRevenue')
+    buckets = {}
+    for p in Payment.objects.order_by().iterator():
+        if not p.created_at:
+            continue
+        key = (timezone.localtime(p.created_at).date(), p.method or '', p.status or '')
+        total, count = buckets.get(key, (Decimal('0'), 0))
+        buckets[key] = (total + (p.amount or Decimal('0')), count + 1)
+    DailyRevenue.objects.bulk_create([
+        DailyRevenue(date=day, method=method, status=status, total=total, count=count)
+        for (day, method, status), (total, count) in buckets.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cajacobros', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('method', models.CharField(max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'daily_revenue',
+                'ordering': ['-date', 'method'],
+                'unique_together': {('date', 'method', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_revenue, migrations.RunPython.noop),
+    ]
@@ -33,3 +33,17 @@ class Receipt(models.Model):
     class Meta:
         db_table = 'receipts'
         ordering = ['-created_at']
+
+
+class DailyRevenue(models.Model):
+    """Acumulado diario de pagos por fecha local, método y estado"""
+    date = models.DateField()
+    method = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'daily_revenue'
+        ordering = ['-date', 'method']
+        unique_together = ('date', 'method', 'status')
@@ -0,0 +1,82 @@
+"""
+Acumulado diario de ingresos (tabla daily_revenue).
+
+Cada pago suma su monto al bucket (fecha local, método, estado). Los tableros
+y totales de caja leen estos pocos buckets en lugar de recorrer payments.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import Payment, DailyRevenue
+
+
+def local_date(dt):
+    return timezone.localtime(dt).date()
+
+
+def payment_bucket(payment):
+    """(fecha, método, estado, monto) del pago, o None si aún no tiene fecha"""
+    if not payment.created_at:
+        return None
+    return (local_date(payment.created_at), payment.method or '', payment.status or '', payment.amount or Decimal('0'))
+
+
+@transaction.atomic
+def apply_delta(day, method, status, amount, count):
+    obj, _ = DailyRevenue.objects.get_or_create(date=day, method=method, status=status)
+    DailyRevenue.objects.filter(pk=obj.pk).update(total=F('total') + amount, count=F('count') + count)
+
+
+@transaction.atomic
+def rebuild(since=None):
+    """Recalcula el acumulado desde payments (completo o desde la fecha `since`)"""
+    rollup = DailyRevenue.objects.all()
+    payments = Payment.objects.order_by()
+    if since:
+        rollup = rollup.filter(date__gte=since)
+        # Un día de margen en SQL; el filtro exacto por fecha local se hace abajo
+        start = timezone.make_aware(datetime.combine(since - timedelta(days=1), time.min))
+        payments = payments.filter(created_at__gte=start)
+    rollup.delete()
+
+    buckets = {}
+    for p in payments.iterator():
+        bucket = payment_bucket(p)
+        if not bucket:
+            continue
+        day, method, status, amount = bucket
+        if since and day < since:
+            continue
+        total, count = buckets.get((day, method, status), (Decimal('0'), 0))
+        buckets[(day, method, status)] = (total + amount, count + 1)
+
+    DailyRevenue.objects.bulk_create([
+        DailyRevenue(date=day, method=method, status=status, total=total, count=count)
+        for (day, method, status), (total, count) in buckets.items()
+    ])
+    return len(buckets)
+
+
+def _rollup(start=None, end=None, status='Completado', method=None):
+    """Buckets con fecha en [start, end); None deja el extremo abierto"""
+    qs = DailyRevenue.objects.all()
+    if start:
+        qs = qs.filter(date__gte=start)
+    if end:
+        qs = qs.filter(date__lt=end)
+    if status:
+        qs = qs.filter(status=status)
+    if method:
+        qs = qs.filter(method=method)
+    return qs
+
+
+def revenue_total(start=None, end=None, status='Completado', method=None):
+    return _rollup(start, end, status, method).aggregate(total=Sum('total'))['total'] or Decimal('0')
+
+
+def revenue_by_method(start=None, end=None, status='Completado'):
+    rows = _rollup(start, end, status).order_by().values('method').annotate(total=Sum('total'))
+    return {r['method']: r['total'] or Decimal('0') for r in rows}
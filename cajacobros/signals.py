@@ -0,0 +1,36 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Payment
+from . import revenue
+
+
+@receiver(pre_save, sender=Payment)
+def payment_pre_save(sender, instance, **kwargs):
+    # Recordar el bucket anterior para descontarlo si el pago cambia
+    instance._revenue_bucket = None
+    if instance.pk:
+        old = Payment.objects.filter(pk=instance.pk).first()
+        if old:
+            instance._revenue_bucket = revenue.payment_bucket(old)
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, **kwargs):
+    old = getattr(instance, '_revenue_bucket', None)
+    new = revenue.payment_bucket(instance)
+    if old == new:
+        return
+    if old:
+        day, method, status, amount = old
+        revenue.apply_delta(day, method, status, -amount, -1)
+    if new:
+        day, method, status, amount = new
+        revenue.apply_delta(day, method, status, amount, 1)
+
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted(sender, instance, **kwargs):
+    bucket = revenue.payment_bucket(instance)
+    if bucket:
+        day, method, status, amount = bucket
+        revenue.apply_delta(day, method, status, -amount, -1)
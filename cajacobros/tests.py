@@ -1,3 +1,79 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from . import revenue
+from .models import DailyRevenue, Payment
 
-# Create your tests here.
+
+class DailyRevenueTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.seq = 0
+
+    def pay(self, amount, method='Efectivo', status='Completado'):
+        self.seq += 1
+        return Payment.objects.create(
+            transaction_id=f'TXN-T{self.seq}', type='Reserva', guest_name='Huésped',
+            method=method, amount=Decimal(amount), status=status,
+        )
+
+    def buckets(self):
+        return {
+            (row.date, row.method, row.status): (row.total, row.count)
+            for row in DailyRevenue.objects.all() if row.count or row.total
+        }
+
+    def test_create_adds_to_the_bucket(self):
+        self.pay('100.00')
+        self.pay('50.50')
+        self.assertEqual(self.buckets(), {(self.today, 'Efectivo', 'Completado'): (Decimal('150.50'), 2)})
+
+    def test_amount_edit_applies_the_difference(self):
+        payment = self.pay('100.00')
+        payment.amount = Decimal('80.00')
+        payment.save()
+        self.assertEqual(self.buckets(), {(self.today, 'Efectivo', 'Completado'): (Decimal('80.00'), 1)})
+
+    def test_status_or_method_change_moves_between_buckets(self):
+        payment = self.pay('100.00')
+        payment.method = 'Tarjeta'
+        payment.save()
+        self.assertEqual(self.buckets(), {(self.today, 'Tarjeta', 'Completado'): (Decimal('100.00'), 1)})
+        payment.status = 'Anulado'
+        payment.save()
+        self.assertEqual(self.buckets(), {(self.today, 'Tarjeta', 'Anulado'): (Decimal('100.00'), 1)})
+        self.assertEqual(revenue.revenue_total(), Decimal('0'))
+
+    def test_delete_removes_from_the_bucket(self):
+        keep = self.pay('30.00')
+        self.pay('70.00').delete()
+        self.assertEqual(self.buckets(), {(self.today, 'Efectivo', 'Completado'): (keep.amount, 1)})
+
+    def test_rebuild_matches_incremental_totals(self):
+        self.pay('100.00')
+        edited = self.pay('40.00', method='Yape')
+        edited.amount = Decimal('45.00')
+        edited.save()
+        moved = self.pay('20.00', status='Pendiente')
+        moved.status = 'Completado'
+        moved.save()
+        self.pay('10.00').delete()
+        incremental = self.buckets()
+
+        revenue.rebuild()
+        self.assertEqual(self.buckets(), incremental)
+        revenue.rebuild(since=self.today)
+        self.assertEqual(self.buckets(), incremental)
+
+    def test_partial_rebuild_skips_older_payments_in_sql(self):
+        old = self.pay('60.00')
+        Payment.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=30))
+        self.pay('15.00')
+        with CaptureQueriesContext(connection) as queries:
+            revenue.rebuild(since=self.today)
+        select = next(q['sql'] for q in queries if q['sql'].startswith('SELECT') and '"payments"' in q['sql'])
+        self.assertIn('"created_at" >=', select)
+        self.assertEqual(revenue.revenue_total(start=self.today), Decimal('15.00'))
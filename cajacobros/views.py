@@ -5,9 +5,11 @@ from django.utils import timezone
 from django.db.models import Sum
 from django.db import DatabaseError, OperationalError
 from decimal import Decimal, InvalidOperation
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 from .models import Payment, Receipt
+from . import revenue
+from sequences import allocator as sequence_allocator
 
 
 def _format_time(dt):
@@ -16,6 +18,17 @@ def _format_time(dt):
     return timezone.localtime(dt).strftime('%I:%M %p')
 
 
+def _get_target_date(request):
+    """Fecha local indicada en el parámetro 'date' (YYYY-MM-DD) o la de hoy"""
+    date_str = request.GET.get('date')
+    if date_str:
+        try:
+            return datetime.strptime(date_str, '%Y-%m-%d').date()
+        except (ValueError, TypeError):
+            pass
+    return timezone.localdate()
+
+
 def _get_date_range_for_totals(request):
     """Obtiene el rango de fechas desde el parámetro 'date' o usa la fecha de hoy.
     Retorna los datetimes en UTC para comparar con los almacenados en la BD."""
@@ -92,22 +105,7 @@ def create_payment(request):
     except (InvalidOperation, TypeError, ValueError):
         return Response({'error': 'Monto inválido'}, status=status.HTTP_400_BAD_REQUEST)
     try:
-        existing = list(Payment.objects.filter(transaction_id__startswith='TXN-').values_list('transaction_id', flat=True))
-        max_n = 0
-        for tid in existing:
-            parts = str(tid).split('-')
-            if len(parts) == 2 and parts[0] == 'TXN':
-                try:
-                    n = int(parts[1])
-                    if n > max_n:
-                        max_n = n
-                except Exception:
-                    pass
-        next_n = max_n + 1
-        txn = f"TXN-{str(next_n).zfill(3)}"
-        while Payment.objects.filter(transaction_id=txn).exists():
-            next_n += 1
-            txn = f"TXN-{str(next_n).zfill(3)}"
+        txn = sequence_allocator.next_transaction_id()
         p = Payment.objects.create(
             transaction_id=txn,
             type=t,
@@ -135,12 +133,13 @@ def create_payment(request):
 def today_totals(request):
     if not hasattr(request, 'firebase_user'):
         return Response({'error': 'Usuario no autenticado'}, status=status.HTTP_401_UNAUTHORIZED)
-    start, end = _get_date_range_for_totals(request)
-    qs = Payment.objects.filter(created_at__gte=start, created_at__lte=end)
+    # Totales leídos del acumulado diario (todos los estados)
+    day = _get_target_date(request)
+    totals = revenue.revenue_by_method(start=day, end=day + timedelta(days=1), status=None)
     by_method = {}
     for method in ['Yape', 'Efectivo', 'Tarjeta', 'Transferencia']:
-        by_method[method] = float(qs.filter(method=method).aggregate(total=Sum('amount'))['total'] or 0)
-    total = float(qs.aggregate(total=Sum('amount'))['total'] or 0)
+        by_method[method] = float(totals.get(method, 0))
+    total = float(sum(totals.values()))
     return Response({'totals': {'methods': by_method, 'total': total}})
 
 
@@ -189,7 +188,7 @@ def emit_receipt(request):
         return Response({'error': 'Pago no encontrado'}, status=status.HTTP_404_NOT_FOUND)
     r = Receipt.objects.create(
         payment=p,
-        numero=payload.get('numero') or '',
+        numero=payload.get('numero') or sequence_allocator.next_receipt_number(),
         fecha=payload.get('fecha'),
         senores=payload.get('senores') or '',
         direccion=payload.get('direccion') or '',
@@ -0,0 +1,209 @@
+"""
+Contexto del hotel que se entrega al chatbot en el prompt del sistema.
+
+El snapshot se arma con pocas consultas agregadas y se guarda en caché
+(CHATBOT_CONTEXT_CACHE_ALIAS) durante CHATBOT_CONTEXT_TTL segundos, compartido
+por todas las sesiones de chat. Cualquier escritura de Reservation, Payment,
+Room o BlockedRoom incrementa la versión del snapshot (ver signals.py), así la
+siguiente pregunta ve datos frescos sin esperar al TTL. La versión vive en la
+base de datos (ContextVersion) y no en la caché, para que todos los workers la
+compartan aunque la caché sea local a cada proceso.
+"""
+import hashlib
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Sum, Count, Q
+from django.utils import timezone
+from reservations.models import Reservation, Room
+from reservations import room_nights
+from cajacobros.models import Payment, DailyRevenue
+from .models import ContextVersion
+
+VERSION_PK = 1
+ACTIVE_STATUSES = ['Confirmada', 'Check-in']
+
+_build_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'CHATBOT_CONTEXT_CACHE_ALIAS', 'default')]
+
+
+def _ttl():
+    return getattr(settings, 'CHATBOT_CONTEXT_TTL', 60)
+
+
+def get_version():
+    """Versión actual del snapshot (cambia con cada escritura relevante)"""
+    version = ContextVersion.objects.filter(pk=VERSION_PK).values_list('value', flat=True).first()
+    return version or 0
+
+
+def invalidate():
+    if not ContextVersion.objects.filter(pk=VERSION_PK).update(value=F('value') + 1):
+        ContextVersion.objects.get_or_create(pk=VERSION_PK, defaults={'value': 1})
+
+
+def build_snapshot():
+    """Arma el contexto completo del hotel desde la base de datos"""
+    now = timezone.localtime()
+    today = now.date()
+    month_start = today.replace(day=1)
+    last_month_start = (month_start - timedelta(days=1)).replace(day=1)
+    week_start = today - timedelta(days=today.weekday())
+    month_start_dt = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    # ========== INGRESOS (acumulado diario, una consulta) ==========
+    revenue = DailyRevenue.objects.filter(
+        status='Completado', date__gte=min(last_month_start, week_start), date__lte=today
+    ).aggregate(
+        hoy=Sum('total', filter=Q(date=today)),
+        semana=Sum('total', filter=Q(date__gte=week_start)),
+        mes=Sum('total', filter=Q(date__gte=month_start)),
+        mes_anterior=Sum('total', filter=Q(date__lt=month_start, date__gte=last_month_start)),
+    )
+    revenue = {k: v or Decimal('0') for k, v in revenue.items()}
+
+    payment_methods = (
+        DailyRevenue.objects.filter(status='Completado', date__gte=month_start, date__lte=today)
+        .order_by()
+        .values('method')
+        .annotate(total=Sum('total'), count=Sum('count'))
+    )
+    methods_summary = {p['method']: {'total': float(p['total']), 'count': p['count']} for p in payment_methods}
+
+    # ========== HABITACIONES ==========
+    rooms = list(Room.objects.values('code', 'type', 'status'))
+    total_rooms = len(rooms)
+    occupied_codes = room_nights.occupied_room_codes(today, today + timedelta(days=1))
+    blocked_codes = room_nights.blocked_room_codes(today, today + timedelta(days=1))
+    occupied_rooms = len(occupied_codes)
+    occupancy_rate = (occupied_rooms / total_rooms * 100) if total_rooms > 0 else 0
+
+    def room_state(room):
+        # Un bloqueo por mantenimiento manda sobre la ocupación
+        if room['code'] in blocked_codes or room['status'] == 'Bloqueada':
+            return 'Bloqueada'
+        if room['code'] in occupied_codes:
+            return 'Ocupada'
+        return room['status']
+
+    rooms_detail = [
+        {'numero': room['code'], 'tipo': room['type'] or '', 'estado': room_state(room)}
+        for room in rooms
+    ]
+    unavailable = sum(1 for room in rooms_detail if room['estado'] in ('Ocupada', 'Bloqueada'))
+
+    # ========== RESERVAS (conteos en una consulta) ==========
+    counts = Reservation.objects.aggregate(
+        activas=Count('id', filter=Q(check_in__lte=today, check_out__gte=today, status__in=ACTIVE_STATUSES)),
+        checkins=Count('id', filter=Q(check_in=today)),
+        checkouts=Count('id', filter=Q(check_out=today)),
+        pendientes=Count('id', filter=Q(check_in__gt=today, status='Confirmada')),
+        mes=Count('id', filter=Q(created_at__gte=month_start_dt)),
+        canceladas_mes=Count('id', filter=Q(created_at__gte=month_start_dt, status='Cancelada')),
+        total=Count('id'),
+    )
+
+    upcoming_reservations = [
+        {
+            'codigo': res['reservation_id'],
+            'huesped': res['guest_name'],
+            'habitacion': res['room_label'] or 'N/A',
+            'check_in': res['check_in'].strftime('%Y-%m-%d'),
+            'check_out': res['check_out'].strftime('%Y-%m-%d'),
+            'monto': float(res['total_amount'] or 0),
+        }
+        for res in Reservation.objects.filter(check_in__gte=today, status='Confirmada')
+        .order_by('check_in')
+        .values('reservation_id', 'guest_name', 'room_label', 'check_in', 'check_out', 'total_amount')[:10]
+    ]
+
+    current_guests = [
+        {
+            'nombre': res['guest_name'],
+            'habitacion': res['room_label'] or 'N/A',
+            'check_out': res['check_out'].strftime('%Y-%m-%d'),
+        }
+        for res in Reservation.objects.filter(
+            check_in__lte=today, check_out__gte=today, status__in=ACTIVE_STATUSES
+        ).order_by('check_out').values('guest_name', 'room_label', 'check_out')[:10]
+    ]
+
+    # ========== ESTADÍSTICAS ==========
+    recent_payments = [
+        {
+            'monto': float(pay.amount),
+            'metodo': pay.method,
+            'huesped': pay.guest_name,
+            'fecha': timezone.localtime(pay.created_at).strftime('%Y-%m-%d %H:%M'),
+        }
+        for pay in Payment.objects.filter(status='Completado').order_by('-created_at')[:5]
+    ]
+
+    return {
+        'fecha_actual': now.strftime('%Y-%m-%d'),
+        'hora_actual': now.strftime('%H:%M'),
+        # Ingresos
+        'ingresos_mes': float(revenue['mes']),
+        'ingresos_mes_anterior': float(revenue['mes_anterior']),
+        'ingresos_hoy': float(revenue['hoy']),
+        'ingresos_semana': float(revenue['semana']),
+        'pagos_por_metodo': methods_summary,
+        # Habitaciones
+        'total_habitaciones': total_rooms,
+        'habitaciones_ocupadas': occupied_rooms,
+        'habitaciones_bloqueadas': sum(1 for room in rooms_detail if room['estado'] == 'Bloqueada'),
+        'habitaciones_disponibles': total_rooms - unavailable,
+        'tasa_ocupacion': round(occupancy_rate, 1),
+        'detalle_habitaciones': rooms_detail,
+        # Reservas
+        'reservas_activas': counts['activas'],
+        'checkins_hoy': counts['checkins'],
+        'checkouts_hoy': counts['checkouts'],
+        'reservas_pendientes': counts['pendientes'],
+        'reservas_mes': counts['mes'],
+        'reservas_canceladas_mes': counts['canceladas_mes'],
+        'proximas_reservas': upcoming_reservations,
+        'huespedes_actuales': current_guests,
+        # Estadísticas
+        'total_reservas_historico': counts['total'],
+        'pagos_recientes': recent_payments,
+    }
+
+
+def fingerprint(data):
+    """Hash de los datos del snapshot (sin fecha/hora ni versión): cambia si cambia cualquier cifra,
+    aunque la escritura no haya pasado por las señales (update(), bulk_update())"""
+    payload = {k: v for k, v in data.items() if k not in ('fecha_actual', 'hora_actual', 'version', 'fingerprint')}
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def get_dashboard_context():
+    """Snapshot del hotel para el chatbot, servido desde caché mientras no cambie"""
+    cache = _cache()
+    version = get_version()
+    key = f'chatbot:context:{version}'
+    data = cache.get(key)
+    if data is not None:
+        return data
+    # Un solo hilo por proceso reconstruye; el resto espera y reutiliza el resultado
+    with _build_lock:
+        data = cache.get(key)
+        if data is not None:
+            return data
+        try:
+            data = build_snapshot()
+        except Exception as e:
+            import traceback
+            print(f"Error en get_dashboard_context: {e}")
+            print(traceback.format_exc())
+            return {'error': str(e), 'fecha_actual': timezone.localtime().strftime('%Y-%m-%d')}
+        data['version'] = version
+        data['fingerprint'] = fingerprint(data)
+        cache.set(key, data, _ttl())
+        return data
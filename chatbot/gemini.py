@@ -0,0 +1,144 @@
+"""
+Cliente de Gemini compartido por el proceso.
+
+La API key se configura una sola vez y el modelo se resuelve en la primera
+llamada: se prueban los candidatos en orden hasta que uno responde, y el
+elegido queda cacheado para el resto de peticiones del proceso. Cualquier
+error antes de recibir la respuesta (modelo inexistente, sin permiso, argumento
+inválido, cuota agotada...) descarta ese modelo y se prueba el siguiente; un
+error a mitad del streaming se propaga, porque parte del texto ya se envió.
+"""
+import os
+import threading
+import google.generativeai as genai
+from django.conf import settings
+
+# Lista de modelos a intentar en orden (gemini-2.5-flash primero)
+MODEL_CANDIDATES = [
+    'gemini-2.5-flash',
+    'gemini-2.5-flash-exp',
+    'gemini-2.0-flash-exp',
+    'gemini-1.5-flash',
+    'gemini-1.5-pro',
+    'gemini-pro',
+]
+
+_lock = threading.Lock()
+_configured_key = None
+_model_name = None
+_models = {}
+
+
+class GeminiUnavailable(Exception):
+    """No hay API key o ningún modelo candidato está disponible"""
+
+
+def get_api_key():
+    """Obtiene la API key de Gemini de settings o variable de entorno"""
+    return getattr(settings, 'GEMINI_API_KEY', '') or os.environ.get('GEMINI_API_KEY', '')
+
+
+def ensure_configured():
+    """Configura genai si no está configurado o si la key cambió; devuelve la key"""
+    global _configured_key
+    api_key = get_api_key()
+    if not api_key:
+        raise GeminiUnavailable('API key de Gemini no configurada')
+    if api_key != _configured_key:
+        with _lock:
+            if api_key != _configured_key:
+                genai.configure(api_key=api_key)
+                _configured_key = api_key
+    return api_key
+
+
+def candidates():
+    preferred = getattr(settings, 'GEMINI_MODEL', None)
+    names = [preferred] if preferred else []
+    return names + [name for name in MODEL_CANDIDATES if name != preferred]
+
+
+def _get_model(name):
+    if name not in _models:
+        _models[name] = genai.GenerativeModel(name)
+    return _models[name]
+
+
+def _remaining_candidates():
+    names = candidates()
+    if _model_name in names:
+        names.remove(_model_name)
+        names.insert(0, _model_name)
+    return names
+
+
+def _remember(name):
+    global _model_name
+    if _model_name != name:
+        print(f"✅ Modelo '{name}' seleccionado para el chatbot")
+        _model_name = name
+
+
+def _forget(name):
+    global _model_name
+    if _model_name == name:
+        _model_name = None
+
+
+def _contents(prompt, history):
+    return list(history or []) + [{'role': 'user', 'parts': [prompt]}]
+
+
+def extract_text(response):
+    """Texto de una respuesta (o fragmento en streaming) de Gemini"""
+    try:
+        return response.text
+    except (AttributeError, ValueError):
+        pass
+    candidates_ = getattr(response, 'candidates', None) or []
+    if candidates_ and candidates_[0].content.parts:
+        return ''.join(getattr(part, 'text', '') for part in candidates_[0].content.parts)
+    return ''
+
+
+def generate(prompt, history=None):
+    """Respuesta completa (síncrona); devuelve (texto, nombre del modelo)"""
+    ensure_configured()
+    errors = []
+    for name in _remaining_candidates():
+        try:
+            response = _get_model(name).generate_content(_contents(prompt, history))
+        except Exception as e:
+            _forget(name)
+            errors.append(f'{name}: {e}')
+            continue
+        _remember(name)
+        return extract_text(response), name
+    raise GeminiUnavailable('; '.join(errors) or 'Sin modelos candidatos')
+
+
+async def stream(prompt, history=None):
+    """Genera la respuesta en streaming: produce fragmentos de texto a medida que llegan"""
+    ensure_configured()
+    errors = []
+    for name in _remaining_candidates():
+        first = True
+        try:
+            response = await _get_model(name).generate_content_async(_contents(prompt, history), stream=True)
+            async for chunk in response:
+                if first:
+                    _remember(name)
+                    first = False
+                text = extract_text(chunk)
+                if text:
+                    yield text
+            if first:
+                _remember(name)
+            return
+        except Exception as e:
+            if not first:
+                raise
+            _forget(name)
+            errors.append(f'{name}: {e}')
+            continue
+    raise GeminiUnavailable('; '.join(errors) or 'Sin modelos candidatos')
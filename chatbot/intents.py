@@ -0,0 +1,109 @@
+"""
+Respuestas deterministas para las preguntas de métricas más frecuentes.
+
+Preguntas cortas como "¿cuántos check-ins hay hoy?" o "ingresos del mes" se
+responden directamente desde el snapshot del hotel (context.py), sin llamar
+al modelo. Ante cualquier duda no se responde y la pregunta sigue su curso
+hacia Gemini: comparaciones, cualquier periodo distinto de hoy / esta semana /
+este mes / el mes anterior (pasado, próximo, meses, días de la semana,
+fechas o números), nombres propios y cualquier palabra fuera de VOCABULARY.
+"""
+import re
+import unicodedata
+
+MAX_WORDS = 12
+
+# Palabras que indican una pregunta que el matcher no sabe responder bien
+_BAIL_OUT = re.compile(
+    r'\b(compar\w*|vs|versus|ayer|manana|por que|porque|analiz\w*|tendencia\w*|'
+    r'prediccion\w*|proyeccion\w*|promedio|anio|semestre|trimestre|explica\w*|'
+    r'pasad\w*|proxim\w*|anterior\w*|siguiente\w*|ultim\w*|fin|dia|dias|fecha\w*|'
+    r'enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|setiembre|octubre|noviembre|diciembre|'
+    r'lunes|martes|miercoles|jueves|viernes|sabado|domingo)\b|\d'
+)
+
+# "el mes anterior / pasado" es un periodo que sí se responde: se reduce a un solo token
+_LAST_MONTH = re.compile(r'\b(el )?mes (anterior|pasado)\b')
+LAST_MONTH_TOKEN = 'mesanterior'
+
+# Toda palabra de la pregunta debe estar aquí; lo demás (nombres, habitaciones, etc.) va al modelo
+VOCABULARY = {
+    # conectores y verbos
+    'a', 'al', 'el', 'la', 'los', 'las', 'de', 'del', 'en', 'que', 'es', 'son', 'hay', 'me', 'se',
+    'cual', 'cuales', 'cuanto', 'cuanta', 'cuantos', 'cuantas', 'dime', 'dame', 'muestrame', 'mostrar',
+    'ver', 'quiero', 'saber', 'por', 'favor', 'total', 'totales', 'numero', 'cantidad', 'tenemos',
+    'tengo', 'tiene', 'llevamos', 'van', 'han', 'fue', 'fueron', 'esta', 'estan', 'este', 'hotel',
+    'actual', 'actuales', 'actualmente', 'ahora', 'momento', 'programados', 'programadas', 'registrados',
+    'registradas', 'tasa', 'porcentaje', 'mes', 'semana', 'hoy', LAST_MONTH_TOKEN,
+    # métricas
+    'ingreso', 'ingresos', 'recaudado', 'recaudacion', 'ventas', 'checkin', 'checkins', 'checkout',
+    'checkouts', 'entradas', 'llegadas', 'salidas', 'ocupacion', 'ocupadas', 'habitaciones',
+    'disponibles', 'libres', 'reservas', 'pendientes', 'futuras', 'activas', 'huespedes', 'hospedados',
+}
+_PROPER_NAME = re.compile(r'^[A-ZÁÉÍÓÚÑ][a-záéíóúñ]+$')
+
+
+def normalize(text):
+    """Minúsculas, sin tildes ni signos de puntuación y con espacios simples"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r'[^a-z0-9 ]+', ' ', text.replace('-', ''))
+    return ' '.join(text.split())
+
+
+def _money(value):
+    return f"S/ {value:,.2f}"
+
+
+def _revenue(label, key):
+    return lambda d: f"Los ingresos {label} son {_money(d.get(key, 0))}."
+
+
+def _has_proper_name(question):
+    """Palabras con mayúscula inicial después de la primera (p. ej. "Juan Pérez")"""
+    words = [w.strip('¿?¡!.,;:"\'()') for w in (question or '').split()]
+    return any(_PROPER_NAME.match(w) for w in words[1:])
+
+
+# (patrón sobre la pregunta normalizada, respuesta a partir del snapshot)
+INTENTS = [
+    (r'\b(checkins?|entradas|llegadas)\b.*\bhoy\b|\bhoy\b.*\b(checkins?|entradas|llegadas)\b',
+     lambda d: f"Hoy hay {d.get('checkins_hoy', 0)} check-ins programados."),
+    (r'\b(checkouts?|salidas)\b.*\bhoy\b|\bhoy\b.*\b(checkouts?|salidas)\b',
+     lambda d: f"Hoy hay {d.get('checkouts_hoy', 0)} check-outs programados."),
+    (rf'\b(ingresos?|recaudado|recaudacion|ventas)\b.*\b{LAST_MONTH_TOKEN}\b',
+     _revenue('del mes anterior', 'ingresos_mes_anterior')),
+    (r'\b(ingresos?|recaudado|recaudacion|ventas)\b.*\b(este mes|del mes|mes actual|mes)\b',
+     _revenue('del mes actual', 'ingresos_mes')),
+    (r'\b(ingresos?|recaudado|recaudacion|ventas)\b.*\bsemana\b',
+     _revenue('de la semana', 'ingresos_semana')),
+    (r'\b(ingresos?|recaudado|recaudacion|ventas)\b.*\bhoy\b|\bhoy\b.*\b(ingresos?|recaudado|ventas)\b',
+     _revenue('de hoy', 'ingresos_hoy')),
+    (r'\b(tasa de )?ocupacion\b',
+     lambda d: (f"La tasa de ocupación actual es {d.get('tasa_ocupacion', 0)}% "
+                f"({d.get('habitaciones_ocupadas', 0)} de {d.get('total_habitaciones', 0)} habitaciones ocupadas).")),
+    (r'\bhabitaciones\b.*\b(disponibles|libres)\b|\b(disponibles|libres)\b.*\bhabitaciones\b',
+     lambda d: (f"Hay {d.get('habitaciones_disponibles', 0)} habitaciones disponibles "
+                f"de {d.get('total_habitaciones', 0)}.")),
+    (r'\breservas\b.*\b(pendientes|futuras)\b',
+     lambda d: f"Hay {d.get('reservas_pendientes', 0)} reservas pendientes (futuras)."),
+    (r'\breservas\b.*\bactivas\b|\bhuespedes\b.*\b(hay|actuales|hospedados)\b',
+     lambda d: f"Hay {d.get('reservas_activas', 0)} reservas activas en este momento."),
+]
+_COMPILED = [(re.compile(pattern), answer) for pattern, answer in INTENTS]
+
+
+def match(question, snapshot):
+    """Respuesta determinista o None si la pregunta no es una métrica simple"""
+    if not snapshot or 'error' in snapshot:
+        return None
+    text = _LAST_MONTH.sub(LAST_MONTH_TOKEN, normalize(question))
+    words = text.split()
+    if not words or len(words) > MAX_WORDS or _BAIL_OUT.search(text) or _has_proper_name(question):
+        return None
+    if any(word not in VOCABULARY for word in words):
+        return None
+    for pattern, answer in _COMPILED:
+        if pattern.search(text):
+            return answer(snapshot)
+    return None
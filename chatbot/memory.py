@@ -0,0 +1,160 @@
+"""
+Memoria acotada de una sesión del chatbot.
+
+Cada petición a Gemini se arma así:
+1. El contexto del hotel de la sesión (base), fijo desde el primer turno.
+2. Los turnos antiguos plegados en ChatbotSession.summary.
+3. Los turnos recientes que quepan en CHATBOT_HISTORY_TOKEN_BUDGET.
+4. El mensaje actual, precedido solo de los datos que cambiaron respecto
+   a la base (delta).
+
+El "resumen" no lo redacta el modelo: es una transcripción acotada. Cada turno
+que sale del presupuesto se agrega recortado a una línea y, si el total supera
+CHATBOT_SUMMARY_MAX_CHARS, se descartan las líneas más antiguas. Así el prompt
+no crece con la longitud de la sesión y plegar no cuesta otra llamada a Gemini.
+Si el delta llega a pesar la mitad que la base, la base se renueva con el
+snapshot actual.
+"""
+import json
+from django.conf import settings
+from .models import ChatbotMessage
+
+# Datos que cambian en cada snapshot y no aportan al delta
+VOLATILE_KEYS = {'version', 'fingerprint', 'fecha_actual', 'hora_actual'}
+REBASE_RATIO = 0.5
+CONTEXT_ACK = 'Entendido. Usaré estos datos del hotel para responder.'
+SUMMARY_ACK = 'Entendido, tengo en cuenta lo conversado.'
+
+LABELS = {
+    'ingresos_hoy': 'Ingresos de hoy (S/)',
+    'ingresos_semana': 'Ingresos de la semana (S/)',
+    'ingresos_mes': 'Ingresos del mes actual (S/)',
+    'ingresos_mes_anterior': 'Ingresos del mes anterior (S/)',
+    'pagos_por_metodo': 'Pagos por método (este mes)',
+    'total_habitaciones': 'Total de habitaciones',
+    'habitaciones_ocupadas': 'Habitaciones ocupadas',
+    'habitaciones_bloqueadas': 'Habitaciones bloqueadas (mantenimiento)',
+    'habitaciones_disponibles': 'Habitaciones disponibles',
+    'tasa_ocupacion': 'Tasa de ocupación (%)',
+    'reservas_activas': 'Reservas activas',
+    'checkins_hoy': 'Check-ins de hoy',
+    'checkouts_hoy': 'Check-outs de hoy',
+    'reservas_pendientes': 'Reservas pendientes',
+    'reservas_mes': 'Reservas creadas este mes',
+    'reservas_canceladas_mes': 'Reservas canceladas este mes',
+    'proximas_reservas': 'Próximas reservas',
+    'huespedes_actuales': 'Huéspedes actuales',
+    'total_reservas_historico': 'Total histórico de reservas',
+}
+
+
+def history_budget():
+    return getattr(settings, 'CHATBOT_HISTORY_TOKEN_BUDGET', 1500)
+
+
+def summary_max_chars():
+    return getattr(settings, 'CHATBOT_SUMMARY_MAX_CHARS', 2000)
+
+
+def estimate_tokens(text):
+    """Aproximación de tokens (~4 caracteres por token), suficiente para presupuestar"""
+    return len(text or '') // 4 + 1
+
+
+def context_delta(baseline, current):
+    """Líneas con los datos que cambiaron desde la base"""
+    lines = []
+    for key, value in current.items():
+        if key in VOLATILE_KEYS or key == 'detalle_habitaciones' or baseline.get(key) == value:
+            continue
+        label = LABELS.get(key, key)
+        if isinstance(value, (list, dict)):
+            lines.append(f"- {label}: {json.dumps(value, ensure_ascii=False)}")
+        else:
+            lines.append(f"- {label}: {baseline.get(key, 'N/A')} → {value}")
+    return lines
+
+
+def _fold(summary, messages):
+    """Agrega cada turno como una línea recortada (120/160 caracteres) y descarta las más
+    antiguas si se supera CHATBOT_SUMMARY_MAX_CHARS; no hay resumen semántico"""
+    lines = summary.splitlines() if summary else []
+    for msg in messages:
+        who = 'Asistente' if msg.role == 'assistant' else 'Usuario'
+        text = ' '.join(msg.content.split())
+        limit = 160 if msg.role == 'assistant' else 120
+        lines.append(f"{who}: {text[:limit]}{'…' if len(text) > limit else ''}")
+    max_chars = summary_max_chars()
+    while lines and sum(len(line) + 1 for line in lines) > max_chars:
+        lines.pop(0)
+    return '\n'.join(lines)
+
+
+def _as_content(msg):
+    return {'role': 'model' if msg.role == 'assistant' else 'user', 'parts': [msg.content]}
+
+
+def prepare(session, current_message, snapshot, build_context_prompt):
+    """Arma (historial, prompt) para el turno actual y actualiza la memoria de la sesión.
+
+    `build_context_prompt(snapshot)` produce el texto del contexto base. Los
+    cambios de la sesión se guardan con save(update_fields=...).
+    """
+    update_fields = []
+
+    # Contexto base: se fija en el primer turno y se renueva si el delta crece demasiado
+    has_snapshot = snapshot and 'error' not in snapshot
+    if has_snapshot and not session.context_snapshot:
+        session.context_snapshot = snapshot
+        update_fields.append('context_snapshot')
+    baseline = session.context_snapshot or {}
+    context_prompt = build_context_prompt(baseline or snapshot)
+    delta = context_delta(baseline, snapshot) if has_snapshot and baseline else []
+    if delta and estimate_tokens('\n'.join(delta)) > REBASE_RATIO * estimate_tokens(context_prompt):
+        session.context_snapshot = baseline = snapshot
+        update_fields.append('context_snapshot')
+        context_prompt = build_context_prompt(baseline)
+        delta = []
+
+    # Turnos recientes dentro del presupuesto, del más nuevo al más antiguo
+    pending = ChatbotMessage.objects.filter(session=session).exclude(id=current_message.id)
+    if session.summary_until_id:
+        pending = pending.filter(id__gt=session.summary_until_id)
+    pending = list(pending.order_by('-id'))
+    budget = history_budget()
+    kept = []
+    for msg in pending:
+        cost = estimate_tokens(msg.content)
+        if kept and cost > budget:
+            break
+        budget -= cost
+        kept.append(msg)
+    overflow = pending[len(kept):]
+
+    # Lo que no cabe se pliega en el resumen
+    if overflow:
+        overflow.reverse()
+        session.summary = _fold(session.summary, overflow)
+        session.summary_until_id = overflow[-1].id
+        update_fields += ['summary', 'summary_until_id']
+
+    if update_fields:
+        session.save(update_fields=update_fields + ['updated_at'])
+
+    history = [
+        {'role': 'user', 'parts': [context_prompt]},
+        {'role': 'model', 'parts': [CONTEXT_ACK]},
+    ]
+    if session.summary:
+        history += [
+            {'role': 'user', 'parts': [f"Resumen de la conversación anterior:\n{session.summary}"]},
+            {'role': 'model', 'parts': [SUMMARY_ACK]},
+        ]
+    history += [_as_content(msg) for msg in reversed(kept)]
+
+    header = [f"Fecha y hora actual: {snapshot.get('fecha_actual', 'N/A')} {snapshot.get('hora_actual', '')}".rstrip()]
+    if delta:
+        header.append('Datos actualizados desde el inicio de la sesión:')
+        header += delta
+    prompt = '\n'.join(header) + f"\n\nUsuario: {current_message.content}"
+    return history, prompt
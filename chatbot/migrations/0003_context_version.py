@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:03
+
+from django.db import migrations, models
+
+
+def move_off_sequences(apps, schema_editor):
+    """Crea la fila única y quita la fila que antes se usaba en sequences (la versión vivía en 'chatbot.context_version')"""
+    apps.get_model('chatbot', 'ContextVersion').objects.get_or_create(pk=1)
+    apps.get_model('sequences', 'Sequence').objects.filter(name='chatbot.context_version').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_session_memory'),
+        ('sequences', '0002_seed_sequences'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContextVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'chatbot_context_version',
+            },
+        ),
+        migrations.RunPython(move_off_sequences, migrations.RunPython.noop),
+    ]
@@ -5,6 +5,11 @@ from django.utils import timezone
 class ChatbotSession(models.Model):
     session_id = models.CharField(max_length=100, unique=True)
     user_email = models.CharField(max_length=200)
+    # Memoria de la sesión (ver memory.py): transcripción acotada de los turnos antiguos,
+    # último mensaje incluido en él y contexto del hotel enviado como base
+    summary = models.TextField(blank=True, default='')
+    summary_until_id = models.BigIntegerField(blank=True, null=True)
+    context_snapshot = models.JSONField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -28,3 +33,15 @@ class ChatbotMessage(models.Model):
     
     def __str__(self):
         return f"{self.role}: {self.content[:50]}"
+
+
+class ContextVersion(models.Model):
+    """Versión del contexto del hotel del chatbot (fila única), compartida por todos los workers"""
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'chatbot_context_version'
+
+    def __str__(self):
+        return f"Contexto v{self.value}"
@@ -0,0 +1,118 @@
+"""
+Flujo de un turno del chatbot, separado de la llamada al modelo.
+
+La transacción cubre solo las inserciones (mensaje del usuario al empezar,
+respuesta del asistente al terminar); la llamada a Gemini ocurre fuera de
+ella para no retener una conexión ni bloqueos durante segundos.
+"""
+from collections import namedtuple
+from django.db import transaction
+from .models import ChatbotSession, ChatbotMessage
+from .context import get_dashboard_context
+from . import memory, response_cache
+
+# reply: respuesta ya resuelta (intent o caché) o None si hay que llamar al modelo
+Turn = namedtuple('Turn', ['session', 'history', 'prompt', 'reply', 'cache_key'])
+
+
+def build_system_prompt(dashboard_data):
+    """Prompt del sistema con el contexto completo del hotel"""
+    # Formatear datos para el prompt
+    metodos_pago = dashboard_data.get('pagos_por_metodo', {})
+    metodos_str = ', '.join([f"{m}: S/{d['total']:,.2f} ({d['count']} pagos)" for m, d in metodos_pago.items()]) if metodos_pago else 'Sin datos'
+    
+    proximas = dashboard_data.get('proximas_reservas', [])
+    proximas_str = '\n'.join([f"  - {r['codigo']}: {r['huesped']} - Hab {r['habitacion']} - {r['check_in']} al {r['check_out']}" for r in proximas[:5]]) if proximas else '  Sin reservas próximas'
+    
+    huespedes = dashboard_data.get('huespedes_actuales', [])
+    huespedes_str = '\n'.join([f"  - {h['nombre']} - Hab {h['habitacion']} - Sale: {h['check_out']}" for h in huespedes[:5]]) if huespedes else '  Sin huéspedes actualmente'
+    
+    system_prompt = f"""Eres un asistente virtual inteligente del Hotel Plaza Trujillo. 
+Tu función es ayudar al personal del hotel con información PRECISA y ACTUALIZADA sobre operaciones, estadísticas y gestión.
+
+═══════════════════════════════════════════════════════════════
+📅 DATOS AL: {dashboard_data.get('fecha_actual', 'N/A')} a las {dashboard_data.get('hora_actual', 'N/A')}
+═══════════════════════════════════════════════════════════════
+
+💰 FINANZAS:
+- Ingresos de HOY: S/ {dashboard_data.get('ingresos_hoy', 0):,.2f}
+- Ingresos de la SEMANA: S/ {dashboard_data.get('ingresos_semana', 0):,.2f}
+- Ingresos del MES ACTUAL: S/ {dashboard_data.get('ingresos_mes', 0):,.2f}
+- Ingresos del MES ANTERIOR: S/ {dashboard_data.get('ingresos_mes_anterior', 0):,.2f}
+- Pagos por método (este mes): {metodos_str}
+
+🏨 HABITACIONES:
+- Total de habitaciones: {dashboard_data.get('total_habitaciones', 0)}
+- Ocupadas: {dashboard_data.get('habitaciones_ocupadas', 0)}
+- Bloqueadas (mantenimiento): {dashboard_data.get('habitaciones_bloqueadas', 0)}
+- Disponibles: {dashboard_data.get('habitaciones_disponibles', 0)}
+- Tasa de ocupación: {dashboard_data.get('tasa_ocupacion', 0)}%
+
+📋 RESERVAS:
+- Reservas activas (huéspedes actuales): {dashboard_data.get('reservas_activas', 0)}
+- Check-ins programados HOY: {dashboard_data.get('checkins_hoy', 0)}
+- Check-outs programados HOY: {dashboard_data.get('checkouts_hoy', 0)}
+- Reservas pendientes (futuras): {dashboard_data.get('reservas_pendientes', 0)}
+- Reservas creadas este mes: {dashboard_data.get('reservas_mes', 0)}
+- Reservas canceladas este mes: {dashboard_data.get('reservas_canceladas_mes', 0)}
+- Total histórico de reservas: {dashboard_data.get('total_reservas_historico', 0)}
+
+👥 HUÉSPEDES ACTUALES EN EL HOTEL:
+{huespedes_str}
+
+📅 PRÓXIMAS RESERVAS:
+{proximas_str}
+
+═══════════════════════════════════════════════════════════════
+
+INSTRUCCIONES:
+- Responde de manera amigable, profesional y concisa
+- USA SIEMPRE los datos proporcionados arriba para responder con precisión
+- Formatea números y montos claramente (ej: S/ 1,234.56)
+- Siempre responde en español
+- Si te preguntan algo que no está en los datos, indica que no tienes esa información específica
+- Sé proactivo y ofrece información útil relacionada con las preguntas"""
+    return system_prompt
+
+
+def start_turn(session_id, user_email, message_text):
+    """Guarda el mensaje del usuario y prepara el turno (respuesta directa o prompt para el modelo)"""
+    with transaction.atomic():
+        # Obtener o crear sesión
+        session, created = ChatbotSession.objects.get_or_create(
+            session_id=session_id,
+            defaults={'user_email': user_email}
+        )
+        if not created:
+            session.user_email = user_email
+            session.save()
+        
+        # Guardar mensaje del usuario
+        user_message = ChatbotMessage.objects.create(
+            session=session,
+            role='user',
+            content=message_text
+        )
+    
+    snapshot = get_dashboard_context()
+    
+    # Métricas frecuentes y preguntas repetidas se responden sin llamar al modelo
+    reply, cache_key = response_cache.lookup(message_text, snapshot)
+    if reply:
+        return Turn(session, [], '', reply, None)
+    
+    # Historial acotado por presupuesto de tokens, contexto base de la sesión y delta
+    history, full_message = memory.prepare(session, user_message, snapshot, build_system_prompt)
+    return Turn(session, history, full_message, None, cache_key)
+
+
+def finish_turn(turn, assistant_response):
+    """Guarda la respuesta del asistente (y la deja en caché si vino del modelo)"""
+    response_cache.store(turn.cache_key, assistant_response)
+    session = turn.session
+    with transaction.atomic():
+        return ChatbotMessage.objects.create(
+            session=session,
+            role='assistant',
+            content=assistant_response
+        )
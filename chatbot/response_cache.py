@@ -0,0 +1,111 @@
+"""
+Caché de respuestas del chatbot.
+
+La clave es la pregunta normalizada más la huella de los datos del snapshot
+(context.fingerprint): una respuesta solo se reutiliza mientras las cifras del
+hotel sean exactamente las mismas con las que se generó. Así también quedan
+obsoletas tras escrituras que no pasan por las señales (update(),
+bulk_update()), en cuanto el snapshot se reconstruye (CHATBOT_CONTEXT_TTL).
+Las entradas caducan a los CHATBOT_RESPONSE_CACHE_TTL segundos y se desalojan
+por LRU.
+
+Solo se usan para preguntas autónomas: las que parecen continuación de la
+conversación ("¿y ayer?", "¿eso cuánto es?") siempre van al modelo.
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from . import intents
+
+MIN_WORDS = 3
+FOLLOW_UP_WORDS = {'y', 'entonces', 'eso', 'esa', 'ese', 'esos', 'esas', 'tambien', 'ademas', 'o'}
+
+
+class ResponseCache:
+    """Caché LRU en memoria con TTL por entrada y contadores de aciertos"""
+
+    def __init__(self, max_entries=256, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.intent_hits = 0
+
+    def get(self, key, now=None):
+        now = now or time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, now=None):
+        now = now or time.time()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record_intent_hit(self):
+        with self._lock:
+            self.intent_hits += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'intent_hits': self.intent_hits,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.intent_hits = 0
+
+
+_cache = ResponseCache(
+    getattr(settings, 'CHATBOT_RESPONSE_CACHE_SIZE', 256),
+    getattr(settings, 'CHATBOT_RESPONSE_CACHE_TTL', 300),
+)
+
+
+def cache_key(question, snapshot):
+    """Clave de caché o None si la pregunta depende de la conversación"""
+    text = intents.normalize(question)
+    words = text.split()
+    if len(words) < MIN_WORDS or words[0] in FOLLOW_UP_WORDS or not snapshot.get('fingerprint'):
+        return None
+    return f"{snapshot['fingerprint']}:{text}"
+
+
+def lookup(question, snapshot):
+    """Devuelve (respuesta, clave): respuesta desde intent o caché (o None) y la clave para guardar"""
+    answer = intents.match(question, snapshot)
+    if answer:
+        _cache.record_intent_hit()
+        return answer, None
+    key = cache_key(question, snapshot)
+    if key is None:
+        return None, None
+    return _cache.get(key), key
+
+
+def store(key, answer):
+    if key and answer:
+        _cache.set(key, answer)
+
+
+def stats():
+    return _cache.stats()
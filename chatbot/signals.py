@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from reservations.models import Reservation, Room
+from cajacobros.models import Payment
+from mantenimiento.models import BlockedRoom
+from . import context
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+@receiver(post_save, sender=BlockedRoom)
+@receiver(post_delete, sender=BlockedRoom)
+def invalidate_dashboard_context(sender, **kwargs):
+    # Invalidar al confirmar la transacción, no antes de que los datos sean visibles
+    transaction.on_commit(context.invalidate)
@@ -1,3 +1,227 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from google.api_core import exceptions as google_exceptions
+from mantenimiento.models import BlockedRoom
+from reservations.models import Room
+from sequences.models import Sequence
+from . import context, gemini, intents, memory, response_cache
+from .models import ChatbotMessage, ChatbotSession
+from .context import fingerprint
 
-# Create your tests here.
+SNAPSHOT = {
+    'version': 1,
+    'fecha_actual': '2026-10-18',
+    'hora_actual': '10:00',
+    'ingresos_hoy': 100.0,
+    'ingresos_semana': 700.0,
+    'ingresos_mes': 3000.0,
+    'ingresos_mes_anterior': 2500.0,
+    'checkins_hoy': 3,
+    'checkouts_hoy': 2,
+    'tasa_ocupacion': 50.0,
+    'habitaciones_ocupadas': 5,
+    'habitaciones_disponibles': 5,
+    'total_habitaciones': 10,
+    'reservas_pendientes': 4,
+    'reservas_activas': 6,
+}
+
+
+class IntentMatchTests(SimpleTestCase):
+    def test_answers_simple_metrics(self):
+        cases = {
+            '¿Cuántos check-ins hay hoy?': '3 check-ins',
+            'ingresos del mes': 'S/ 3,000.00',
+            '¿Cuáles fueron los ingresos del mes pasado?': 'S/ 2,500.00',
+            'ingresos de la semana': 'S/ 700.00',
+            'tasa de ocupación actual': '50.0%',
+            '¿Cuántas habitaciones disponibles hay?': 'Hay 5 habitaciones disponibles',
+            'reservas pendientes': 'Hay 4 reservas pendientes',
+        }
+        for question, expected in cases.items():
+            with self.subTest(question=question):
+                self.assertIn(expected, intents.match(question, SNAPSHOT) or '')
+
+    def test_other_periods_and_entities_go_to_the_model(self):
+        questions = [
+            'ingresos de la semana pasada',
+            'ingresos del mes de enero',
+            'ocupación en diciembre',
+            'ocupación del próximo fin de semana',
+            'reservas pendientes tiene Juan Pérez',
+            'habitaciones disponibles para el 20 de diciembre',
+            'check-ins del lunes',
+            'ingresos del 2025',
+            'ocupación de la habitación 101',
+            'compara los ingresos del mes con el mes anterior',
+        ]
+        for question in questions:
+            with self.subTest(question=question):
+                self.assertIsNone(intents.match(question, SNAPSHOT))
+
+    def test_no_answer_without_snapshot(self):
+        self.assertIsNone(intents.match('ingresos del mes', {'error': 'sin datos'}))
+
+
+class ResponseCacheKeyTests(SimpleTestCase):
+    def snapshot(self, **changes):
+        data = dict(SNAPSHOT, **changes)
+        data['fingerprint'] = fingerprint(data)
+        return data
+
+    def test_key_follows_the_data_not_the_clock(self):
+        question = 'dame un consejo para mejorar la ocupación'
+        base = response_cache.cache_key(question, self.snapshot())
+        self.assertEqual(base, response_cache.cache_key(question, self.snapshot(hora_actual='10:05', version=7)))
+        self.assertNotEqual(base, response_cache.cache_key(question, self.snapshot(reservas_activas=7)))
+
+    def test_follow_ups_and_unfingerprinted_snapshots_are_not_cached(self):
+        self.assertIsNone(response_cache.cache_key('y eso cuánto es en dólares', self.snapshot()))
+        self.assertIsNone(response_cache.cache_key('dame un consejo para mejorar', SNAPSHOT))
+
+
+class DashboardContextTests(TestCase):
+    def test_version_is_stored_in_the_database(self):
+        start = context.get_version()
+        context.invalidate()
+        context.invalidate()
+        self.assertEqual(context.get_version(), start + 2)
+        self.assertFalse(Sequence.objects.exists())
+
+    def test_blocked_room_keeps_its_own_status(self):
+        Room.objects.create(code='101', floor=1, type='DE', status='Disponible')
+        Room.objects.create(code='102', floor=1, type='DE', status='Disponible')
+        BlockedRoom.objects.create(room='101', reason='Gasfitería', blocked_until=timezone.localdate() + timedelta(days=2))
+        data = context.build_snapshot()
+        states = {room['numero']: room['estado'] for room in data['detalle_habitaciones']}
+        self.assertEqual(states, {'101': 'Bloqueada', '102': 'Disponible'})
+        self.assertEqual(data['habitaciones_ocupadas'], 0)
+        self.assertEqual(data['habitaciones_bloqueadas'], 1)
+        self.assertEqual(data['habitaciones_disponibles'], 1)
+
+
+class FakeModel:
+    def __init__(self, error=None, chunks=('hola',), fail_after=None):
+        self.error = error
+        self.chunks = chunks
+        self.fail_after = fail_after
+
+    def generate_content(self, contents):
+        if self.error:
+            raise self.error
+        return SimpleNamespace(text=''.join(self.chunks))
+
+    async def generate_content_async(self, contents, stream=False):
+        if self.error:
+            raise self.error
+
+        async def chunks():
+            for i, text in enumerate(self.chunks):
+                if self.fail_after is not None and i == self.fail_after:
+                    raise google_exceptions.ServiceUnavailable('cortado')
+                yield SimpleNamespace(text=text)
+        return chunks()
+
+
+@mock.patch.object(gemini, 'ensure_configured', return_value='key')
+@mock.patch.object(gemini, 'candidates', side_effect=lambda: ['a', 'b'])
+class GeminiFallbackTests(SimpleTestCase):
+    def setUp(self):
+        gemini._model_name = None
+
+    def use(self, models):
+        return mock.patch.object(gemini, '_get_model', side_effect=lambda name: models[name])
+
+    def collect(self):
+        async def run():
+            return [text async for text in gemini.stream('hola')]
+        return asyncio.run(run())
+
+    def test_generate_falls_back_on_any_error(self, *_):
+        for error in (google_exceptions.PermissionDenied('no'), google_exceptions.InvalidArgument('no'), ValueError('no')):
+            with self.subTest(error=type(error).__name__), self.use({'a': FakeModel(error), 'b': FakeModel()}):
+                self.assertEqual(gemini.generate('hola'), ('hola', 'b'))
+                self.assertEqual(gemini._model_name, 'b')
+
+    def test_generate_reports_all_errors(self, *_):
+        with self.use({'a': FakeModel(google_exceptions.PermissionDenied('x')), 'b': FakeModel(google_exceptions.NotFound('y'))}):
+            with self.assertRaises(gemini.GeminiUnavailable):
+                gemini.generate('hola')
+
+    def test_stream_falls_back_before_the_first_chunk(self, *_):
+        with self.use({'a': FakeModel(google_exceptions.PermissionDenied('no')), 'b': FakeModel(chunks=('ho', 'la'))}):
+            self.assertEqual(self.collect(), ['ho', 'la'])
+        self.assertEqual(gemini._model_name, 'b')
+
+    def test_stream_error_after_first_chunk_propagates(self, *_):
+        with self.use({'a': FakeModel(chunks=('ho', 'la'), fail_after=1), 'b': FakeModel()}):
+            with self.assertRaises(google_exceptions.ServiceUnavailable):
+                self.collect()
+        self.assertEqual(gemini._model_name, 'a')
+
+
+@override_settings(CHATBOT_HISTORY_TOKEN_BUDGET=100, CHATBOT_SUMMARY_MAX_CHARS=2000)
+class MemoryPrepareTests(TestCase):
+    def setUp(self):
+        self.session = ChatbotSession.objects.create(session_id='s1', user_email='test@hotel.pe')
+
+    def say(self, role, content):
+        return ChatbotMessage.objects.create(session=self.session, role=role, content=content)
+
+    def turn(self, content, snapshot=SNAPSHOT):
+        message = self.say('user', content)
+        return memory.prepare(self.session, message, snapshot, lambda data: 'CONTEXTO ' + json.dumps(data, ensure_ascii=False))
+
+    def test_old_turns_are_folded_once_the_budget_is_exceeded(self):
+        history, _ = self.turn('hola')
+        self.assertEqual(len(history), 2)  # solo el contexto base
+        self.assertEqual(self.session.summary, '')
+
+        old = [self.say('user', 'pregunta antigua ' + 'x' * 400), self.say('assistant', 'respuesta antigua ' + 'y' * 400)]
+        recent = [self.say('user', 'pregunta reciente'), self.say('assistant', 'respuesta reciente')]
+        history, prompt = self.turn('siguiente')
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.summary_until_id, old[-1].id)
+        self.assertIn('Usuario: pregunta antigua', self.session.summary)
+        self.assertIn('Asistente: respuesta antigua', self.session.summary)
+        self.assertLessEqual(max(len(line) for line in self.session.summary.splitlines()), len('Asistente: ') + 161)
+        self.assertIn('Resumen de la conversación anterior', history[2]['parts'][0])
+        self.assertEqual([h['parts'][0] for h in history[-2:]], [m.content for m in recent])
+        self.assertTrue(prompt.endswith('Usuario: siguiente'))
+
+        # Los turnos ya plegados no se vuelven a plegar; el marcador avanza con los nuevos
+        for i in range(3):
+            self.say('assistant', f'respuesta larga {i} ' + 'z' * 200)
+        previous = self.session.summary_until_id
+        self.turn('otra')
+        self.session.refresh_from_db()
+        self.assertGreater(self.session.summary_until_id, previous)
+        self.assertEqual(self.session.summary.count('pregunta antigua'), 1)
+
+    @override_settings(CHATBOT_SUMMARY_MAX_CHARS=200)
+    def test_transcript_drops_the_oldest_lines(self):
+        for i in range(6):
+            self.say('user', f'turno {i} ' + 'x' * 400)
+        self.turn('fin')
+        self.session.refresh_from_db()
+        self.assertLessEqual(len(self.session.summary), 200)
+        self.assertNotIn('turno 0', self.session.summary)
+
+    def test_small_delta_is_sent_and_large_delta_rebases(self):
+        self.turn('hola')
+        _, prompt = self.turn('y ahora', dict(SNAPSHOT, checkins_hoy=4))
+        self.assertIn('Check-ins de hoy: 3 → 4', prompt)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.context_snapshot['checkins_hoy'], 3)
+
+        changed = dict(SNAPSHOT, proximas_reservas=[{'huesped': f'Huésped {i}', 'monto': i} for i in range(40)])
+        history, prompt = self.turn('y ahora?', changed)
+        self.session.refresh_from_db()
+        self.assertEqual(len(self.session.context_snapshot['proximas_reservas']), 40)
+        self.assertNotIn('Datos actualizados', prompt)
+        self.assertIn('Huésped 39', history[0]['parts'][0])
@@ -3,7 +3,9 @@ from . import views
 
 urlpatterns = [
     path('message/', views.process_message, name='process_message'),
+    path('message/stream/', views.stream_message, name='stream_message'),
     path('history/', views.get_conversation_history, name='get_history'),
     path('end-session/', views.end_session, name='end_session'),
+    path('cache-stats/', views.cache_stats, name='chatbot_cache_stats'),
 ]
 
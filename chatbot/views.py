@@ -1,229 +1,14 @@
-import os
-import google.generativeai as genai
+import json
+from asgiref.sync import sync_to_async
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.db import transaction
-from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from .models import ChatbotSession, ChatbotMessage
-from dashboard.views import (
-    dashboard_metrics,
-    monthly_revenue_chart,
-    payment_methods_chart,
-    occupancy_weekly_chart,
-    today_checkins_checkouts,
-    recent_reservations,
-    statistics_chart
-)
-from reservations.models import Reservation
-from cajacobros.models import Payment
-from django.db.models import Sum, Count
-from datetime import datetime, timedelta
-from decimal import Decimal
-
-
-# Configurar Gemini - obtener desde settings o variable de entorno
-def get_gemini_api_key():
-    """Obtiene la API key de Gemini de settings o variable de entorno"""
-    try:
-        api_key = getattr(settings, 'GEMINI_API_KEY', '') or os.environ.get('GEMINI_API_KEY', '')
-        return api_key
-    except:
-        return os.environ.get('GEMINI_API_KEY', '')
-
-# Configurar Gemini al inicio
-GEMINI_API_KEY = get_gemini_api_key()
-if GEMINI_API_KEY:
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-    except Exception as e:
-        print(f"Error al configurar Gemini: {e}")
-
-
-def get_dashboard_context():
-    """Obtiene datos completos del hotel para el contexto del chatbot"""
-    try:
-        from rooms.models import Room
-        
-        now = timezone.localtime()
-        today = now.date()
-        current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        last_month_start = (current_month_start - timedelta(days=1)).replace(day=1)
-        week_start = today - timedelta(days=today.weekday())
-        
-        # ========== INGRESOS ==========
-        # Ingresos del mes actual
-        monthly_revenue = Payment.objects.filter(
-            created_at__gte=current_month_start,
-            status='Completado'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
-        # Ingresos del mes anterior
-        last_month_revenue = Payment.objects.filter(
-            created_at__gte=last_month_start,
-            created_at__lt=current_month_start,
-            status='Completado'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
-        # Ingresos de hoy
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        today_revenue = Payment.objects.filter(
-            created_at__gte=today_start,
-            status='Completado'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
-        # Ingresos de la semana
-        weekly_revenue = Payment.objects.filter(
-            created_at__gte=week_start,
-            status='Completado'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
-        # Pagos por método
-        payment_methods = Payment.objects.filter(
-            created_at__gte=current_month_start,
-            status='Completado'
-        ).values('method').annotate(
-            total=Sum('amount'),
-            count=Count('id')
-        )
-        methods_summary = {p['method']: {'total': float(p['total']), 'count': p['count']} for p in payment_methods}
-        
-        # ========== HABITACIONES ==========
-        total_rooms = Room.objects.count()
-        
-        # Habitaciones ocupadas (con reserva activa hoy)
-        occupied_room_ids = Reservation.objects.filter(
-            check_in__lte=today,
-            check_out__gt=today,
-            status__in=['Confirmada', 'Check-in']
-        ).values_list('room_id', flat=True)
-        occupied_rooms = len(set(occupied_room_ids))
-        
-        available_rooms = total_rooms - occupied_rooms
-        occupancy_rate = (occupied_rooms / total_rooms * 100) if total_rooms > 0 else 0
-        
-        # Detalle de habitaciones
-        rooms_detail = []
-        for room in Room.objects.all()[:20]:  # Limitar a 20 para no sobrecargar
-            is_occupied = room.id in occupied_room_ids
-            rooms_detail.append({
-                'numero': room.room_number,
-                'tipo': room.room_type,
-                'precio': float(room.price),
-                'estado': 'Ocupada' if is_occupied else 'Disponible'
-            })
-        
-        # ========== RESERVAS ==========
-        # Reservas activas hoy
-        active_reservations = Reservation.objects.filter(
-            check_in__lte=today,
-            check_out__gte=today,
-            status__in=['Confirmada', 'Check-in']
-        ).count()
-        
-        # Check-ins de hoy
-        today_checkins = Reservation.objects.filter(
-            check_in=today
-        ).count()
-        
-        # Check-outs de hoy
-        today_checkouts = Reservation.objects.filter(
-            check_out=today
-        ).count()
-        
-        # Reservas pendientes (futuras)
-        pending_reservations = Reservation.objects.filter(
-            check_in__gt=today,
-            status='Confirmada'
-        ).count()
-        
-        # Reservas del mes
-        monthly_reservations = Reservation.objects.filter(
-            created_at__gte=current_month_start
-        ).count()
-        
-        # Reservas canceladas del mes
-        cancelled_reservations = Reservation.objects.filter(
-            created_at__gte=current_month_start,
-            status='Cancelada'
-        ).count()
-        
-        # Próximas reservas (lista)
-        upcoming_reservations = []
-        for res in Reservation.objects.filter(
-            check_in__gte=today,
-            status='Confirmada'
-        ).order_by('check_in')[:10]:
-            upcoming_reservations.append({
-                'codigo': res.reservation_code,
-                'huesped': res.guest_name,
-                'habitacion': res.room.room_number if res.room else 'N/A',
-                'check_in': res.check_in.strftime('%Y-%m-%d'),
-                'check_out': res.check_out.strftime('%Y-%m-%d'),
-                'monto': float(res.total_amount) if res.total_amount else 0
-            })
-        
-        # Huéspedes actuales
-        current_guests = []
-        for res in Reservation.objects.filter(
-            check_in__lte=today,
-            check_out__gte=today,
-            status__in=['Confirmada', 'Check-in']
-        )[:10]:
-            current_guests.append({
-                'nombre': res.guest_name,
-                'habitacion': res.room.room_number if res.room else 'N/A',
-                'check_out': res.check_out.strftime('%Y-%m-%d')
-            })
-        
-        # ========== ESTADÍSTICAS ==========
-        # Total de reservas históricas
-        total_reservations_ever = Reservation.objects.count()
-        
-        # Pagos recientes
-        recent_payments = []
-        for pay in Payment.objects.filter(status='Completado').order_by('-created_at')[:5]:
-            recent_payments.append({
-                'monto': float(pay.amount),
-                'metodo': pay.method,
-                'huesped': pay.guest_name,
-                'fecha': pay.created_at.strftime('%Y-%m-%d %H:%M')
-            })
-        
-        return {
-            'fecha_actual': now.strftime('%Y-%m-%d'),
-            'hora_actual': now.strftime('%H:%M'),
-            # Ingresos
-            'ingresos_mes': float(monthly_revenue),
-            'ingresos_mes_anterior': float(last_month_revenue),
-            'ingresos_hoy': float(today_revenue),
-            'ingresos_semana': float(weekly_revenue),
-            'pagos_por_metodo': methods_summary,
-            # Habitaciones
-            'total_habitaciones': total_rooms,
-            'habitaciones_ocupadas': occupied_rooms,
-            'habitaciones_disponibles': available_rooms,
-            'tasa_ocupacion': round(occupancy_rate, 1),
-            'detalle_habitaciones': rooms_detail,
-            # Reservas
-            'reservas_activas': active_reservations,
-            'checkins_hoy': today_checkins,
-            'checkouts_hoy': today_checkouts,
-            'reservas_pendientes': pending_reservations,
-            'reservas_mes': monthly_reservations,
-            'reservas_canceladas_mes': cancelled_reservations,
-            'proximas_reservas': upcoming_reservations,
-            'huespedes_actuales': current_guests,
-            # Estadísticas
-            'total_reservas_historico': total_reservations_ever,
-            'pagos_recientes': recent_payments,
-        }
-    except Exception as e:
-        import traceback
-        print(f"Error en get_dashboard_context: {e}")
-        print(traceback.format_exc())
-        return {'error': str(e), 'fecha_actual': timezone.localtime().strftime('%Y-%m-%d')}
+from . import gemini, pipeline, response_cache
 
 
 @api_view(['POST'])
@@ -233,23 +18,12 @@ def process_message(request):
         return Response({'error': 'Usuario no autenticado'}, status=status.HTTP_401_UNAUTHORIZED)
     
     # Verificar API key (puede haber cambiado desde el inicio)
-    current_api_key = get_gemini_api_key()
-    if not current_api_key:
+    if not gemini.get_api_key():
         return Response({
             'error': 'API key de Gemini no configurada',
             'message': 'Lo siento, el servicio de IA no está disponible en este momento. Por favor, configura la API key de Gemini en las variables de entorno o en settings.py'
         }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     
-    # Configurar Gemini si no está configurado o si la key cambió
-    if not GEMINI_API_KEY or GEMINI_API_KEY != current_api_key:
-        try:
-            genai.configure(api_key=current_api_key)
-        except Exception as e:
-            return Response({
-                'error': f'Error al configurar Gemini: {str(e)}',
-                'message': 'Error al inicializar el servicio de IA. Por favor, verifica la configuración.'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
     user_email = request.firebase_user.get('email', 'unknown')
     message_text = request.data.get('message', '').strip()
     session_id = request.data.get('session_id', f"session_{timezone.now().timestamp()}_{user_email}")
@@ -258,205 +32,41 @@ def process_message(request):
         return Response({'error': 'Mensaje vacío'}, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        with transaction.atomic():
-            # Obtener o crear sesión
-            session, created = ChatbotSession.objects.get_or_create(
-                session_id=session_id,
-                defaults={'user_email': user_email}
-            )
-            if not created:
-                session.user_email = user_email
-                session.save()
-            
-            # Guardar mensaje del usuario
-            user_message = ChatbotMessage.objects.create(
-                session=session,
-                role='user',
-                content=message_text
-            )
-            
-            # Obtener historial de mensajes (excluyendo el mensaje actual del usuario)
-            # IMPORTANTE: hacer exclude ANTES del slice
-            previous_messages = ChatbotMessage.objects.filter(
-                session=session
-            ).exclude(id=user_message.id).order_by('timestamp')[:20]  # Últimos 20 mensajes (sin el actual)
-            
-            # Obtener contexto del dashboard
-            dashboard_data = get_dashboard_context()
-            
-            # Crear prompt del sistema con contexto completo
-            import json
-            
-            # Formatear datos para el prompt
-            metodos_pago = dashboard_data.get('pagos_por_metodo', {})
-            metodos_str = ', '.join([f"{m}: S/{d['total']:,.2f} ({d['count']} pagos)" for m, d in metodos_pago.items()]) if metodos_pago else 'Sin datos'
-            
-            proximas = dashboard_data.get('proximas_reservas', [])
-            proximas_str = '\n'.join([f"  - {r['codigo']}: {r['huesped']} - Hab {r['habitacion']} - {r['check_in']} al {r['check_out']}" for r in proximas[:5]]) if proximas else '  Sin reservas próximas'
-            
-            huespedes = dashboard_data.get('huespedes_actuales', [])
-            huespedes_str = '\n'.join([f"  - {h['nombre']} - Hab {h['habitacion']} - Sale: {h['check_out']}" for h in huespedes[:5]]) if huespedes else '  Sin huéspedes actualmente'
-            
-            habitaciones = dashboard_data.get('detalle_habitaciones', [])
-            hab_disponibles = [h for h in habitaciones if h['estado'] == 'Disponible']
-            hab_ocupadas = [h for h in habitaciones if h['estado'] == 'Ocupada']
-            
-            system_prompt = f"""Eres un asistente virtual inteligente del Hotel Plaza Trujillo. 
-Tu función es ayudar al personal del hotel con información PRECISA y ACTUALIZADA sobre operaciones, estadísticas y gestión.
-
-═══════════════════════════════════════════════════════════════
-📅 FECHA Y HORA ACTUAL: {dashboard_data.get('fecha_actual', 'N/A')} a las {dashboard_data.get('hora_actual', 'N/A')}
-═══════════════════════════════════════════════════════════════
-
-💰 FINANZAS:
-- Ingresos de HOY: S/ {dashboard_data.get('ingresos_hoy', 0):,.2f}
-- Ingresos de la SEMANA: S/ {dashboard_data.get('ingresos_semana', 0):,.2f}
-- Ingresos del MES ACTUAL: S/ {dashboard_data.get('ingresos_mes', 0):,.2f}
-- Ingresos del MES ANTERIOR: S/ {dashboard_data.get('ingresos_mes_anterior', 0):,.2f}
-- Pagos por método (este mes): {metodos_str}
-
-🏨 HABITACIONES:
-- Total de habitaciones: {dashboard_data.get('total_habitaciones', 0)}
-- Ocupadas: {dashboard_data.get('habitaciones_ocupadas', 0)}
-- Disponibles: {dashboard_data.get('habitaciones_disponibles', 0)}
-- Tasa de ocupación: {dashboard_data.get('tasa_ocupacion', 0)}%
-
-📋 RESERVAS:
-- Reservas activas (huéspedes actuales): {dashboard_data.get('reservas_activas', 0)}
-- Check-ins programados HOY: {dashboard_data.get('checkins_hoy', 0)}
-- Check-outs programados HOY: {dashboard_data.get('checkouts_hoy', 0)}
-- Reservas pendientes (futuras): {dashboard_data.get('reservas_pendientes', 0)}
-- Reservas creadas este mes: {dashboard_data.get('reservas_mes', 0)}
-- Reservas canceladas este mes: {dashboard_data.get('reservas_canceladas_mes', 0)}
-- Total histórico de reservas: {dashboard_data.get('total_reservas_historico', 0)}
-
-👥 HUÉSPEDES ACTUALES EN EL HOTEL:
-{huespedes_str}
-
-📅 PRÓXIMAS RESERVAS:
-{proximas_str}
-
-═══════════════════════════════════════════════════════════════
-
-INSTRUCCIONES:
-- Responde de manera amigable, profesional y concisa
-- USA SIEMPRE los datos proporcionados arriba para responder con precisión
-- Formatea números y montos claramente (ej: S/ 1,234.56)
-- Siempre responde en español
-- Si te preguntan algo que no está en los datos, indica que no tienes esa información específica
-- Sé proactivo y ofrece información útil relacionada con las preguntas"""
-            
-            # Construir historial para Gemini
-            history = []
-            for msg in previous_messages:
-                # Convertir 'assistant' a 'model' para Gemini
-                role = 'model' if msg.role == 'assistant' else 'user'
-                history.append({
-                    'role': role,
-                    'parts': [msg.content]
-                })
-            
-            # Configurar modelo de Gemini
-            # Intentar usar 'gemini-2.5-flash' primero, luego otros modelos como fallback
-            model = None
-            model_name = None
-            model_errors = []
-            
-            # Lista de modelos a intentar en orden (gemini-2.5-flash primero)
-            models_to_try = [
-                'gemini-2.5-flash',
-                'gemini-2.5-flash-exp',
-                'gemini-2.0-flash-exp',
-                'gemini-1.5-flash',
-                'gemini-1.5-pro',
-                'gemini-pro'
-            ]
-            
-            for model_name_attempt in models_to_try:
-                try:
-                    model = genai.GenerativeModel(model_name_attempt)
-                    model_name = model_name_attempt
-                    print(f"✅ Modelo '{model_name}' inicializado correctamente")
-                    break
-                except Exception as e:
-                    error_msg = str(e)
-                    model_errors.append(f"{model_name_attempt}: {error_msg}")
-                    print(f"⚠️  Modelo '{model_name_attempt}' no disponible: {error_msg}")
-                    continue
-            
-            if model is None:
-                return Response({
-                    'error': f'No se pudo inicializar ningún modelo. Errores: {"; ".join(model_errors)}',
-                    'message': 'Error al inicializar el modelo de IA. Por favor, verifica tu API key de Gemini y que tengas acceso a los modelos.'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            # Construir el mensaje completo con contexto del sistema
-            full_message = f"{system_prompt}\n\nUsuario: {message_text}"
-            
-            # Generar respuesta
-            response = None
-            try:
-                # Si hay historial, intentar usar chat con historial
-                if history and len(history) > 0:
-                    try:
-                        chat = model.start_chat(history=history)
-                        response = chat.send_message(full_message)
-                    except Exception as chat_error:
-                        # Si falla con historial, intentar sin historial
-                        print(f"Error con historial, intentando sin historial: {chat_error}")
-                        response = model.generate_content(full_message)
-                else:
-                    # Primera interacción, generar contenido directamente
-                    response = model.generate_content(full_message)
-            except Exception as gen_error:
-                error_msg = str(gen_error)
-                print(f"Error al generar respuesta con {model_name}: {error_msg}")
-                return Response({
-                    'error': f'Error al generar respuesta: {error_msg}',
-                    'message': 'Error al procesar tu mensaje. Por favor, verifica tu API key de Gemini e inténtalo de nuevo.'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            # Extraer el texto de la respuesta
-            assistant_response = None
-            try:
-                assistant_response = response.text
-            except AttributeError:
-                # Si response no tiene atributo text, intentar otras formas
-                try:
-                    if hasattr(response, 'candidates') and len(response.candidates) > 0:
-                        assistant_response = response.candidates[0].content.parts[0].text
-                    elif hasattr(response, 'content'):
-                        if hasattr(response.content, 'parts') and len(response.content.parts) > 0:
-                            assistant_response = response.content.parts[0].text
-                        else:
-                            assistant_response = str(response.content)
-                    else:
-                        assistant_response = str(response)
-                except Exception as extract_error:
-                    print(f"Error al extraer texto de respuesta: {extract_error}")
-                    return Response({
-                        'error': f'Error al procesar respuesta: {str(extract_error)}',
-                        'message': 'Error al procesar la respuesta del asistente. Por favor, inténtalo de nuevo.'
-                    }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            if not assistant_response:
-                return Response({
-                    'error': 'Respuesta vacía de Gemini',
-                    'message': 'El asistente no pudo generar una respuesta. Por favor, inténtalo de nuevo.'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            # Guardar respuesta del asistente
-            assistant_message = ChatbotMessage.objects.create(
-                session=session,
-                role='assistant',
-                content=assistant_response
-            )
-            
+        # La transacción cubre solo la inserción; Gemini se llama fuera de ella
+        turn = pipeline.start_turn(session_id, user_email, message_text)
+        
+        # Generar respuesta con el modelo ya resuelto para este proceso
+        try:
+            if turn.reply:
+                assistant_response = turn.reply
+            else:
+                assistant_response, model_name = gemini.generate(turn.prompt, turn.history)
+        except gemini.GeminiUnavailable as e:
             return Response({
-                'message': assistant_response,
-                'timestamp': assistant_message.timestamp.isoformat(),
-                'session_id': session_id
-            })
+                'error': f'No se pudo inicializar ningún modelo. Errores: {e}',
+                'message': 'Error al inicializar el modelo de IA. Por favor, verifica tu API key de Gemini y que tengas acceso a los modelos.'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except Exception as gen_error:
+            print(f"Error al generar respuesta: {gen_error}")
+            return Response({
+                'error': f'Error al generar respuesta: {gen_error}',
+                'message': 'Error al procesar tu mensaje. Por favor, verifica tu API key de Gemini e inténtalo de nuevo.'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        if not assistant_response:
+            return Response({
+                'error': 'Respuesta vacía de Gemini',
+                'message': 'El asistente no pudo generar una respuesta. Por favor, inténtalo de nuevo.'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        # Guardar respuesta del asistente
+        assistant_message = pipeline.finish_turn(turn, assistant_response)
+        
+        return Response({
+            'message': assistant_response,
+            'timestamp': assistant_message.timestamp.isoformat(),
+            'session_id': session_id
+        })
             
     except Exception as e:
         import traceback
@@ -469,6 +79,84 @@ INSTRUCCIONES:
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@csrf_exempt
+@require_POST
+async def stream_message(request):
+    """
+    Versión asíncrona de process_message que envía la respuesta en streaming
+    (text/event-stream): eventos `delta` con cada fragmento y un `done` final.
+    No ocupa un worker mientras Gemini genera la respuesta.
+    """
+    if not getattr(request, 'firebase_user', None):
+        return JsonResponse({'error': 'Usuario no autenticado'}, status=401)
+    if not gemini.get_api_key():
+        return JsonResponse({
+            'error': 'API key de Gemini no configurada',
+            'message': 'Lo siento, el servicio de IA no está disponible en este momento.'
+        }, status=503)
+    
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+    
+    user_email = request.firebase_user.get('email', 'unknown')
+    message_text = (payload.get('message') or '').strip()
+    session_id = payload.get('session_id') or f"session_{timezone.now().timestamp()}_{user_email}"
+    if not message_text:
+        return JsonResponse({'error': 'Mensaje vacío'}, status=400)
+    
+    turn = await sync_to_async(pipeline.start_turn)(session_id, user_email, message_text)
+    
+    async def events():
+        parts = []
+        try:
+            if turn.reply:
+                parts.append(turn.reply)
+                yield _sse('delta', {'text': turn.reply})
+            else:
+                async for text in gemini.stream(turn.prompt, turn.history):
+                    parts.append(text)
+                    yield _sse('delta', {'text': text})
+        except Exception as e:
+            print(f"Error en chatbot (streaming): {e}")
+            yield _sse('error', {
+                'error': str(e),
+                'message': 'Lo siento, ha ocurrido un error al procesar tu mensaje. Por favor, inténtalo de nuevo.'
+            })
+            return
+        assistant_response = ''.join(parts)
+        if not assistant_response:
+            yield _sse('error', {
+                'error': 'Respuesta vacía de Gemini',
+                'message': 'El asistente no pudo generar una respuesta. Por favor, inténtalo de nuevo.'
+            })
+            return
+        assistant_message = await sync_to_async(pipeline.finish_turn)(turn, assistant_response)
+        yield _sse('done', {
+            'message': assistant_response,
+            'timestamp': assistant_message.timestamp.isoformat(),
+            'session_id': session_id
+        })
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['GET'])
+def cache_stats(request):
+    """Contadores de la caché de respuestas de este proceso (aciertos, fallos, intents)"""
+    if not hasattr(request, 'firebase_user') or not request.firebase_user:
+        return Response({'error': 'Usuario no autenticado'}, status=status.HTTP_401_UNAUTHORIZED)
+    return Response(response_cache.stats())
+
+
 @api_view(['GET'])
 def get_conversation_history(request):
     """Obtiene el historial de conversaciones del usuario"""
@@ -0,0 +1,6 @@
+#!/usr/bin/env bash
+# Tareas periódicas: programar cada 5 minutos (p. ej. un Cron Job de Render con "bash cron.sh")
+set -o errexit
+
+python manage.py sync_reservation_statuses --once   # Transiciones Confirmada/Check-in/Check-out y habitaciones
+python manage.py refresh_laundry_analytics   # Tabla diaria de analytics de lavandería
@@ -0,0 +1,86 @@
+"""
+Motor de ocupación sobre el índice de noches ocupadas (reservations.RoomNight).
+
+Las reservas ya están expandidas en una fila por habitación y noche, así que
+una reserva con varias habitaciones cuenta cada habitación. Cualquier rango de
+fechas y granularidad (día, semana, mes) se resuelve con una consulta agrupada.
+"""
+from datetime import timedelta
+from django.db.models import CharField, Count, Value
+from django.db.models.functions import Cast, Concat
+from reservations.models import Room, RoomNight
+from . import timeseries
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def _reserved_nights():
+    """Noches reservadas de habitaciones existentes (un room_label sin Room no suma capacidad ni ocupación)"""
+    return RoomNight.objects.filter(reservation__isnull=False, room_code__in=Room.objects.values('code'))
+
+
+def _room_nights_count():
+    """Pares (habitación, noche) distintos: una noche con doble reserva cuenta una vez"""
+    return Count(Concat('room_code', Value('|'), Cast('date', CharField())), distinct=True)
+
+
+def _rate(occupied, capacity):
+    return min(round((occupied / capacity) * 100, 1), 100.0) if capacity > 0 else 0
+
+
+def bucket_starts(start, end, granularity='day'):
+    """Inicio de cada bucket que toca el rango [start, end] (ambos inclusive)"""
+    if granularity == 'month':
+        current = start.replace(day=1)
+    elif granularity == 'week':
+        current = start - timedelta(days=start.weekday())
+    else:
+        current = start
+    starts = []
+    while current <= end:
+        starts.append(current)
+        current = timeseries.next_bucket(current, granularity)
+    return starts
+
+
+def occupancy_series(start, end, granularity='day', total_rooms=None):
+    """Ocupación por bucket entre start y end (inclusive).
+
+    La capacidad de cada bucket es habitaciones × noches del bucket dentro del
+    rango, de modo que las semanas o meses parciales de los extremos no se diluyen.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Granularidad inválida: {granularity}')
+    if total_rooms is None:
+        total_rooms = Room.objects.count()
+    starts = bucket_starts(start, end, granularity)
+    qs = _reserved_nights().filter(date__gte=start, date__lte=end)
+    occupied = timeseries.time_series(qs, 'date', _room_nights_count(), starts, kind=granularity)
+
+    result = []
+    for bucket_start, nights in zip(starts, occupied):
+        bucket_end = timeseries.next_bucket(bucket_start, granularity) - timedelta(days=1)
+        days = (min(bucket_end, end) - max(bucket_start, start)).days + 1
+        capacity = total_rooms * days
+        result.append({
+            'start': bucket_start,
+            'end': bucket_end,
+            'occupied_nights': nights,
+            'available_nights': capacity,
+            'rate': _rate(nights, capacity),
+        })
+    return result
+
+
+def occupancy_on(days, total_rooms=None):
+    """Tasa de ocupación (%) en cada una de las fechas indicadas, en una sola consulta"""
+    days = sorted(days)
+    if total_rooms is None:
+        total_rooms = Room.objects.count()
+    counts = timeseries.time_series(
+        _reserved_nights(), 'date', Count('room_code', distinct=True), days, kind='day'
+    )
+    return {
+        day: (min((count / total_rooms) * 100, 100.0) if total_rooms > 0 else 0)
+        for day, count in zip(days, counts)
+    }
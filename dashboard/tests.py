@@ -1,3 +1,31 @@
+from datetime import date
 from django.test import TestCase
+from reservations.models import Reservation, Room, RoomNight
+from . import occupancy
 
-# Create your tests here.
+
+class OccupancySeriesTests(TestCase):
+    def setUp(self):
+        Room.objects.create(code='101', floor=1)
+        Room.objects.create(code='102', floor=1)
+        # Doble reserva de la 101 y una reserva con una habitación que no existe
+        for label in ('101', '101', 'X99'):
+            Reservation.objects.create(
+                channel='Venta Directa', guest_name='Huésped', room_label=label,
+                check_in=date(2030, 1, 1), check_out=date(2030, 1, 3),
+            )
+
+    def test_double_bookings_and_unknown_rooms_do_not_inflate_the_rate(self):
+        self.assertEqual(RoomNight.objects.count(), 6)
+        days = occupancy.occupancy_series(date(2030, 1, 1), date(2030, 1, 3), 'day')
+        self.assertEqual([(d['occupied_nights'], d['rate']) for d in days], [(1, 50.0), (1, 50.0), (0, 0.0)])
+        week = occupancy.occupancy_series(date(2030, 1, 1), date(2030, 1, 3), 'week')
+        self.assertEqual((week[0]['occupied_nights'], week[0]['available_nights']), (2, 6))
+        self.assertEqual(occupancy.occupancy_on([date(2030, 1, 1)])[date(2030, 1, 1)], 50.0)
+
+    def test_rate_never_exceeds_100(self):
+        days = occupancy.occupancy_series(date(2030, 1, 1), date(2030, 1, 1), 'day', total_rooms=0)
+        self.assertEqual(days[0]['rate'], 0)
+        Room.objects.filter(code='102').delete()
+        days = occupancy.occupancy_series(date(2030, 1, 1), date(2030, 1, 1), 'day', total_rooms=1)
+        self.assertEqual(days[0]['rate'], 100.0)
@@ -0,0 +1,99 @@
+"""
+Agregación de series temporales para los gráficos del dashboard.
+
+Agrupa cualquier queryset por día, semana o mes calendario con una sola
+consulta (TruncDay/TruncWeek/TruncMonth en la zona horaria del hotel) y
+devuelve los valores alineados a los buckets pedidos, con ceros donde no hay datos.
+"""
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+from django.conf import settings
+from django.db import models
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+from django.utils import timezone
+
+TRUNCS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+MONTH_NAMES = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
+
+
+def hotel_timezone():
+    return ZoneInfo(settings.TIME_ZONE)
+
+
+def add_months(d, months):
+    """Primer día del mes desplazado `months` meses desde el mes de `d`"""
+    index = d.year * 12 + (d.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_starts(n=12, today=None):
+    """Inicio de los últimos `n` meses calendario (del más antiguo al actual)"""
+    today = today or timezone.localdate()
+    return [add_months(today, -i) for i in range(n - 1, -1, -1)]
+
+
+def next_bucket(start, kind):
+    if kind == 'month':
+        return add_months(start, 1)
+    if kind == 'week':
+        return start + timedelta(days=7)
+    return start + timedelta(days=1)
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value, hotel_timezone()).date() if timezone.is_aware(value) else value.date()
+    return value
+
+
+def time_series(qs, field, aggregate, starts, kind='month', group_by=None, default=0):
+    """Valores de `aggregate` por bucket en una sola consulta agrupada.
+
+    `starts` son las fechas de inicio de cada bucket (ordenadas). Sin `group_by`
+    devuelve una lista alineada a `starts`; con `group_by` devuelve un dict
+    {valor del grupo: lista}.
+    """
+    if not starts:
+        return {} if group_by else []
+    model_field = qs.model._meta.get_field(field)
+    is_datetime = isinstance(model_field, models.DateTimeField)
+    lower, upper = starts[0], next_bucket(starts[-1], kind)
+    if is_datetime:
+        tz = hotel_timezone()
+        lower = datetime.combine(lower, datetime.min.time(), tzinfo=tz)
+        upper = datetime.combine(upper, datetime.min.time(), tzinfo=tz)
+        bucket = TRUNCS[kind](field, tzinfo=tz)
+    else:
+        bucket = TRUNCS[kind](field, output_field=models.DateField())
+
+    group_fields = [group_by] if group_by else []
+    rows = (
+        qs.filter(**{f'{field}__gte': lower, f'{field}__lt': upper})
+        .annotate(bucket=bucket)
+        .order_by()
+        .values('bucket', *group_fields)
+        .annotate(value=aggregate)
+    )
+
+    index = {d: i for i, d in enumerate(starts)}
+    if not group_by:
+        series = [default] * len(starts)
+        for r in rows:
+            i = index.get(_as_date(r['bucket']))
+            if i is not None:
+                series[i] = r['value'] if r['value'] is not None else default
+        return series
+
+    grouped = {}
+    for r in rows:
+        i = index.get(_as_date(r['bucket']))
+        if i is None:
+            continue
+        series = grouped.setdefault(r[group_by], [default] * len(starts))
+        series[i] = r['value'] if r['value'] is not None else default
+    return grouped
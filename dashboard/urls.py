@@ -6,6 +6,7 @@ urlpatterns = [
     path('monthly-revenue/', views.monthly_revenue_chart),
     path('payment-methods/', views.payment_methods_chart),
     path('occupancy-weekly/', views.occupancy_weekly_chart),
+    path('occupancy/', views.occupancy_chart),
     path('today-checkins-checkouts/', views.today_checkins_checkouts),
     path('recent-reservations/', views.recent_reservations),
     path('statistics/', views.statistics_chart),
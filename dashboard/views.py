@@ -2,12 +2,19 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.db.models import Sum, Count, Avg, Q
 from datetime import datetime, timedelta, date
 from decimal import Decimal
 from reservations.models import Reservation, Room, ReservationRoom
-from cajacobros.models import Payment
+from reservations import status_engine, room_status
+from cajacobros.models import Payment, DailyRevenue
+from cajacobros import revenue
 from mantenimiento.models import BlockedRoom
+from . import timeseries, occupancy
+
+# Rango máximo admitido por el endpoint de ocupación
+MAX_OCCUPANCY_RANGE_DAYS = 366 * 3
 
 
 @api_view(['GET'])
@@ -21,18 +28,14 @@ def dashboard_metrics(request):
     last_month_start = (current_month_start - timedelta(days=1)).replace(day=1)
     last_month_end = current_month_start - timedelta(days=1)
     
+    # Ingresos leídos del acumulado diario (daily_revenue)
+    month_start_date = current_month_start.date()
+    
     # Ingresos del mes actual
-    current_month_payments = Payment.objects.filter(
-        created_at__gte=current_month_start,
-        status='Completado'
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    current_month_payments = revenue.revenue_total(start=month_start_date)
     
     # Ingresos del mes anterior
-    last_month_payments = Payment.objects.filter(
-        created_at__gte=last_month_start,
-        created_at__lte=last_month_end,
-        status='Completado'
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    last_month_payments = revenue.revenue_total(start=last_month_start.date(), end=month_start_date)
     
     # Calcular porcentaje de cambio
     monthly_change = 0
@@ -40,15 +43,10 @@ def dashboard_metrics(request):
         monthly_change = ((current_month_payments - last_month_payments) / last_month_payments) * 100
     
     # Ingresos totales (todos los tiempos)
-    total_payments = Payment.objects.filter(
-        status='Completado'
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    total_payments = revenue.revenue_total()
     
-    # Ingresos totales del mes anterior (para comparación)
-    total_payments_last_month = Payment.objects.filter(
-        created_at__lte=last_month_end,
-        status='Completado'
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    # Ingresos totales hasta el fin del mes anterior (para comparación)
+    total_payments_last_month = revenue.revenue_total(end=month_start_date)
     
     total_change = 0
     if total_payments_last_month > 0:
@@ -58,28 +56,11 @@ def dashboard_metrics(request):
     total_rooms = Room.objects.count()
     today = now.date()
     
-    # Reservas activas hoy (check-in <= hoy <= check-out)
-    active_reservations = Reservation.objects.filter(
-        check_in__lte=today,
-        check_out__gte=today,
-        status__in=['Confirmada', 'Check-in']
-    ).count()
-    
-    occupancy_rate = 0
-    if total_rooms > 0:
-        occupancy_rate = (active_reservations / total_rooms) * 100
-    
-    # Tasa de ocupación del mes anterior (mismo día)
+    # Habitaciones ocupadas hoy y hace 30 días (una consulta sobre room_nights)
     last_month_date = today - timedelta(days=30)
-    active_reservations_last_month = Reservation.objects.filter(
-        check_in__lte=last_month_date,
-        check_out__gte=last_month_date,
-        status__in=['Confirmada', 'Check-in']
-    ).count()
-    
-    occupancy_rate_last_month = 0
-    if total_rooms > 0:
-        occupancy_rate_last_month = (active_reservations_last_month / total_rooms) * 100
+    rates = occupancy.occupancy_on([last_month_date, today], total_rooms=total_rooms)
+    occupancy_rate = rates[today]
+    occupancy_rate_last_month = rates[last_month_date]
     
     occupancy_change = occupancy_rate - occupancy_rate_last_month
     
@@ -149,23 +130,12 @@ def monthly_revenue_chart(request):
     if not hasattr(request, 'firebase_user') or not request.firebase_user:
         return Response({'error': 'Usuario no autenticado'}, status=status.HTTP_401_UNAUTHORIZED)
     
-    now = timezone.localtime()
-    data = []
-    
-    for i in range(11, -1, -1):  # Últimos 12 meses
-        month_start = (now.replace(day=1) - timedelta(days=30 * i)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        if month_start.month == 12:
-            month_end = month_start.replace(year=month_start.year + 1, month=1)
-        else:
-            month_end = month_start.replace(month=month_start.month + 1)
-        
-        month_payments = Payment.objects.filter(
-            created_at__gte=month_start,
-            created_at__lt=month_end,
-            status='Completado'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
-        data.append(float(month_payments))
+    # Últimos 12 meses calendario en una sola consulta agrupada
+    months = timeseries.month_starts(12)
+    income = timeseries.time_series(
+        DailyRevenue.objects.filter(status='Completado'), 'date', Sum('total'), months, kind='month'
+    )
+    data = [float(v) for v in income]
     
     return Response({'data': data})
 
@@ -176,19 +146,15 @@ def payment_methods_chart(request):
     if not hasattr(request, 'firebase_user') or not request.firebase_user:
         return Response({'error': 'Usuario no autenticado'}, status=status.HTTP_401_UNAUTHORIZED)
     
-    now = timezone.localtime()
-    current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
     methods = ['Yape', 'Efectivo', 'Tarjeta', 'Transferencia']
+    totals = timeseries.time_series(
+        DailyRevenue.objects.filter(status='Completado'), 'date', Sum('total'),
+        timeseries.month_starts(1), kind='month', group_by='method'
+    )
     data = {}
     
     for method in methods:
-        total = Payment.objects.filter(
-            created_at__gte=current_month_start,
-            method=method,
-            status='Completado'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        data[method] = float(total)
+        data[method] = float(totals.get(method, [0])[0])
     
     return Response({'data': data})
 
@@ -203,138 +169,57 @@ def occupancy_weekly_chart(request):
     if total_rooms == 0:
         return Response({'data': [0] * 7})
     
-    now = timezone.localtime()
-    today = now.date()
-    data = []
+    today = timezone.localdate()
     
-    for i in range(6, -1, -1):  # Últimas 7 semanas
-        week_date = today - timedelta(days=7 * i)
-        active_reservations = Reservation.objects.filter(
-            check_in__lte=week_date,
-            check_out__gte=week_date,
-            status__in=['Confirmada', 'Check-in']
-        ).count()
-        
-        occupancy = (active_reservations / total_rooms) * 100 if total_rooms > 0 else 0
-        data.append(round(occupancy, 1))
+    # Ocupación en la misma fecha de cada una de las últimas 7 semanas
+    probes = [today - timedelta(days=7 * i) for i in range(6, -1, -1)]
+    rates = occupancy.occupancy_on(probes, total_rooms=total_rooms)
+    data = [round(rates[d], 1) for d in probes]
     
     return Response({'data': data})
 
 
-def get_auto_status(reservation):
-    """Calcula el estado automático basado en fechas y horas (igual que el frontend)"""
-    s = reservation.status
-    if s and s.lower() == 'cancelada':
-        return 'Cancelada'
+@api_view(['GET'])
+def occupancy_chart(request):
+    """Ocupación por día, semana o mes en un rango de fechas"""
+    if not hasattr(request, 'firebase_user') or not request.firebase_user:
+        return Response({'error': 'Usuario no autenticado'}, status=status.HTTP_401_UNAUTHORIZED)
     
-    ci = reservation.check_in
-    co = reservation.check_out
-    if not ci or not co:
-        return s or 'Confirmada'
+    today = timezone.localdate()
+    granularity = request.GET.get('granularity') or 'day'
+    if granularity not in occupancy.GRANULARITIES:
+        return Response({'error': 'Granularidad inválida (day, week o month)'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        date_from = parse_date(request.GET['from']) if request.GET.get('from') else today - timedelta(days=29)
+        date_to = parse_date(request.GET['to']) if request.GET.get('to') else today
+    except ValueError:
+        # Fechas bien formadas pero imposibles (p. ej. 2024-02-30)
+        date_from = date_to = None
+    if not date_from or not date_to or date_from > date_to:
+        return Response({'error': 'Fechas inválidas'}, status=status.HTTP_400_BAD_REQUEST)
+    if (date_to - date_from).days > MAX_OCCUPANCY_RANGE_DAYS:
+        return Response({'error': f'El rango máximo es de {MAX_OCCUPANCY_RANGE_DAYS} días'}, status=status.HTTP_400_BAD_REQUEST)
     
-    now = timezone.localtime()
-    today = now.date()
-    now_hm = now.strftime('%H:%M')
-    
-    arr_time = reservation.arrival_time
-    arr_hm = arr_time.strftime('%H:%M') if arr_time else ''
-    dep_time = reservation.departure_time
-    dep_hm = dep_time.strftime('%H:%M') if dep_time else ''
-    
-    # Antes del check-in
-    if today < ci:
-        return 'Confirmada'
-    
-    # Si hay hora de salida configurada
-    if dep_hm:
-        if today < co:
-            if today >= ci:
-                if today == ci and arr_hm and now_hm < arr_hm:
-                    return 'Confirmada'
-                return 'Check-in'
-            return 'Confirmada'
-        
-        if today >= co:
-            if today == co:
-                if now_hm >= dep_hm:
-                    return 'Check-out'
-                else:
-                    return 'Check-in'
-            return 'Check-out'
-    
-    # Si NO hay hora de salida configurada
-    if ci == co:
-        if today < ci:
-            return 'Confirmada'
-        if today == ci:
-            if arr_hm and now_hm < arr_hm:
-                return 'Confirmada'
-            return 'Check-in'
-        if today > ci:
-            return 'Check-out'
-    else:
-        if today == ci:
-            if arr_hm and now_hm < arr_hm:
-                return 'Confirmada'
-            return 'Check-in'
-        if today > ci and today < co:
-            return 'Check-in'
-        if today >= co:
-            return 'Check-out'
-    
-    return 'Check-in'
-
-
-def sync_reservation_status(reservation):
-    """Sincroniza el estado calculado con la base de datos si es diferente"""
-    if reservation.status and reservation.status.lower() == 'cancelada':
-        return reservation.status  # No cambiar reservas canceladas
-    
-    auto_status = get_auto_status(reservation)
-    if reservation.status != auto_status:
-        reservation.status = auto_status
-        reservation.save(update_fields=['status'])
-    return auto_status
-
-
-def sync_room_statuses():
-    """Sincroniza el estado de todas las habitaciones basándose en reservas y bloqueos"""
-    today = timezone.localtime().date()
-    updated_count = 0
-    
-    # Obtener habitaciones bloqueadas actualmente
-    blocked_rooms = set()
-    for br in BlockedRoom.objects.filter(blocked_until__gte=today):
-        blocked_rooms.add(str(br.room).strip())
-    
-    # Obtener habitaciones ocupadas (reservas con estado Check-in)
-    occupied_rooms = set()
-    checkin_reservations = Reservation.objects.filter(status='Check-in')
-    for res in checkin_reservations:
-        # Habitación principal
-        if res.room_label:
-            occupied_rooms.add(str(res.room_label).strip())
-        # Habitaciones asignadas
-        for ar in res.assigned_rooms.all():
-            occupied_rooms.add(str(ar.room_code).strip())
-    
-    # Actualizar estado de cada habitación
-    for room in Room.objects.all():
-        room_code = str(room.code).strip()
-        
-        if room_code in blocked_rooms:
-            new_status = 'Bloqueada'
-        elif room_code in occupied_rooms:
-            new_status = 'Ocupada'
-        else:
-            new_status = 'Disponible'
-        
-        if room.status != new_status:
-            room.status = new_status
-            room.save(update_fields=['status'])
-            updated_count += 1
+    total_rooms = Room.objects.count()
+    series = occupancy.occupancy_series(date_from, date_to, granularity, total_rooms=total_rooms)
     
-    return updated_count
+    return Response({
+        'from': date_from.strftime('%Y-%m-%d'),
+        'to': date_to.strftime('%Y-%m-%d'),
+        'granularity': granularity,
+        'total_rooms': total_rooms,
+        'data': [
+            {
+                'start': b['start'].strftime('%Y-%m-%d'),
+                'end': b['end'].strftime('%Y-%m-%d'),
+                'occupied_nights': b['occupied_nights'],
+                'available_nights': b['available_nights'],
+                'rate': b['rate'],
+            }
+            for b in series
+        ]
+    })
 
 
 @api_view(['GET'])
@@ -345,13 +230,7 @@ def today_checkins_checkouts(request):
     
     today = timezone.localtime().date()
     
-    # Sincronizar estados de todas las reservas activas (no canceladas)
-    active_reservations = Reservation.objects.exclude(status='Cancelada')
-    for res in active_reservations:
-        sync_reservation_status(res)
-    
-    # Sincronizar estados de habitaciones
-    sync_room_statuses()
+    # Los estados los mantiene el cron (sync_reservation_statuses --once); aquí solo se leen
     
     # Check-ins de hoy - Reservas con estado "Confirmada" (pendientes de llegar)
     checkins = Reservation.objects.filter(
@@ -397,24 +276,17 @@ def sync_all_statuses(request):
     if not hasattr(request, 'firebase_user') or not request.firebase_user:
         return Response({'error': 'Usuario no autenticado'}, status=status.HTTP_401_UNAUTHORIZED)
     
-    # Sincronizar reservas
-    reservations_updated = 0
-    active_reservations = Reservation.objects.exclude(status='Cancelada')
-    
-    for res in active_reservations:
-        old_status = res.status
-        new_status = sync_reservation_status(res)
-        if old_status != new_status:
-            reservations_updated += 1
+    # Sincronizar reservas (solo las transiciones vencidas)
+    reservations_updated = len(status_engine.apply_due_transitions())
     
     # Sincronizar habitaciones
-    rooms_updated = sync_room_statuses()
+    rooms_updated = len(room_status.sync_room_statuses())
     
     return Response({
         'message': 'Estados sincronizados correctamente',
         'reservations_updated': reservations_updated,
         'rooms_updated': rooms_updated,
-        'total_reservations': active_reservations.count(),
+        'total_reservations': Reservation.objects.exclude(status='Cancelada').count(),
         'total_rooms': Room.objects.count()
     })
 
@@ -453,28 +325,13 @@ def statistics_chart(request):
     if not hasattr(request, 'firebase_user') or not request.firebase_user:
         return Response({'error': 'Usuario no autenticado'}, status=status.HTTP_401_UNAUTHORIZED)
     
-    now = timezone.localtime()
-    income_data = []
-    labels = []
-    
-    month_names = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
-    
-    for i in range(11, -1, -1):  # Últimos 12 meses (año completo)
-        month_start = (now.replace(day=1) - timedelta(days=30 * i)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        if month_start.month == 12:
-            month_end = month_start.replace(year=month_start.year + 1, month=1)
-        else:
-            month_end = month_start.replace(month=month_start.month + 1)
-        
-        # Ingresos (pagos completados)
-        income = Payment.objects.filter(
-            created_at__gte=month_start,
-            created_at__lt=month_end,
-            status='Completado'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
-        income_data.append(float(income))
-        labels.append(month_names[month_start.month - 1])
+    # Últimos 12 meses calendario (año completo) en una sola consulta agrupada
+    months = timeseries.month_starts(12)
+    income = timeseries.time_series(
+        DailyRevenue.objects.filter(status='Completado'), 'date', Sum('total'), months, kind='month'
+    )
+    income_data = [float(v) for v in income]
+    labels = [timeseries.MONTH_NAMES[m.month - 1] for m in months]
     
     return Response({
         'income': income_data,
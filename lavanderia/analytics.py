@@ -0,0 +1,189 @@
+"""
+Analytics de lavandería: turnaround, demanda diaria y par de stock por categoría.
+
+Los datos salen de la tabla materializada LaundryDailyStat (una fila por día
+con unidades enviadas/retornadas por categoría, check-outs del día e
+histograma de horas de turnaround de las órdenes retornadas). refresh() solo
+recalcula los últimos LAUNDRY_ANALYTICS_LOOKBACK_DAYS días (o desde el último
+día materializado); el primer refresh carga LAUNDRY_ANALYTICS_HISTORY_DAYS.
+Lo ejecuta el cron (refresh_laundry_analytics, ver cron.sh), nunca una
+petición GET, y las ejecuciones simultáneas se serializan con un bloqueo de
+fila (LaundryAnalyticsState) en la base de datos.
+
+Par recomendado por categoría (stock rotativo fuera de las habitaciones):
+    ciclo = ceil(turnaround p90 en días) + 1 día en estante
+    par = ceil(demanda diaria × ciclo + z × desviación diaria × √ciclo)
+donde la demanda diaria es el máximo entre el promedio histórico y la
+proyección de los check-outs futuros × unidades por check-out.
+"""
+import math
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+from dashboard.timeseries import time_series, hotel_timezone
+from reservations.models import Reservation
+from .models import LaundryAnalyticsState, LaundryOrder, LaundryStock, LaundryDailyStat
+
+STATE_PK = 1  # Fila única de LaundryAnalyticsState
+SAFETY_Z = 1.65  # ~95 % de nivel de servicio
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _days(start, end):
+    """Fechas de start a end (ambas incluidas)"""
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def _checkouts():
+    return Reservation.objects.exclude(status="Cancelada")
+
+
+@transaction.atomic
+def refresh(today=None, full=False):
+    """Recalcula las filas diarias desde el último día materializado (menos el lookback) hasta hoy"""
+    # Otro refresh en curso (otro worker o el cron) espera aquí hasta que el primero confirme
+    state, _ = LaundryAnalyticsState.objects.select_for_update().get_or_create(pk=STATE_PK)
+    today = today or timezone.localdate()
+    last = None if full else LaundryDailyStat.objects.aggregate(last=Max("date"))["last"]
+    if last:
+        start = min(last, today) - timedelta(days=_setting("LAUNDRY_ANALYTICS_LOOKBACK_DAYS", 3))
+    else:
+        start = today - timedelta(days=_setting("LAUNDRY_ANALYTICS_HISTORY_DAYS", 365) - 1)
+    days = _days(start, today)
+
+    orders = LaundryOrder.objects.all()
+    returned = LaundryOrder.objects.filter(status="Retornado")
+    units_sent = time_series(orders, "created_at", Sum("items__quantity"), days, "day", group_by="items__category")
+    units_returned = time_series(returned, "returned_at", Sum("items__quantity"), days, "day", group_by="items__category")
+    orders_sent = time_series(orders, "created_at", Count("id"), days, "day")
+    orders_returned = time_series(returned, "returned_at", Count("id"), days, "day")
+    checkouts = time_series(_checkouts(), "check_out", Count("id"), days, "day")
+
+    # Histograma de turnaround por día de retorno (solo las órdenes retornadas en el rango)
+    histograms = [{} for _ in days]
+    since = datetime.combine(start, datetime.min.time(), tzinfo=hotel_timezone())
+    for created_at, returned_at in returned.filter(returned_at__gte=since).values_list("created_at", "returned_at"):
+        i = (timezone.localtime(returned_at, hotel_timezone()).date() - start).days
+        if 0 <= i < len(days):
+            hours = str(max(0, int((returned_at - created_at).total_seconds() // 3600)))
+            histograms[i][hours] = histograms[i].get(hours, 0) + 1
+
+    def per_category(series, i):
+        return {cat: values[i] for cat, values in series.items() if cat and values[i]}
+
+    LaundryDailyStat.objects.filter(date__gte=start).delete()
+    LaundryDailyStat.objects.bulk_create([
+        LaundryDailyStat(
+            date=day,
+            checkouts=checkouts[i],
+            orders_sent=orders_sent[i],
+            orders_returned=orders_returned[i],
+            units_sent=per_category(units_sent, i),
+            units_returned=per_category(units_returned, i),
+            turnaround_hours=histograms[i],
+        )
+        for i, day in enumerate(days)
+    ])
+    state.refreshed_at = timezone.now()
+    state.save(update_fields=["refreshed_at"])
+    return len(days)
+
+
+def percentile(histogram, q):
+    """Percentil q (0-100) de un histograma {valor: frecuencia}"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = q / 100 * total
+    seen = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        if seen >= rank:
+            return value
+    return max(histogram)
+
+
+def _std(values):
+    if len(values) < 2:
+        return 0.0
+    mean = sum(values) / len(values)
+    return math.sqrt(sum((v - mean) ** 2 for v in values) / (len(values) - 1))
+
+
+def par_level(daily_demand, cycle_days, daily_std):
+    """Par recomendado: demanda del ciclo más stock de seguridad (z × desviación × √ciclo)"""
+    return math.ceil(daily_demand * cycle_days + SAFETY_Z * daily_std * math.sqrt(cycle_days))
+
+
+def summary(window=None, today=None):
+    """Turnaround, demanda y par recomendado por categoría sobre los últimos `window` días"""
+    today = today or timezone.localdate()
+    window = window or _setting("LAUNDRY_ANALYTICS_WINDOW_DAYS", 90)
+    forecast_days = _setting("LAUNDRY_ANALYTICS_FORECAST_DAYS", 14)
+    days = _days(today - timedelta(days=window - 1), today)
+    rows = {row.date: row for row in LaundryDailyStat.objects.filter(date__gte=days[0], date__lte=today)}
+    refreshed = LaundryAnalyticsState.objects.filter(pk=STATE_PK).values_list("refreshed_at", flat=True).first()
+
+    histogram = {}
+    for row in rows.values():
+        for hours, count in row.turnaround_hours.items():
+            histogram[int(hours)] = histogram.get(int(hours), 0) + count
+    p90 = percentile(histogram, 90)
+    cycle_days = (math.ceil(p90 / 24) if p90 is not None else 1) + 1
+
+    total_checkouts = sum(row.checkouts for row in rows.values())
+    future = _days(today + timedelta(days=1), today + timedelta(days=forecast_days))
+    forecast = time_series(_checkouts(), "check_out", Count("id"), future, "day")
+    forecast_per_day = sum(forecast) / len(forecast) if forecast else 0
+
+    stock = {s.category: s for s in LaundryStock.objects.all()}
+    categories = []
+    for code, label in LaundryStock.CATEGORY_CHOICES:
+        daily = [rows[d].units_sent.get(code, 0) if d in rows else 0 for d in days]
+        sent = sum(daily)
+        avg_daily = sent / len(days)
+        per_checkout = sent / total_checkouts if total_checkouts else None
+        forecast_daily = per_checkout * forecast_per_day if per_checkout is not None else None
+        demand = max(avg_daily, forecast_daily or 0)
+        par = par_level(demand, cycle_days, _std(daily))
+        row = stock.get(code)
+        usable = (row.total - row.danado) if row else 0
+        categories.append({
+            "category": code,
+            "label": label,
+            "units_sent": sent,
+            "avg_daily": round(avg_daily, 2),
+            "peak_daily": max(daily) if daily else 0,
+            "units_per_checkout": round(per_checkout, 2) if per_checkout is not None else None,
+            "forecast_daily": round(forecast_daily, 2) if forecast_daily is not None else None,
+            "par_level": par,
+            "stock_total": row.total if row else 0,
+            "usable": usable,
+            "gap": par - usable,
+        })
+
+    return {
+        "window_days": window,
+        "from": days[0].isoformat(),
+        "to": today.isoformat(),
+        "turnaround": {
+            "orders": sum(histogram.values()),
+            "p50_hours": percentile(histogram, 50),
+            "p90_hours": p90,
+            "p95_hours": percentile(histogram, 95),
+            "cycle_days": cycle_days,
+        },
+        "demand": {
+            "checkouts": total_checkouts,
+            "checkouts_per_day": round(total_checkouts / len(days), 2),
+            "forecast_days": forecast_days,
+            "forecast_checkouts_per_day": round(forecast_per_day, 2),
+        },
+        "categories": categories,
+        "refreshed_at": refreshed.isoformat() if refreshed else None,
+    }
@@ -0,0 +1,233 @@
+"""
+Motor de movimientos de stock de lavandería.
+
+Un movimiento (envío, retorno, daño, reparación o ajuste) puede tocar varias
+categorías a la vez y se aplica completo o no se aplica: en una transacción
+se bloquean las filas de LaundryStock involucradas (select_for_update, en
+orden de categoría para evitar interbloqueos), se validan todos los saldos y
+se actualizan con un solo bulk_update. Si alguna categoría quedaría en
+negativo se lanza InsufficientStock y nada cambia.
+
+Cada categoría movida deja una fila en StockMovement. La suma de los deltas
+por categoría reconstruye el stock (ver balances()).
+
+Invariante de cada fila, garantizada por las escrituras (apply y set_levels):
+total = disponible + lavanderia + danado, sin valores negativos. Las lecturas
+no corrigen nada; las desviaciones las detecta y repara reconcile().
+"""
+from django.db import transaction
+from django.db.models import Sum
+from .models import LaundryStock, StockMovement
+
+FIELDS = ("total", "disponible", "lavanderia", "danado")
+CATEGORIES = [code for code, _ in LaundryStock.CATEGORY_CHOICES]
+
+
+class InsufficientStock(Exception):
+    def __init__(self, deficits):
+        super().__init__("Stock insuficiente")
+        self.deficits = deficits
+
+
+class InvalidStock(ValueError):
+    """Un cambio manual dejaría la fila fuera del invariante"""
+
+
+def _levels(row):
+    return {field: getattr(row, field) for field in FIELDS}
+
+
+def violations(row):
+    """Problemas del invariante en una fila (lista vacía si está consistente)"""
+    problems = [f"{field} negativo" for field in FIELDS if getattr(row, field) < 0]
+    if row.total != row.disponible + row.lavanderia + row.danado:
+        problems.append(f"total {row.total} != disponible + lavanderia + danado ({row.disponible + row.lavanderia + row.danado})")
+    return problems
+
+
+def order_quantities(order):
+    """{categoría: cantidad} de una orden (solo categorías con cantidad)"""
+    return {item.category: item.quantity for item in order.items.all() if item.quantity}
+
+
+def apply(kind, deltas, order=None, user_email=None):
+    """Aplica {categoría: {campo: delta}} de forma atómica y registra el movimiento.
+
+    Devuelve las filas de LaundryStock actualizadas, por categoría.
+    """
+    deltas = {cat: {f: int(v) for f, v in d.items() if v} for cat, d in deltas.items()}
+    deltas = {cat: d for cat, d in deltas.items() if d}
+    if not deltas:
+        return {}
+    for cat, d in deltas.items():
+        # Mover entre estados no cambia el total; solo un ajuste puede hacerlo
+        if sum(v for f, v in d.items() if f != "total") != d.get("total", 0):
+            raise ValueError(f"Movimiento de {cat} rompe total = disponible + lavanderia + danado")
+    with transaction.atomic():
+        categories = sorted(deltas)
+        # Crea las categorías que aún no tienen fila (no hace nada si ya existen)
+        LaundryStock.objects.bulk_create(
+            [LaundryStock(category=cat) for cat in categories], ignore_conflicts=True
+        )
+        rows = {
+            s.category: s
+            for s in LaundryStock.objects.select_for_update().filter(category__in=categories).order_by("category")
+        }
+
+        deficits = []
+        for cat in categories:
+            row = rows[cat]
+            for field, delta in deltas[cat].items():
+                if getattr(row, field) + delta < 0:
+                    deficits.append({
+                        "category": cat,
+                        "field": field,
+                        "needed": -delta,
+                        "available": getattr(row, field),
+                    })
+        if deficits:
+            raise InsufficientStock(deficits)
+
+        for cat in categories:
+            row = rows[cat]
+            for field, delta in deltas[cat].items():
+                setattr(row, field, getattr(row, field) + delta)
+        LaundryStock.objects.bulk_update(list(rows.values()), list(FIELDS))
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                category=cat,
+                kind=kind,
+                order=order,
+                user_email=user_email,
+                **{f"delta_{field}": delta for field, delta in deltas[cat].items()},
+            )
+            for cat in categories
+        ])
+    return rows
+
+
+def send(order, quantities=None, user_email=None):
+    """Disponible → lavandería para todas las categorías de la orden"""
+    quantities = order_quantities(order) if quantities is None else quantities
+    return apply("ENVIO", {
+        cat: {"disponible": -qty, "lavanderia": qty} for cat, qty in quantities.items()
+    }, order=order, user_email=user_email)
+
+
+def receive(order, user_email=None):
+    """Lavandería → disponible al retornar la orden"""
+    return apply("RETORNO", {
+        cat: {"disponible": qty, "lavanderia": -qty} for cat, qty in order_quantities(order).items()
+    }, order=order, user_email=user_email)
+
+
+def _positive(qty):
+    if qty <= 0:
+        raise ValueError("La cantidad debe ser mayor a 0")
+    return qty
+
+
+def damage(category, qty, user_email=None):
+    _positive(qty)
+    return apply("DANO", {category: {"disponible": -qty, "danado": qty}}, user_email=user_email)
+
+
+def repair(category, qty, user_email=None):
+    _positive(qty)
+    return apply("REPARACION", {category: {"disponible": qty, "danado": -qty}}, user_email=user_email)
+
+
+def _adjustment(category, before, after, user_email=None):
+    deltas = {f"delta_{field}": after[field] - before[field] for field in FIELDS if after[field] != before[field]}
+    if deltas:
+        return StockMovement(category=category, kind="AJUSTE", user_email=user_email, **deltas)
+    return None
+
+
+def set_levels(category, edits, user_email=None):
+    """Ajuste manual de una categoría. `edits` trae uno de total, disponible, lavanderia o danado
+    (si trae varios, gana el primero en ese orden) y el resto se deriva del invariante.
+    """
+    with transaction.atomic():
+        row, _ = LaundryStock.objects.select_for_update().get_or_create(category=category)
+        before = _levels(row)
+        if "total" in edits:
+            row.total = max(0, int(edits["total"]))
+            row.disponible = row.total - row.lavanderia - row.danado
+        elif "disponible" in edits:
+            row.disponible = max(0, int(edits["disponible"]))
+            row.total = row.disponible + row.lavanderia + row.danado
+        elif "lavanderia" in edits:
+            row.lavanderia = max(0, int(edits["lavanderia"]))
+            row.disponible = row.total - row.lavanderia - row.danado
+        elif "danado" in edits:
+            row.danado = max(0, int(edits["danado"]))
+            row.disponible = row.total - row.lavanderia - row.danado
+        else:
+            return row
+        if row.disponible < 0:
+            raise InvalidStock(
+                f"La suma de sucias ({row.lavanderia}) y dañadas ({row.danado}) no puede exceder el total ({row.total})"
+            )
+        movement = _adjustment(category, before, _levels(row), user_email)
+        if movement:
+            row.save(update_fields=list(FIELDS))
+            movement.save()
+    return row
+
+
+def balances(category=None):
+    """Stock reconstruido desde el libro: {categoría: {total, disponible, lavanderia, danado}}"""
+    qs = StockMovement.objects.all()
+    if category:
+        qs = qs.filter(category=category)
+    rows = qs.order_by().values("category").annotate(**{field: Sum(f"delta_{field}") for field in FIELDS})
+    return {row["category"]: {field: row[field] or 0 for field in FIELDS} for row in rows}
+
+
+def drift():
+    """Filas fuera del invariante o distintas del libro: [{category, stock, ledger, problems}]"""
+    ledger_levels = balances()
+    report = []
+    for row in LaundryStock.objects.order_by("category"):
+        problems = violations(row)
+        expected = ledger_levels.get(row.category, dict.fromkeys(FIELDS, 0))
+        if _levels(row) != expected:
+            problems.append("no coincide con el libro de movimientos")
+        if problems:
+            report.append({"category": row.category, "stock": _levels(row), "ledger": expected, "problems": problems})
+    return report
+
+
+def reconcile(source="stock", user_email=None):
+    """Corrige en bloque las filas con desviaciones y devuelve el reporte de lo corregido.
+
+    source="stock": se repara el invariante en la fila (disponible = total - lavanderia -
+    danado, subiendo el total si no alcanza) y el libro se alinea con un AJUSTE.
+    source="ledger": la fila se reconstruye desde la suma de movimientos.
+    """
+    with transaction.atomic():
+        # Bloquear antes de medir: ningún movimiento se cuela entre el reporte y la corrección
+        locked = {s.category: s for s in LaundryStock.objects.select_for_update().order_by("category")}
+        report = drift()
+        if not report:
+            return []
+        rows = {item["category"]: locked[item["category"]] for item in report}
+        movements = []
+        for item in report:
+            row = rows[item["category"]]
+            if source == "ledger":
+                target = item["ledger"]
+            else:
+                target = {field: max(0, value) for field, value in _levels(row).items()}
+                target["disponible"] = max(0, target["total"] - target["lavanderia"] - target["danado"])
+                target["total"] = target["disponible"] + target["lavanderia"] + target["danado"]
+            for field, value in target.items():
+                setattr(row, field, value)
+            movement = _adjustment(row.category, item["ledger"], target, user_email)
+            if movement:
+                movements.append(movement)
+            item["fixed"] = target
+        LaundryStock.objects.bulk_update(list(rows.values()), list(FIELDS))
+        StockMovement.objects.bulk_create(movements)
+    return report
@@ -0,0 +1,32 @@
+"""
+Comando de Django para detectar y corregir desviaciones del stock de lavandería
+Ejecutar con: python manage.py reconcile_laundry_stock [--fix] [--source stock|ledger]
+"""
+from django.core.management.base import BaseCommand
+from lavanderia import ledger
+
+
+class Command(BaseCommand):
+    help = 'Reporta las categorías con total != disponible + lavandería + dañado o distintas del libro de movimientos, y opcionalmente las corrige'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Corregir las desviaciones (por defecto solo se reportan)')
+        parser.add_argument(
+            '--source', choices=['stock', 'ledger'], default='stock',
+            help='stock: reparar la fila y alinear el libro con un ajuste; ledger: reconstruir la fila desde el libro',
+        )
+
+    def handle(self, *args, **options):
+        report = ledger.reconcile(options['source'], user_email='reconcile_laundry_stock') if options['fix'] else ledger.drift()
+        if not report:
+            self.stdout.write(self.style.SUCCESS('✓ Stock de lavandería consistente'))
+            return
+        for item in report:
+            self.stdout.write(self.style.WARNING(f"{item['category']}: {'; '.join(item['problems'])}"))
+            self.stdout.write(f"   stock={item['stock']} libro={item['ledger']}")
+            if 'fixed' in item:
+                self.stdout.write(self.style.SUCCESS(f"   → {item['fixed']}"))
+        if options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'✓ Categorías corregidas: {len(report)}'))
+        else:
+            self.stdout.write(self.style.WARNING(f'Categorías con desviaciones: {len(report)} (usa --fix para corregir)'))
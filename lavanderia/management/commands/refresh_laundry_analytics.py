@@ -0,0 +1,18 @@
+"""
+Comando de Django para actualizar la tabla diaria de analytics de lavandería
+Ejecutar con: python manage.py refresh_laundry_analytics [--full]
+"""
+from django.core.management.base import BaseCommand
+from lavanderia import analytics
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los últimos días de la tabla diaria de lavandería (envíos, retornos, turnaround y check-outs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recalcular todo el historial (LAUNDRY_ANALYTICS_HISTORY_DAYS)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Actualizando analytics de lavandería...'))
+        days = analytics.refresh(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Días recalculados: {days}'))
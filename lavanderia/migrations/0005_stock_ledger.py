@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def opening_balances(apps, schema_editor):
+    """Un movimiento APERTURA por categoría con el stock actual, base del libro"""
+    LaundryStock = apps.get_model('lavanderia', 'LaundryStock')
+    StockMovement = apps.get_model('lavanderia', 'StockMovement')
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            category=s.category,
+            kind='APERTURA',
+            delta_total=s.total,
+            delta_disponible=s.disponible,
+            delta_lavanderia=s.lavanderia,
+            delta_danado=s.danado,
+        )
+        for s in LaundryStock.objects.all()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lavanderia', '0004_laundrystock_total'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('TOALLAS_GRANDE', 'Toalla grande'), ('TOALLAS_MEDIANA', 'Toalla mediana'), ('TOALLAS_CHICA', 'Toalla chica'), ('SABANAS_MEDIA', 'Sábana 1/2 plaza'), ('SABANAS_UNA', 'Sábana 1 plaza'), ('CUBRECAMAS_MEDIA', 'Cubrecama 1/2 plaza'), ('CUBRECAMAS_UNA', 'Cubrecama 1 plaza'), ('FUNDAS', 'Funda de almohada')], max_length=32)),
+                ('kind', models.CharField(choices=[('APERTURA', 'Saldo inicial'), ('ENVIO', 'Envío a lavandería'), ('RETORNO', 'Retorno de lavandería'), ('DANO', 'Dañado'), ('REPARACION', 'Reparado'), ('AJUSTE', 'Ajuste manual')], max_length=16)),
+                ('delta_total', models.IntegerField(default=0)),
+                ('delta_disponible', models.IntegerField(default=0)),
+                ('delta_lavanderia', models.IntegerField(default=0)),
+                ('delta_danado', models.IntegerField(default=0)),
+                ('user_email', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='lavanderia.laundryorder')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['category', 'created_at'], name='laundry_mov_category_idx')],
+            },
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
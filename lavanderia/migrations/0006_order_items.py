@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Columna histórica de LaundryOrder → categoría
+LEGACY_FIELDS = [
+    ('TOALLAS_GRANDE', 'toalla_grande'),
+    ('TOALLAS_MEDIANA', 'toalla_mediana'),
+    ('TOALLAS_CHICA', 'toalla_chica'),
+    ('SABANAS_MEDIA', 'sabana_media_plaza'),
+    ('SABANAS_UNA', 'sabana_una_plaza'),
+    ('CUBRECAMAS_MEDIA', 'cubrecama_media_plaza'),
+    ('CUBRECAMAS_UNA', 'cubrecama_una_plaza'),
+    ('FUNDAS', 'funda'),
+]
+
+
+def backfill_items(apps, schema_editor):
+    """Una línea por cada columna con cantidad de las órdenes existentes"""
+    LaundryOrder = apps.get_model('lavanderia', 'LaundryOrder')
+    LaundryOrderItem = apps.get_model('lavanderia', 'LaundryOrderItem')
+    items = []
+    for order in LaundryOrder.objects.values('id', *[field for _, field in LEGACY_FIELDS]).iterator():
+        for category, field in LEGACY_FIELDS:
+            if order[field]:
+                items.append(LaundryOrderItem(order_id=order['id'], category=category, quantity=order[field]))
+    LaundryOrderItem.objects.bulk_create(items, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lavanderia', '0005_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LaundryOrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('TOALLAS_GRANDE', 'Toalla grande'), ('TOALLAS_MEDIANA', 'Toalla mediana'), ('TOALLAS_CHICA', 'Toalla chica'), ('SABANAS_MEDIA', 'Sábana 1/2 plaza'), ('SABANAS_UNA', 'Sábana 1 plaza'), ('CUBRECAMAS_MEDIA', 'Cubrecama 1/2 plaza'), ('CUBRECAMAS_UNA', 'Cubrecama 1 plaza'), ('FUNDAS', 'Funda de almohada')], max_length=32)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='lavanderia.laundryorder')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category', 'order'], name='laundry_item_category_idx')],
+                'unique_together': {('order', 'category')},
+            },
+        ),
+        migrations.RunPython(backfill_items, migrations.RunPython.noop),
+    ] + [
+        migrations.RemoveField(model_name='laundryorder', name=field)
+        for _, field in LEGACY_FIELDS
+    ]
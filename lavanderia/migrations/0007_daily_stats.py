@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lavanderia', '0006_order_items'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LaundryDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('checkouts', models.PositiveIntegerField(default=0)),
+                ('orders_sent', models.PositiveIntegerField(default=0)),
+                ('orders_returned', models.PositiveIntegerField(default=0)),
+                ('units_sent', models.JSONField(default=dict, help_text='{categoría: unidades enviadas}')),
+                ('units_returned', models.JSONField(default=dict, help_text='{categoría: unidades retornadas}')),
+                ('turnaround_hours', models.JSONField(default=dict, help_text='{horas: órdenes retornadas ese día}')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:03
+
+from django.db import migrations, models
+
+
+def move_off_sequences(apps, schema_editor):
+    """Crea la fila única y quita la fila que antes se usaba en sequences (el bloqueo del refresh usaba 'lavanderia.analytics.refresh')"""
+    apps.get_model('lavanderia', 'LaundryAnalyticsState').objects.get_or_create(pk=1)
+    apps.get_model('sequences', 'Sequence').objects.filter(name='lavanderia.analytics.refresh').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lavanderia', '0007_daily_stats'),
+        ('sequences', '0002_seed_sequences'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LaundryAnalyticsState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(move_off_sequences, migrations.RunPython.noop),
+    ]
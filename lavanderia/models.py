@@ -27,6 +27,19 @@ class LaundryStock(models.Model):
         return f"{self.category} (disp:{self.disponible} lav:{self.lavanderia} dañ:{self.danado})"
 
 
+# Nombre de cada categoría en el payload de órdenes (formato histórico de la API)
+ORDER_CATEGORY_FIELDS = [
+    ("TOALLAS_GRANDE", "toalla_grande"),
+    ("TOALLAS_MEDIANA", "toalla_mediana"),
+    ("TOALLAS_CHICA", "toalla_chica"),
+    ("SABANAS_MEDIA", "sabana_media_plaza"),
+    ("SABANAS_UNA", "sabana_una_plaza"),
+    ("CUBRECAMAS_MEDIA", "cubrecama_media_plaza"),
+    ("CUBRECAMAS_UNA", "cubrecama_una_plaza"),
+    ("FUNDAS", "funda"),
+]
+
+
 class LaundryOrder(models.Model):
     STATUS_CHOICES = [
         ("Enviado", "Enviado"),
@@ -34,14 +47,6 @@ class LaundryOrder(models.Model):
     ]
 
     order_code = models.CharField(max_length=32, unique=True)
-    toalla_grande = models.PositiveIntegerField(default=0)
-    toalla_mediana = models.PositiveIntegerField(default=0)
-    toalla_chica = models.PositiveIntegerField(default=0)
-    sabana_media_plaza = models.PositiveIntegerField(default=0)
-    sabana_una_plaza = models.PositiveIntegerField(default=0)
-    cubrecama_media_plaza = models.PositiveIntegerField(default=0)
-    cubrecama_una_plaza = models.PositiveIntegerField(default=0)
-    funda = models.PositiveIntegerField(default=0)
     status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="Enviado")
     created_at = models.DateTimeField(auto_now_add=True)
     returned_at = models.DateTimeField(null=True, blank=True)
@@ -53,4 +58,80 @@ class LaundryOrder(models.Model):
         return f"Orden {self.order_code} - {self.status}"
 
 
+class LaundryOrderItem(models.Model):
+    """Cantidad de una categoría en una orden de lavandería"""
+    order = models.ForeignKey(LaundryOrder, related_name="items", on_delete=models.CASCADE)
+    category = models.CharField(max_length=32, choices=LaundryStock.CATEGORY_CHOICES)
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("order", "category")
+        indexes = [
+            models.Index(fields=["category", "order"], name="laundry_item_category_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} {self.category} x{self.quantity}"
+
+
+class StockMovement(models.Model):
+    """Movimiento de stock (solo inserción): la suma por categoría reconstruye LaundryStock"""
+    KIND_CHOICES = [
+        ("APERTURA", "Saldo inicial"),
+        ("ENVIO", "Envío a lavandería"),
+        ("RETORNO", "Retorno de lavandería"),
+        ("DANO", "Dañado"),
+        ("REPARACION", "Reparado"),
+        ("AJUSTE", "Ajuste manual"),
+    ]
+
+    category = models.CharField(max_length=32, choices=LaundryStock.CATEGORY_CHOICES)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    delta_total = models.IntegerField(default=0)
+    delta_disponible = models.IntegerField(default=0)
+    delta_lavanderia = models.IntegerField(default=0)
+    delta_danado = models.IntegerField(default=0)
+    order = models.ForeignKey(LaundryOrder, related_name="movements", on_delete=models.SET_NULL, null=True, blank=True)
+    user_email = models.CharField(max_length=255, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["category", "created_at"], name="laundry_mov_category_idx"),
+        ]
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Los movimientos de stock no se modifican; registra un ajuste")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.kind} {self.category} ({self.delta_disponible:+}/{self.delta_lavanderia:+}/{self.delta_danado:+})"
+
+
+class LaundryDailyStat(models.Model):
+    """Acumulado diario materializado de lavandería para analytics (ver analytics.py)"""
+    date = models.DateField(unique=True)
+    checkouts = models.PositiveIntegerField(default=0)
+    orders_sent = models.PositiveIntegerField(default=0)
+    orders_returned = models.PositiveIntegerField(default=0)
+    units_sent = models.JSONField(default=dict, help_text="{categoría: unidades enviadas}")
+    units_returned = models.JSONField(default=dict, help_text="{categoría: unidades retornadas}")
+    turnaround_hours = models.JSONField(default=dict, help_text="{horas: órdenes retornadas ese día}")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["date"]
+
+    def __str__(self):
+        return f"{self.date} (checkouts:{self.checkouts} enviadas:{self.orders_sent})"
+
+
+class LaundryAnalyticsState(models.Model):
+    """Fila única de estado del refresh de analytics: se bloquea con select_for_update para
+    serializar los refresh entre procesos y guarda cuándo terminó el último"""
+    refreshed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Analytics de lavandería (refrescado: {self.refreshed_at})"
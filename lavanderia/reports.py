@@ -0,0 +1,60 @@
+"""
+Consultas agregadas sobre las líneas de las órdenes de lavandería.
+
+Cada reporte se resuelve con una consulta agrupada en la base de datos
+(SUM/COUNT por categoría, diferencia returned_at - created_at por orden) en
+vez de recorrer las órdenes en Python.
+"""
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, Sum
+from .models import LaundryOrder, LaundryOrderItem
+
+TURNAROUND = ExpressionWrapper(F("returned_at") - F("created_at"), output_field=DurationField())
+
+
+def hours(duration):
+    return round(duration.total_seconds() / 3600, 2) if duration is not None else None
+
+
+def units_in_laundry(category=None):
+    """Unidades y órdenes aún no retornadas, por categoría"""
+    qs = LaundryOrderItem.objects.filter(order__status="Enviado", quantity__gt=0)
+    if category:
+        qs = qs.filter(category=category)
+    rows = qs.order_by("category").values("category").annotate(
+        units=Sum("quantity"), orders=Count("order", distinct=True)
+    )
+    return [{"category": r["category"], "units": r["units"], "orders": r["orders"]} for r in rows]
+
+
+def _returned_orders(date_from=None, date_to=None, category=None):
+    qs = LaundryOrder.objects.filter(status="Retornado", returned_at__isnull=False)
+    if date_from:
+        qs = qs.filter(created_at__date__gte=date_from)
+    if date_to:
+        qs = qs.filter(created_at__date__lte=date_to)
+    if category:
+        qs = qs.filter(items__category=category, items__quantity__gt=0)
+    return qs
+
+
+def turnaround_orders(date_from=None, date_to=None, category=None):
+    """Órdenes retornadas con su turnaround y unidades (para paginar por created_at)"""
+    return _returned_orders(date_from, date_to, category).annotate(
+        turnaround=TURNAROUND, units=Sum("items__quantity")
+    )
+
+
+def turnaround_summary(date_from=None, date_to=None, category=None):
+    """Promedio, mínimo y máximo de turnaround (horas) y cantidad de órdenes"""
+    data = _returned_orders(date_from, date_to, category).annotate(turnaround=TURNAROUND).aggregate(
+        orders=Count("id", distinct=True),
+        avg=Avg("turnaround"),
+        min=Min("turnaround"),
+        max=Max("turnaround"),
+    )
+    return {
+        "orders": data["orders"],
+        "avg_hours": hours(data["avg"]),
+        "min_hours": hours(data["min"]),
+        "max_hours": hours(data["max"]),
+    }
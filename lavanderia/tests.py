@@ -1,3 +1,115 @@
-from django.test import TestCase
+import math
+from datetime import date
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIRequestFactory
+from sequences.models import Sequence
+from . import analytics, ledger, views
+from .models import LaundryDailyStat, LaundryOrder, LaundryStock, StockMovement
 
-# Create your tests here.
+
+def _request(method, data=None):
+    request = getattr(APIRequestFactory(), method)('/', data or {}, format='json' if method == 'post' else None)
+    request.firebase_user = {'email': 'test@hotel.pe', 'uid': 'u1'}
+    return request
+
+
+class StockTestCase(TestCase):
+    def setUp(self):
+        for category in ledger.CATEGORIES:
+            LaundryStock.objects.create(category=category, total=10, disponible=10)
+            StockMovement.objects.create(category=category, kind='APERTURA', delta_total=10, delta_disponible=10)
+
+    def levels(self, category):
+        stock = LaundryStock.objects.get(category=category)
+        return {field: getattr(stock, field) for field in ledger.FIELDS}
+
+
+class LedgerTests(StockTestCase):
+    def test_multi_category_deficit_changes_nothing(self):
+        with self.assertRaises(ledger.InsufficientStock) as ctx:
+            ledger.apply('ENVIO', {
+                'TOALLAS_GRANDE': {'disponible': -2, 'lavanderia': 2},
+                'FUNDAS': {'disponible': -50, 'lavanderia': 50},
+            })
+        self.assertEqual([d['category'] for d in ctx.exception.deficits], ['FUNDAS'])
+        self.assertEqual(self.levels('TOALLAS_GRANDE')['disponible'], 10)
+        self.assertEqual(StockMovement.objects.exclude(kind='APERTURA').count(), 0)
+
+    def test_movement_cannot_change_total(self):
+        with self.assertRaises(ValueError):
+            ledger.apply('ENVIO', {'FUNDAS': {'disponible': -2}})
+
+    def test_balances_match_stock_rows(self):
+        ledger.damage('FUNDAS', 3)
+        ledger.repair('FUNDAS', 1)
+        ledger.set_levels('TOALLAS_CHICA', {'total': 15})
+        ledger.apply('ENVIO', {'SABANAS_UNA': {'disponible': -4, 'lavanderia': 4}})
+        balances = ledger.balances()
+        for category in ledger.CATEGORIES:
+            self.assertEqual(balances[category], self.levels(category), category)
+        self.assertEqual(ledger.drift(), [])
+
+
+class LaundryViewTests(StockTestCase):
+    def test_send_deficit_creates_no_order(self):
+        response = views.send_to_laundry(_request('post', {'toalla_grande': 2, 'funda': 50}))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(LaundryOrder.objects.exists())
+        self.assertEqual(self.levels('TOALLAS_GRANDE')['disponible'], 10)
+
+    def test_double_return_moves_stock_once(self):
+        response = views.send_to_laundry(_request('post', {'toalla_grande': 2}))
+        self.assertEqual(response.status_code, 201)
+        code = response.data['order']['order_code']
+        self.assertEqual(views.return_order(_request('post'), order_code=code).status_code, 200)
+        self.assertEqual(views.return_order(_request('post'), order_code=code).status_code, 400)
+        self.assertEqual(self.levels('TOALLAS_GRANDE'), {'total': 10, 'disponible': 10, 'lavanderia': 0, 'danado': 0})
+
+    def test_damage_rejects_invalid_quantities(self):
+        for quantity in ('abc', -3, 0):
+            with self.subTest(quantity=quantity):
+                response = views.damage_update(_request('post', {'category': 'FUNDAS', 'quantity': quantity}))
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.levels('FUNDAS')['danado'], 0)
+        self.assertFalse(StockMovement.objects.filter(kind='DANO').exists())
+
+    def test_sends_in_the_same_second_get_distinct_codes(self):
+        codes = {views.send_to_laundry(_request('post', {'funda': 1})).data['order']['order_code'] for _ in range(3)}
+        self.assertEqual(len(codes), 3)
+
+    def test_report_rejects_invalid_dates(self):
+        for params in ({'from': '2024-02-30'}, {'to': 'ayer'}):
+            with self.subTest(params=params):
+                self.assertEqual(views.order_report(_request('get', params)).status_code, 400)
+        self.assertEqual(views.order_report(_request('get', {'from': '2024-02-01'})).status_code, 200)
+
+
+class AnalyticsFormulaTests(SimpleTestCase):
+    def test_percentile(self):
+        histogram = {2: 1, 5: 2, 9: 1}  # 2, 5, 5, 9
+        self.assertEqual(analytics.percentile(histogram, 25), 2)
+        self.assertEqual(analytics.percentile(histogram, 50), 5)
+        self.assertEqual(analytics.percentile(histogram, 75), 5)
+        self.assertEqual(analytics.percentile(histogram, 90), 9)
+        self.assertEqual(analytics.percentile(histogram, 100), 9)
+        self.assertIsNone(analytics.percentile({}, 50))
+        self.assertIsNone(analytics.percentile({3: 0}, 50))
+
+    def test_par_level(self):
+        # Sin variabilidad el par es exactamente la demanda del ciclo
+        self.assertEqual(analytics.par_level(10, 2, 0), 20)
+        # 10 × 4 + 1.65 × 3 × √4 = 49.9 → 50
+        self.assertEqual(analytics.par_level(10, 4, 3), 50)
+        self.assertEqual(analytics.par_level(2.5, 1, 1), math.ceil(2.5 + analytics.SAFETY_Z))
+        self.assertEqual(analytics.par_level(0, 1, 0), 0)
+
+
+class AnalyticsRefreshTests(TestCase):
+    def test_refresh_is_idempotent_and_stamps_summary(self):
+        today = date(2026, 10, 18)
+        first = analytics.refresh(today=today)
+        self.assertEqual(first, LaundryDailyStat.objects.count())
+        analytics.refresh(today=today)
+        self.assertEqual(first, LaundryDailyStat.objects.count())
+        self.assertIsNotNone(analytics.summary(today=today)['refreshed_at'])
+        self.assertFalse(Sequence.objects.exists())
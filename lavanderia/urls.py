@@ -8,4 +8,6 @@ urlpatterns = [
     path('send/', views.send_to_laundry),
     path('return/<str:order_code>/', views.return_order),
     path('damage/', views.damage_update),
+    path('reports/', views.order_report),
+    path('analytics/', views.laundry_analytics),
 ]
\ No newline at end of file
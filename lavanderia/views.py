@@ -1,21 +1,23 @@
+import hashlib
+import json
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
+from django.db import transaction
 from django.utils import timezone
-from .models import LaundryOrder, LaundryStock
+from django.utils.dateparse import parse_date
+from .models import LaundryOrder, LaundryOrderItem, LaundryStock, ORDER_CATEGORY_FIELDS
+from . import ledger, reports, analytics
+from reservations import pagination
+from sequences import allocator
 
 
-def _apply_stock_delta(category, delta_disponible=0, delta_lavanderia=0, delta_danado=0):
-    obj, _ = LaundryStock.objects.get_or_create(category=category)
-    obj.disponible = max(0, obj.disponible + int(delta_disponible))
-    obj.lavanderia = max(0, obj.lavanderia + int(delta_lavanderia))
-    obj.danado = max(0, obj.danado + int(delta_danado))
-    obj.save()
-    return obj
+def _user_email(request):
+    return (request.firebase_user or {}).get("email")
 
 
 def _now_code():
-    return timezone.now().strftime("%Y%m%d%H%M%S")
+    return allocator.next_laundry_order_code()
 
 
 def _format_datetime(dt):
@@ -24,47 +26,59 @@ def _format_datetime(dt):
     return dt.isoformat()
 
 
+def _date_range(request):
+    """(from, to) del query string; lanza ValueError si alguna fecha no es válida"""
+    date_from, date_to = request.GET.get("from"), request.GET.get("to")
+    df = parse_date(date_from) if date_from else None
+    dt = parse_date(date_to) if date_to else None
+    if (date_from and not df) or (date_to and not dt):
+        raise ValueError("Fechas inválidas")
+    return df, dt
+
+
+def _order_quantities(payload):
+    """{categoría: cantidad} desde `items` [{category, quantity}] o los campos históricos (toalla_grande, ...)"""
+    quantities = {}
+    for it in payload.get("items") or []:
+        cat = it.get("category")
+        if cat:
+            quantities[cat] = quantities.get(cat, 0) + int(it.get("quantity") or 0)
+    for cat, field in ORDER_CATEGORY_FIELDS:
+        if payload.get(field):
+            quantities[cat] = quantities.get(cat, 0) + int(payload.get(field))
+    return {cat: qty for cat, qty in quantities.items() if qty}
+
+
+def _serialize_order(o):
+    quantities = {item.category: item.quantity for item in o.items.all()}
+    data = {
+        "order_code": o.order_code,
+        "status": o.status,
+        "created_at": _format_datetime(o.created_at),
+        "returned_at": _format_datetime(o.returned_at),
+        "items": [{"category": cat, "quantity": qty} for cat, qty in quantities.items()],
+    }
+    # Campos históricos por categoría para los clientes existentes
+    for cat, field in ORDER_CATEGORY_FIELDS:
+        data[field] = quantities.get(cat, 0)
+    return data
+
+
 @api_view(["GET"])
 def stock_list(request):
+    """Stock por categoría (solo lectura). Responde 304 si el ETag del cliente sigue vigente."""
     if not hasattr(request, "firebase_user") or not request.firebase_user:
         return Response({"error": "Usuario no autenticado"}, status=status.HTTP_401_UNAUTHORIZED)
     
-    items = []
-    for s in LaundryStock.objects.all().order_by('category'):
-        # Asegurar que los datos estén sincronizados
-        # Calcular disponible correctamente
-        calculated_disponible = max(0, s.total - s.lavanderia - s.danado)
-        
-        # Asegurar que total = disponible + lavanderia + danado
-        calculated_total = s.disponible + s.lavanderia + s.danado
-        
-        # Si hay inconsistencias, corregirlas
-        needs_save = False
-        if s.disponible != calculated_disponible:
-            s.disponible = calculated_disponible
-            needs_save = True
-        
-        # Si el total no coincide, ajustarlo
-        if s.total != calculated_total and s.total == 0:
-            # Solo ajustar si total es 0 (para no perder datos)
-            s.total = calculated_total
-            needs_save = True
-        elif s.total < calculated_total:
-            # Si total es menor que la suma, ajustar total
-            s.total = calculated_total
-            needs_save = True
-        
-        if needs_save:
-            s.save()
-        
-        items.append({
-            "category": s.category,
-            "total": s.total,
-            "disponible": s.disponible,
-            "lavanderia": s.lavanderia,
-            "danado": s.danado,
-        })
-    return Response({"stock": items})
+    # El invariante lo mantienen las escrituras (ledger); aquí solo se lee
+    items = list(
+        LaundryStock.objects.order_by("category").values("category", "total", "disponible", "lavanderia", "danado")
+    )
+    etag = '"%s"' % hashlib.sha1(json.dumps(items, sort_keys=True).encode("utf-8")).hexdigest()
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in [tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")]:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response({"stock": items}, headers=headers)
 
 
 @api_view(["POST"])
@@ -77,102 +91,32 @@ def stock_upsert(request):
     if not isinstance(items, list):
         return Response({"error": "Formato inválido"}, status=status.HTTP_400_BAD_REQUEST)
     
+    # Todos los ítems o ninguno: cada fila se ajusta bloqueada y queda registrada en el libro
     updated = []
-    for it in items:
-        cat = it.get("category")
-        if not cat:
-            continue
-        obj, _ = LaundryStock.objects.get_or_create(category=cat)
-        
-        # Obtener valores actuales
-        current_total = obj.total
-        current_lavanderia = obj.lavanderia
-        current_danado = obj.danado
-        
-        # Determinar qué campo se está editando (solo si tiene un valor explícito)
-        editing_total = "total" in it and it.get("total") is not None
-        editing_disponible = "disponible" in it and it.get("disponible") is not None
-        editing_lavanderia = "lavanderia" in it and it.get("lavanderia") is not None
-        editing_danado = "danado" in it and it.get("danado") is not None
-        
-        # Si no se está editando ningún campo, saltar este item
-        if not (editing_total or editing_disponible or editing_lavanderia or editing_danado):
-            continue
-        
-        if editing_total:
-            # Se está editando el total del inventario
-            new_total = max(0, int(it.get("total", 0)))
-            obj.total = new_total
-            # Disponible se calcula automáticamente: disponible = total - sucias - dañadas
-            obj.disponible = max(0, new_total - current_lavanderia - current_danado)
-        elif editing_disponible:
-            # Se está editando disponible directamente
-            new_disponible = max(0, int(it.get("disponible", 0)))
-            
-            # Validar que disponible no exceda el total actual
-            # Si excede, ajustar el total automáticamente
-            min_total_required = new_disponible + current_lavanderia + current_danado
-            
-            if new_disponible > current_total:
-                # Si disponible excede el total, ajustar el total automáticamente
-                obj.total = min_total_required
-            else:
-                # Si no excede, mantener el total actual
-                obj.total = current_total
-            
-            obj.disponible = new_disponible
-            
-            # Validación adicional: asegurar que disponible no exceda el total final
-            if obj.disponible > obj.total:
-                obj.total = obj.disponible + obj.lavanderia + obj.danado
-        elif editing_lavanderia:
-            # Se está editando sucias
-            new_lavanderia = max(0, int(it.get("lavanderia", 0)))
-            obj.lavanderia = new_lavanderia
-            # Disponible se calcula automáticamente: disponible = total - sucias - dañadas
-            obj.disponible = max(0, current_total - new_lavanderia - current_danado)
-            
-            # Validar que sucias + dañadas no excedan el total
-            if new_lavanderia + current_danado > current_total:
-                return Response({
-                    "error": f"La suma de sucias ({new_lavanderia}) y dañadas ({current_danado}) no puede exceder el total ({current_total})"
-                }, status=status.HTTP_400_BAD_REQUEST)
-        elif editing_danado:
-            # Se está editando dañadas
-            new_danado = max(0, int(it.get("danado", 0)))
-            obj.danado = new_danado
-            # Disponible se calcula automáticamente: disponible = total - sucias - dañadas
-            obj.disponible = max(0, current_total - current_lavanderia - new_danado)
-            
-            # Validar que sucias + dañadas no excedan el total
-            if current_lavanderia + new_danado > current_total:
-                return Response({
-                    "error": f"La suma de sucias ({current_lavanderia}) y dañadas ({new_danado}) no puede exceder el total ({current_total})"
-                }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Validación final: disponible no debe exceder el total
-        if obj.disponible > obj.total:
-            # Ajustar el total si disponible lo excede
-            obj.total = obj.disponible + obj.lavanderia + obj.danado
-        
-        # Validación: disponible = total - sucias - dañadas (si no se editó disponible directamente)
-        if not editing_disponible:
-            calculated_disponible = max(0, obj.total - obj.lavanderia - obj.danado)
-            if obj.disponible != calculated_disponible:
-                obj.disponible = calculated_disponible
-        
-        # Validación final: asegurar que disponible <= total
-        if obj.disponible > obj.total:
-            obj.disponible = max(0, obj.total - obj.lavanderia - obj.danado)
-        
-        obj.save()
-        updated.append({
-            "category": obj.category,
-            "total": obj.total,
-            "disponible": obj.disponible,
-            "lavanderia": obj.lavanderia,
-            "danado": obj.danado,
-        })
+    try:
+        with transaction.atomic():
+            for it in items:
+                cat = it.get("category")
+                if not cat:
+                    continue
+                if cat not in ledger.CATEGORIES:
+                    raise ledger.InvalidStock(f"Categoría inválida: {cat}")
+                # Solo cuentan los campos con un valor explícito
+                edits = {field: it[field] for field in ledger.FIELDS if it.get(field) is not None}
+                if not edits:
+                    continue
+                obj = ledger.set_levels(cat, edits, user_email=_user_email(request))
+                updated.append({
+                    "category": obj.category,
+                    "total": obj.total,
+                    "disponible": obj.disponible,
+                    "lavanderia": obj.lavanderia,
+                    "danado": obj.danado,
+                })
+    except ledger.InvalidStock as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except (TypeError, ValueError):
+        return Response({"error": "Cantidades inválidas"}, status=status.HTTP_400_BAD_REQUEST)
     return Response({"updated": updated})
 
 
@@ -182,57 +126,26 @@ def send_to_laundry(request):
         return Response({"error": "Usuario no autenticado"}, status=status.HTTP_401_UNAUTHORIZED)
     
     p = request.data or {}
-    tg = int(p.get("toalla_grande") or 0)
-    tm = int(p.get("toalla_mediana") or 0)
-    tc = int(p.get("toalla_chica") or 0)
-    sm = int(p.get("sabana_media_plaza") or 0)
-    su = int(p.get("sabana_una_plaza") or 0)
-    cm = int(p.get("cubrecama_media_plaza") or 0)
-    cu = int(p.get("cubrecama_una_plaza") or 0)
-    fu = int(p.get("funda") or 0)
-
-    # Validar disponibilidad
-    deficits = []
-    for cat, qty in [
-        ("TOALLAS_GRANDE", tg),
-        ("TOALLAS_MEDIANA", tm),
-        ("TOALLAS_CHICA", tc),
-        ("SABANAS_MEDIA", sm),
-        ("SABANAS_UNA", su),
-        ("CUBRECAMAS_MEDIA", cm),
-        ("CUBRECAMAS_UNA", cu),
-        ("FUNDAS", fu),
-    ]:
-        s, _ = LaundryStock.objects.get_or_create(category=cat)
-        if s.disponible < qty:
-            deficits.append({"category": cat, "needed": qty, "available": s.disponible})
-    
-    if deficits:
-        return Response({"error": "Stock insuficiente", "deficits": deficits}, status=status.HTTP_400_BAD_REQUEST)
-
-    code = _now_code()
-    order = LaundryOrder.objects.create(
-        order_code=code,
-        toalla_grande=tg,
-        toalla_mediana=tm,
-        toalla_chica=tc,
-        sabana_media_plaza=sm,
-        sabana_una_plaza=su,
-        cubrecama_media_plaza=cm,
-        cubrecama_una_plaza=cu,
-        funda=fu,
-        status="Enviado",
-    )
+    try:
+        quantities = _order_quantities(p)
+    except (TypeError, ValueError):
+        return Response({"error": "Cantidades inválidas"}, status=status.HTTP_400_BAD_REQUEST)
+    invalid = [cat for cat, qty in quantities.items() if cat not in ledger.CATEGORIES or qty < 0]
+    if invalid:
+        return Response({"error": "Categorías o cantidades inválidas", "categories": invalid}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Mover stock a lavandería
-    _apply_stock_delta("TOALLAS_GRANDE", -tg, +tg)
-    _apply_stock_delta("TOALLAS_MEDIANA", -tm, +tm)
-    _apply_stock_delta("TOALLAS_CHICA", -tc, +tc)
-    _apply_stock_delta("SABANAS_MEDIA", -sm, +sm)
-    _apply_stock_delta("SABANAS_UNA", -su, +su)
-    _apply_stock_delta("CUBRECAMAS_MEDIA", -cm, +cm)
-    _apply_stock_delta("CUBRECAMAS_UNA", -cu, +cu)
-    _apply_stock_delta("FUNDAS", -fu, +fu)
+    # Orden, líneas y movimiento de stock en una sola transacción: si falta stock no queda nada guardado
+    # El código se asigna fuera de la transacción (el correlativo no se revierte)
+    order_code = _now_code()
+    try:
+        with transaction.atomic():
+            order = LaundryOrder.objects.create(order_code=order_code, status="Enviado")
+            LaundryOrderItem.objects.bulk_create([
+                LaundryOrderItem(order=order, category=cat, quantity=qty) for cat, qty in quantities.items()
+            ])
+            ledger.send(order, quantities, user_email=_user_email(request))
+    except ledger.InsufficientStock as e:
+        return Response({"error": "Stock insuficiente", "deficits": e.deficits}, status=status.HTTP_400_BAD_REQUEST)
 
     return Response({
         "order": {
@@ -249,25 +162,23 @@ def return_order(request, order_code):
         return Response({"error": "Usuario no autenticado"}, status=status.HTTP_401_UNAUTHORIZED)
     
     try:
-        o = LaundryOrder.objects.get(order_code=order_code)
-    except LaundryOrder.DoesNotExist:
-        return Response({"error": "Orden no encontrada"}, status=status.HTTP_404_NOT_FOUND)
-    
-    if o.status == "Retornado":
-        return Response({"error": "Orden ya retornada"}, status=status.HTTP_400_BAD_REQUEST)
-
-    _apply_stock_delta("TOALLAS_GRANDE", +int(o.toalla_grande or 0), -int(o.toalla_grande or 0))
-    _apply_stock_delta("TOALLAS_MEDIANA", +int(o.toalla_mediana or 0), -int(o.toalla_mediana or 0))
-    _apply_stock_delta("TOALLAS_CHICA", +int(o.toalla_chica or 0), -int(o.toalla_chica or 0))
-    _apply_stock_delta("SABANAS_MEDIA", +int(o.sabana_media_plaza or 0), -int(o.sabana_media_plaza or 0))
-    _apply_stock_delta("SABANAS_UNA", +int(o.sabana_una_plaza or 0), -int(o.sabana_una_plaza or 0))
-    _apply_stock_delta("CUBRECAMAS_MEDIA", +int(o.cubrecama_media_plaza or 0), -int(o.cubrecama_media_plaza or 0))
-    _apply_stock_delta("CUBRECAMAS_UNA", +int(o.cubrecama_una_plaza or 0), -int(o.cubrecama_una_plaza or 0))
-    _apply_stock_delta("FUNDAS", +int(o.funda or 0), -int(o.funda or 0))
-
-    o.status = "Retornado"
-    o.returned_at = timezone.now()
-    o.save()
+        with transaction.atomic():
+            # Bloquear la orden evita que dos retornos simultáneos devuelvan el stock dos veces
+            try:
+                o = LaundryOrder.objects.select_for_update().prefetch_related("items").get(order_code=order_code)
+            except LaundryOrder.DoesNotExist:
+                return Response({"error": "Orden no encontrada"}, status=status.HTTP_404_NOT_FOUND)
+            
+            if o.status == "Retornado":
+                return Response({"error": "Orden ya retornada"}, status=status.HTTP_400_BAD_REQUEST)
+
+            ledger.receive(o, user_email=_user_email(request))
+
+            o.status = "Retornado"
+            o.returned_at = timezone.now()
+            o.save(update_fields=["status", "returned_at"])
+    except ledger.InsufficientStock as e:
+        return Response({"error": "Stock insuficiente", "deficits": e.deficits}, status=status.HTTP_400_BAD_REQUEST)
     
     return Response({
         "ok": True,
@@ -283,23 +194,29 @@ def damage_update(request):
     
     p = request.data or {}
     cat = p.get("category")
-    qty = int(p.get("quantity") or 0)
     action = (p.get("action") or "add").lower()
+    try:
+        qty = int(p.get("quantity") or 0)
+    except (TypeError, ValueError):
+        return Response({"error": "Cantidad inválida"}, status=status.HTTP_400_BAD_REQUEST)
+    if qty <= 0:
+        return Response({"error": "La cantidad debe ser mayor a 0"}, status=status.HTTP_400_BAD_REQUEST)
     
-    s, _ = LaundryStock.objects.get_or_create(category=cat)
+    if cat not in ledger.CATEGORIES:
+        return Response({"error": "Categoría inválida"}, status=status.HTTP_400_BAD_REQUEST)
     
-    if action == "add":
-        if s.disponible < qty:
-            return Response({"error": "Stock insuficiente"}, status=status.HTTP_400_BAD_REQUEST)
-        _apply_stock_delta(cat, -qty, 0, +qty)
-    elif action == "repair":
-        if s.danado < qty:
-            return Response({"error": "Dañado insuficiente"}, status=status.HTTP_400_BAD_REQUEST)
-        _apply_stock_delta(cat, +qty, 0, -qty)
-    else:
-        return Response({"error": "Acción inválida"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        if action == "add":
+            rows = ledger.damage(cat, qty, user_email=_user_email(request))
+        elif action == "repair":
+            rows = ledger.repair(cat, qty, user_email=_user_email(request))
+        else:
+            return Response({"error": "Acción inválida"}, status=status.HTTP_400_BAD_REQUEST)
+    except ledger.InsufficientStock:
+        error = "Stock insuficiente" if action == "add" else "Dañado insuficiente"
+        return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
     
-    s.refresh_from_db()
+    s = rows.get(cat) or LaundryStock.objects.get_or_create(category=cat)[0]
     return Response({
         "category": s.category,
         "disponible": s.disponible,
@@ -313,20 +230,60 @@ def list_orders(request):
     if not hasattr(request, "firebase_user") or not request.firebase_user:
         return Response({"error": "Usuario no autenticado"}, status=status.HTTP_401_UNAUTHORIZED)
     
-    items = []
-    for o in LaundryOrder.objects.all()[:50]:
-        items.append({
-            "order_code": o.order_code,
-            "status": o.status,
-            "created_at": _format_datetime(o.created_at),
-            "returned_at": _format_datetime(o.returned_at),
-            "toalla_grande": o.toalla_grande,
-            "toalla_mediana": o.toalla_mediana,
-            "toalla_chica": o.toalla_chica,
-            "sabana_media_plaza": o.sabana_media_plaza,
-            "sabana_una_plaza": o.sabana_una_plaza,
-            "cubrecama_media_plaza": o.cubrecama_media_plaza,
-            "cubrecama_una_plaza": o.cubrecama_una_plaza,
-            "funda": o.funda,
-        })
-    return Response({"orders": items})
+    orders = LaundryOrder.objects.prefetch_related("items")[:50]
+    return Response({"orders": [_serialize_order(o) for o in orders]})
+
+
+@api_view(["GET"])
+def order_report(request):
+    """
+    Reporte agregado de lavandería:
+    - en_lavanderia: unidades y órdenes pendientes de retorno por categoría
+    - turnaround: horas entre envío y retorno por orden (paginado con cursor)
+    Filtros: from/to (fecha de envío), category, limit, cursor.
+    """
+    if not hasattr(request, "firebase_user") or not request.firebase_user:
+        return Response({"error": "Usuario no autenticado"}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    try:
+        date_from, date_to = _date_range(request)
+    except ValueError:
+        return Response({"error": "Fechas inválidas"}, status=status.HTTP_400_BAD_REQUEST)
+    category = request.GET.get("category") or None
+    limit = pagination.parse_limit(request.GET.get("limit"))
+    
+    try:
+        rows, next_cursor = pagination.paginate_keyset(
+            reports.turnaround_orders(date_from, date_to, category),
+            cursor=request.GET.get("cursor"),
+            limit=limit,
+        )
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        "en_lavanderia": reports.units_in_laundry(category),
+        "turnaround": [
+            {
+                "order_code": o.order_code,
+                "created_at": _format_datetime(o.created_at),
+                "returned_at": _format_datetime(o.returned_at),
+                "units": o.units or 0,
+                "hours": reports.hours(o.turnaround),
+            }
+            for o in rows
+        ],
+        "turnaround_summary": reports.turnaround_summary(date_from, date_to, category),
+        "next_cursor": next_cursor,
+    })
+
+
+@api_view(["GET"])
+def laundry_analytics(request):
+    """Turnaround, demanda diaria y par recomendado por categoría (parámetro opcional: window en días)"""
+    if not hasattr(request, "firebase_user") or not request.firebase_user:
+        return Response({"error": "Usuario no autenticado"}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    window = pagination.parse_limit(request.GET.get("window"), default=None, maximum=365)
+    # Solo lectura de la tabla diaria; la actualiza el cron (refresh_laundry_analytics)
+    return Response(analytics.summary(window))
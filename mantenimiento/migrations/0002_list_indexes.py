@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mantenimiento', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blockedroom',
+            index=models.Index(fields=['room', 'blocked_until'], name='blocked_room_until_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blockedroom',
+            index=models.Index(fields=['blocked_until', 'room'], name='blocked_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blockedroom',
+            index=models.Index(fields=['created_at', 'id'], name='blocked_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenanceissue',
+            index=models.Index(fields=['reported_date', 'priority'], name='issues_date_priority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenanceissue',
+            index=models.Index(fields=['created_at', 'id'], name='issues_created_idx'),
+        ),
+    ]
@@ -104,6 +104,10 @@ class MaintenanceIssue(models.Model):
         ordering = ["-reported_date", "-created_at"]
         verbose_name = "Incidencia"
         verbose_name_plural = "Incidencias"
+        indexes = [
+            models.Index(fields=["reported_date", "priority"], name="issues_date_priority_idx"),
+            models.Index(fields=["created_at", "id"], name="issues_created_idx"),
+        ]
     
     def __str__(self):
         return f"{self.room} - {self.problem[:50]}"
@@ -126,6 +130,17 @@ class BlockedRoom(models.Model):
         ordering = ["-created_at"]
         verbose_name = "Habitación Bloqueada"
         verbose_name_plural = "Habitaciones Bloqueadas"
+        indexes = [
+            models.Index(fields=["room", "blocked_until"], name="blocked_room_until_idx"),
+            # Bloqueos vigentes de todas las habitaciones sin recorrer los vencidos
+            models.Index(fields=["blocked_until", "room"], name="blocked_active_idx"),
+            models.Index(fields=["created_at", "id"], name="blocked_created_idx"),
+        ]
     
     def __str__(self):
         return f"{self.room} - Bloqueada hasta {self.blocked_until}"
+    
+    @classmethod
+    def active(cls, today=None):
+        """Bloqueos vigentes (blocked_until >= hoy); usa el índice por blocked_until"""
+        return cls.objects.filter(blocked_until__gte=today or timezone.localdate())
@@ -2,12 +2,38 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import datetime, date, time, timedelta
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from presence import groups as presence_groups
+from reservations import pagination
 from .models import WaterHeatingSystem, BriquetteChange, MaintenanceIssue, BlockedRoom
 
 
+def _as_list(value):
+    return [v.strip() for v in (value or '').split(',') if v.strip()]
+
+
+def _date_range(request):
+    """(from, to) del query string; lanza ValueError si alguna fecha no es válida"""
+    date_from, date_to = request.GET.get("from"), request.GET.get("to")
+    df = parse_date(date_from) if date_from else None
+    dt = parse_date(date_to) if date_to else None
+    if (date_from and not df) or (date_to and not dt):
+        raise ValueError("Fechas inválidas")
+    return df, dt
+
+
+def _notification_targets(payload):
+    """Roles y usuarios a notificar (notifyRoles / notifyUids); vacío = todos los conectados"""
+    def as_list(value):
+        if not value:
+            return []
+        if isinstance(value, str):
+            value = value.split(',')
+        return [str(v).strip() for v in value if str(v).strip()]
+    return as_list(payload.get('notifyRoles')), as_list(payload.get('notifyUids'))
+
+
 @api_view(["GET"])
 def system_status(request):
     """Obtiene el estado del sistema de agua caliente"""
@@ -168,12 +194,42 @@ def register_briquette_change(request):
 
 @api_view(["GET"])
 def maintenance_issues(request):
-    """Obtiene las incidencias de mantenimiento"""
+    """
+    Obtiene las incidencias de mantenimiento, de la más reciente a la más antigua.
+    Filtros: room, priority (lista separada por comas), technician, from/to (fecha de reporte).
+    Paginación: limit (por defecto 100) y cursor (nextCursor de la página anterior).
+    """
     if not hasattr(request, "firebase_user") or not request.firebase_user:
         return Response({"error": "Usuario no autenticado"}, status=status.HTTP_401_UNAUTHORIZED)
     
+    qs = MaintenanceIssue.objects.all()
+    room = (request.GET.get("room") or "").strip()
+    if room:
+        qs = qs.filter(room=room)
+    priorities = _as_list(request.GET.get("priority"))
+    if priorities:
+        qs = qs.filter(priority__in=priorities)
+    technician = (request.GET.get("technician") or "").strip()
+    if technician:
+        qs = qs.filter(technician__icontains=technician)
+    try:
+        date_from, date_to = _date_range(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    # Rango sobre (reported_date, priority): índice issues_date_priority_idx
+    if date_from:
+        qs = qs.filter(reported_date__gte=date_from)
+    if date_to:
+        qs = qs.filter(reported_date__lte=date_to)
+    
+    limit = pagination.parse_limit(request.GET.get("limit"), default=100)
+    try:
+        page, next_cursor = pagination.paginate_keyset(qs, cursor=request.GET.get("cursor"), limit=limit)
+    except ValueError:
+        return Response({"error": "Cursor inválido"}, status=status.HTTP_400_BAD_REQUEST)
+    
     issues = []
-    for issue in MaintenanceIssue.objects.all()[:100]:  # Limitar a 100 registros
+    for issue in page:
         issues.append({
             "id": issue.id,
             "room": issue.room,
@@ -183,7 +239,7 @@ def maintenance_issues(request):
             "reportedDate": issue.reported_date.strftime("%Y-%m-%d"),
         })
     
-    return Response({"issues": issues})
+    return Response({"issues": issues, "nextCursor": next_cursor})
 
 
 @api_view(["POST"])
@@ -211,32 +267,28 @@ def report_issue(request):
     
     # Enviar notificación WebSocket (solo a otros usuarios, no al que la creó)
     try:
-        channel_layer = get_channel_layer()
-        if channel_layer:
-            user_name = request.firebase_user.get('email', 'Usuario').split('@')[0]
-            user_uid = request.firebase_user.get('uid')
-            
-            print(f"🔔 Enviando notificación de incidencia - Usuario: {user_name}, UID: {user_uid}")
-            
-            notification_data = {
-                'type': 'general_notification',
-                'title': 'Nueva Incidencia Reportada',
-                'message': f'{user_name} reportó una incidencia en la habitación {room}: {problem[:50]}',
-                'notification_type': 'incidence',
-                'created_by_uid': str(user_uid),  # UID del usuario que creó la notificación (como string)
-                'data': {
-                    'id': issue.id,
-                    'room': issue.room,
-                    'problem': issue.problem,
-                    'priority': issue.priority,
-                    'reported_by': user_name,
-                }
+        notify_roles, notify_uids = _notification_targets(payload)
+        user_name = request.firebase_user.get('email', 'Usuario').split('@')[0]
+        user_uid = request.firebase_user.get('uid')
+        
+        print(f"🔔 Enviando notificación de incidencia - Usuario: {user_name}, UID: {user_uid}")
+        
+        notification_data = {
+            'type': 'general_notification',
+            'title': 'Nueva Incidencia Reportada',
+            'message': f'{user_name} reportó una incidencia en la habitación {room}: {problem[:50]}',
+            'notification_type': 'incidence',
+            'created_by_uid': str(user_uid),  # UID del usuario que creó la notificación (como string)
+            'data': {
+                'id': issue.id,
+                'room': issue.room,
+                'problem': issue.problem,
+                'priority': issue.priority,
+                'reported_by': user_name,
             }
-            
-            async_to_sync(channel_layer.group_send)(
-                'presence',
-                notification_data
-            )
+        }
+        
+        if presence_groups.send_event(notification_data, roles=notify_roles, uids=notify_uids):
             print(f"Notificación de incidencia enviada: {notification_data}")
         else:
             print("Channel layer no disponible")
@@ -276,12 +328,37 @@ def delete_issue(request, issue_id):
 
 @api_view(["GET"])
 def blocked_rooms(request):
-    """Obtiene las habitaciones bloqueadas"""
+    """
+    Obtiene las habitaciones bloqueadas, del bloqueo más reciente al más antiguo.
+    Filtros: active=1 (solo vigentes), room, from/to (sobre blocked_until).
+    Paginación: limit y cursor (nextCursor de la página anterior).
+    """
     if not hasattr(request, "firebase_user") or not request.firebase_user:
         return Response({"error": "Usuario no autenticado"}, status=status.HTTP_401_UNAUTHORIZED)
     
+    active = (request.GET.get("active") or "").lower() in ("1", "true", "si", "sí")
+    # Los vigentes se leen por blocked_until sin tocar el historial vencido
+    qs = BlockedRoom.active() if active else BlockedRoom.objects.all()
+    room = (request.GET.get("room") or "").strip()
+    if room:
+        qs = qs.filter(room=room)
+    try:
+        date_from, date_to = _date_range(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if date_from:
+        qs = qs.filter(blocked_until__gte=date_from)
+    if date_to:
+        qs = qs.filter(blocked_until__lte=date_to)
+    
+    limit = pagination.parse_limit(request.GET.get("limit"))
+    try:
+        page, next_cursor = pagination.paginate_keyset(qs, cursor=request.GET.get("cursor"), limit=limit)
+    except ValueError:
+        return Response({"error": "Cursor inválido"}, status=status.HTTP_400_BAD_REQUEST)
+    
     rooms = []
-    for room in BlockedRoom.objects.all():
+    for room in page:
         rooms.append({
             "id": room.id,
             "room": room.room,
@@ -290,7 +367,7 @@ def blocked_rooms(request):
             "blockedBy": room.blocked_by or "-",
         })
     
-    return Response({"rooms": rooms})
+    return Response({"rooms": rooms, "nextCursor": next_cursor})
 
 
 @api_view(["POST"])
@@ -338,32 +415,28 @@ def block_room(request):
         
         # Enviar notificación WebSocket (solo a otros usuarios, no al que la creó)
         try:
-            channel_layer = get_channel_layer()
-            if channel_layer:
-                user_name = request.firebase_user.get('email', 'Usuario').split('@')[0]
-                user_uid = request.firebase_user.get('uid')
-                
-                print(f"🔔 Enviando notificación de bloqueo - Usuario: {user_name}, UID: {user_uid}")
-                
-                notification_data = {
-                    'type': 'general_notification',
-                    'title': 'Habitación Bloqueada',
-                    'message': f'{user_name} bloqueó la habitación {room} hasta {blocked_until}. Razón: {reason[:50]}',
-                    'notification_type': 'room_blocked',
-                    'created_by_uid': str(user_uid),  # UID del usuario que creó la notificación (como string)
-                    'data': {
-                        'id': blocked_room.id,
-                        'room': blocked_room.room,
-                        'reason': blocked_room.reason,
-                        'blocked_until': blocked_room.blocked_until.strftime("%Y-%m-%d"),
-                        'blocked_by': blocked_by or user_name,
-                    }
+            notify_roles, notify_uids = _notification_targets(payload)
+            user_name = request.firebase_user.get('email', 'Usuario').split('@')[0]
+            user_uid = request.firebase_user.get('uid')
+            
+            print(f"🔔 Enviando notificación de bloqueo - Usuario: {user_name}, UID: {user_uid}")
+            
+            notification_data = {
+                'type': 'general_notification',
+                'title': 'Habitación Bloqueada',
+                'message': f'{user_name} bloqueó la habitación {room} hasta {blocked_until}. Razón: {reason[:50]}',
+                'notification_type': 'room_blocked',
+                'created_by_uid': str(user_uid),  # UID del usuario que creó la notificación (como string)
+                'data': {
+                    'id': blocked_room.id,
+                    'room': blocked_room.room,
+                    'reason': blocked_room.reason,
+                    'blocked_until': blocked_room.blocked_until.strftime("%Y-%m-%d"),
+                    'blocked_by': blocked_by or user_name,
                 }
-                
-                async_to_sync(channel_layer.group_send)(
-                    'presence',
-                    notification_data
-                )
+            }
+            
+            if presence_groups.send_event(notification_data, roles=notify_roles, uids=notify_uids):
                 print(f"Notificación de bloqueo enviada: {notification_data}")
             else:
                 print("Channel layer no disponible")
@@ -393,38 +466,11 @@ def unblock_room(request, room_id):
         blocked_room.delete()
         
         # Actualizar estado de la habitación en la tabla Room
-        from reservations.models import Room, Reservation, ReservationRoom
+        from reservations import room_status
         
         try:
-            room_obj = Room.objects.get(code=room_code)
-            old_status = room_obj.status
-            
-            # Verificar si la habitación está ocupada por una reserva en Check-in
-            is_occupied = False
-            checkin_reservations = Reservation.objects.filter(status='Check-in')
-            for res in checkin_reservations:
-                if res.room_label and str(res.room_label).strip() == room_code:
-                    is_occupied = True
-                    break
-                for ar in res.assigned_rooms.all():
-                    if str(ar.room_code).strip() == room_code:
-                        is_occupied = True
-                        break
-                if is_occupied:
-                    break
-            
-            if is_occupied:
-                new_status = 'Ocupada'
-            else:
-                new_status = 'Disponible'
-            
-            room_obj.status = new_status
-            room_obj.save(update_fields=['status'])
-            # Forzar refresh para verificar
-            room_obj.refresh_from_db()
-            print(f"✅ Habitación {room_code} actualizada: {old_status} -> {room_obj.status} (verificado en BD)")
-        except Room.DoesNotExist:
-            print(f"⚠️ Habitación {room_code} no encontrada en la tabla Room")
+            for change in room_status.sync_room_statuses(codes=[room_code]):
+                print(f"✅ Habitación {room_code} actualizada: {change['old_status']} -> {change['status']}")
         except Exception as e:
             print(f"❌ Error actualizando estado de habitación {room_code}: {e}")
             import traceback
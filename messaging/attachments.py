@@ -0,0 +1,171 @@
+"""
+Almacén de adjuntos direccionado por contenido.
+
+Los cuerpos de los adjuntos no se guardan en la fila de `messages`: se
+escriben una sola vez bajo su hash SHA-256 y el mensaje solo conserva la
+clave. El mismo archivo enviado varias veces ocupa espacio una sola vez.
+
+El backend se elige con MESSAGING_ATTACHMENT_STORE (ruta a una clase con la
+interfaz de AttachmentStore). Por defecto se usa el disco local en
+MESSAGING_ATTACHMENT_ROOT.
+"""
+import base64
+import binascii
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from functools import lru_cache
+from django.conf import settings
+from django.core import signing
+from django.utils.module_loading import import_string
+
+CHUNK_SIZE = 64 * 1024
+_KEY_RE = re.compile(r'^[0-9a-f]{64}$')
+_DATA_URL_RE = re.compile(r'^data:(?P<type>[\w.+-]+/[\w.+-]+)?(?:;[^,]*)?;base64,', re.IGNORECASE)
+_SIGNER_SALT = 'messaging.attachment'
+
+# Únicos tipos que se sirven inline: imágenes raster que el navegador no puede ejecutar.
+# Todo lo demás (HTML, SVG, PDF...) se descarga como archivo para no correr scripts en el origen de la API
+INLINE_CONTENT_TYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/webp'}
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+
+
+class AttachmentTooLarge(ValueError):
+    pass
+
+
+class AttachmentStore:
+    """Interfaz de los backends de adjuntos"""
+
+    def save(self, chunks, max_bytes=None):
+        """Guarda el contenido (iterable de bytes) y devuelve (clave, tamaño)"""
+        raise NotImplementedError
+
+    def open(self, key):
+        """Archivo binario de solo lectura posicionable (seek) con el contenido"""
+        raise NotImplementedError
+
+    def size(self, key):
+        raise NotImplementedError
+
+    def exists(self, key):
+        raise NotImplementedError
+
+
+class LocalAttachmentStore(AttachmentStore):
+    """Archivos en disco bajo <root>/<ab>/<cd>/<sha256>"""
+
+    def __init__(self, root=None):
+        self.root = root or getattr(
+            settings, 'MESSAGING_ATTACHMENT_ROOT',
+            os.path.join(settings.BASE_DIR, 'media', 'attachments'),
+        )
+
+    def path(self, key):
+        if not _KEY_RE.match(key or ''):
+            raise ValueError(f'Clave de adjunto inválida: {key}')
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def save(self, chunks, max_bytes=None):
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise AttachmentTooLarge(size)
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            key = digest.hexdigest()
+            final_path = self.path(key)
+            if os.path.exists(final_path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return key, size
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def size(self, key):
+        return os.path.getsize(self.path(key))
+
+    def exists(self, key):
+        try:
+            return os.path.exists(self.path(key))
+        except ValueError:
+            return False
+
+
+@lru_cache(maxsize=1)
+def get_store():
+    backend = getattr(settings, 'MESSAGING_ATTACHMENT_STORE', 'messaging.attachments.LocalAttachmentStore')
+    return import_string(backend)()
+
+
+def max_attachment_bytes():
+    return getattr(settings, 'MESSAGING_ATTACHMENT_MAX_BYTES', 10 * 1024 * 1024)
+
+
+def decode_base64(value):
+    """Devuelve (bytes, content_type) de un data URL o de base64 plano"""
+    content_type = None
+    match = _DATA_URL_RE.match(value)
+    if match:
+        content_type = match.group('type')
+        value = value[match.end():]
+    try:
+        return base64.b64decode(value, validate=False), content_type
+    except (binascii.Error, ValueError) as e:
+        raise ValueError('Adjunto en base64 inválido') from e
+
+
+def iter_file(file_obj, start=0, length=None, chunk_size=CHUNK_SIZE):
+    """Lee un rango del archivo en bloques y lo cierra al terminar"""
+    try:
+        file_obj.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            data = file_obj.read(size)
+            if not data:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+            yield data
+    finally:
+        file_obj.close()
+
+
+def guess_content_type(name, fallback=DEFAULT_CONTENT_TYPE):
+    return mimetypes.guess_type(name or '')[0] or fallback
+
+
+def safe_content_type(content_type):
+    """Tipo con el que se guarda y sirve un adjunto: el declarado si es una imagen raster permitida,
+    application/octet-stream en cualquier otro caso (el cliente decide el tipo y no es de fiar)"""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    return content_type if content_type in INLINE_CONTENT_TYPES else DEFAULT_CONTENT_TYPE
+
+
+def sign_message_id(message_id):
+    return signing.TimestampSigner(salt=_SIGNER_SALT).sign(str(message_id))
+
+
+def verify_signature(message_id, signature):
+    max_age = getattr(settings, 'MESSAGING_ATTACHMENT_URL_MAX_AGE', 24 * 3600)
+    try:
+        value = signing.TimestampSigner(salt=_SIGNER_SALT).unsign(signature, max_age=max_age)
+    except signing.BadSignature:
+        return False
+    return value == str(message_id)
@@ -0,0 +1,44 @@
+"""
+Comando de Django para mover los adjuntos antiguos en base64 al almacén de adjuntos
+Ejecutar con: python manage.py move_message_attachments [--batch-size N]
+"""
+from django.core.management.base import BaseCommand
+from messaging.models import Message
+from messaging import attachments
+
+
+class Command(BaseCommand):
+    help = 'Mueve los adjuntos guardados en base64 dentro de la tabla messages al almacén de adjuntos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Mensajes a procesar por lote')
+
+    def handle(self, *args, **options):
+        store = attachments.get_store()
+        pending = (
+            Message.objects.filter(attachment_key__isnull=True, attachment__isnull=False)
+            .exclude(attachment='')
+            .exclude(attachment__startswith='http')
+        )
+        ids = list(pending.values_list('id', flat=True))
+        self.stdout.write(self.style.SUCCESS(f'Moviendo {len(ids)} adjuntos...'))
+
+        moved = failed = 0
+        batch_size = max(1, options['batch_size'])
+        for i in range(0, len(ids), batch_size):
+            for msg in Message.objects.filter(id__in=ids[i:i + batch_size]):
+                try:
+                    body, content_type = attachments.decode_base64(msg.attachment)
+                except ValueError:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'Mensaje {msg.id}: base64 inválido, se omite'))
+                    continue
+                key, size = store.save([body])
+                msg.attachment_key = key
+                msg.attachment_size = size
+                msg.attachment_content_type = content_type or attachments.guess_content_type(msg.attachment_name)
+                msg.attachment = None
+                msg.save(update_fields=['attachment_key', 'attachment_size', 'attachment_content_type', 'attachment'])
+                moved += 1
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {moved} adjuntos movidos, {failed} omitidos'))
@@ -0,0 +1,15 @@
+"""
+Comando de Django para recalcular los resúmenes de conversación de las bandejas de entrada
+Ejecutar con: python manage.py rebuild_conversation_summaries
+"""
+from django.core.management.base import BaseCommand
+from messaging import summaries
+
+
+class Command(BaseCommand):
+    help = 'Recalcula último mensaje y no leídos de cada conversación desde la tabla de mensajes'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Reconstruyendo resúmenes de conversación...'))
+        written = summaries.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✓ Resúmenes reconstruidos: {written}'))
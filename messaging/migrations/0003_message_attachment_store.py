@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_message_attachment_message_attachment_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='attachment_content_type',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='attachment_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
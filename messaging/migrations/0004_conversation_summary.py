@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_summaries(apps, schema_editor):
+    """Crea el resumen de cada participante de las conversaciones existentes"""
+    Conversation = apps.get_model('messaging', 'Conversation')
+    Message = apps.get_model('messaging', 'Message')
+    ConversationSummary = apps.get_model('messaging', 'ConversationSummary')
+
+    rows = []
+    for conv in Conversation.objects.all():
+        last = Message.objects.filter(conversation=conv).order_by('-id').defer('attachment').first()
+        for user_id, other_id in ((conv.participant1_id, conv.participant2_id),
+                                  (conv.participant2_id, conv.participant1_id)):
+            rows.append(ConversationSummary(
+                conversation=conv,
+                user_id=user_id,
+                other_user_id=other_id,
+                last_message=last,
+                last_message_text=((last.text or last.attachment_name or '')[:255]) if last else '',
+                last_message_at=last.created_at if last else None,
+                last_sender_uid=last.sender_id if last else '',
+                unread_count=Message.objects.filter(conversation=conv, sender_id=other_id, is_read=False).count(),
+            ))
+    ConversationSummary.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0007_userprofile_email_verification_token_and_more'),
+        ('messaging', '0003_message_attachment_store'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_text', models.CharField(blank=True, default='', max_length=255)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('last_sender_uid', models.CharField(blank=True, default='', max_length=128)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summaries', to='messaging.conversation')),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='messaging.message')),
+                ('other_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_summaries_as_other', to='authentication.userprofile')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_summaries', to='authentication.userprofile')),
+            ],
+            options={
+                'db_table': 'conversation_summaries',
+                'indexes': [models.Index(fields=['user', 'last_message_at'], name='conv_summary_inbox_idx')],
+                'unique_together': {('conversation', 'user')},
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -45,6 +45,9 @@ class Conversation(models.Model):
             participant1=user1,
             participant2=user2
         )
+        if created:
+            from .summaries import ensure_summaries
+            ensure_summaries(conversation)
         return conversation
 
 class Message(models.Model):
@@ -70,8 +73,11 @@ class Message(models.Model):
     text = models.TextField(blank=True)  # Ahora puede estar vacío si solo hay archivo
     message_type = models.CharField(max_length=10, choices=MESSAGE_TYPE_CHOICES, default='text')
     
-    # Campo para almacenar archivo/imagen en base64 o URL
+    # Adjuntos antiguos en base64 o URL (los nuevos van al almacén de adjuntos)
     attachment = models.TextField(blank=True, null=True)
+    # SHA-256 del contenido en el almacén de adjuntos (ver attachments.py)
+    attachment_key = models.CharField(max_length=64, blank=True, null=True)
+    attachment_content_type = models.CharField(max_length=100, blank=True, null=True)
     attachment_name = models.CharField(max_length=255, blank=True, null=True)  # Nombre original del archivo
     attachment_size = models.IntegerField(blank=True, null=True)  # Tamaño en bytes
     
@@ -88,4 +94,49 @@ class Message(models.Model):
         else:
             return f"{self.message_type.capitalize()} de {self.sender.display_name} - {self.attachment_name}"
 
+    @property
+    def has_attachment(self):
+        return bool(self.attachment_key or self.attachment)
 
+
+class ConversationSummary(models.Model):
+    """
+    Resumen desnormalizado de una conversación para cada participante
+    (último mensaje y no leídos), usado por las bandejas de entrada
+    """
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='summaries'
+    )
+    user = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name='conversation_summaries'
+    )
+    other_user = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name='conversation_summaries_as_other'
+    )
+    last_message = models.ForeignKey(
+        Message,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='+'
+    )
+    last_message_text = models.CharField(max_length=255, blank=True, default='')
+    last_message_at = models.DateTimeField(blank=True, null=True)
+    last_sender_uid = models.CharField(max_length=128, blank=True, default='')
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'conversation_summaries'
+        unique_together = ('conversation', 'user')
+        indexes = [
+            models.Index(fields=['user', 'last_message_at'], name='conv_summary_inbox_idx'),
+        ]
+
+    def __str__(self):
+        return f"Resumen de {self.conversation_id} para {self.user_id} ({self.unread_count} sin leer)"
@@ -0,0 +1,82 @@
+"""
+Mantenimiento de ConversationSummary.
+
+Cada conversación tiene una fila por participante con el último mensaje y
+el contador de no leídos de ese participante. Se actualiza dentro de la misma
+transacción que el envío o la lectura de mensajes, así las bandejas de entrada
+se sirven con una sola consulta.
+"""
+from django.db.models import F, Count
+from django.db.models.functions import Greatest
+from .models import Conversation, ConversationSummary, Message
+
+PREVIEW_LENGTH = 255
+
+
+def message_preview(message):
+    text = message.text or message.attachment_name or ''
+    return text[:PREVIEW_LENGTH]
+
+
+def ensure_summaries(conversation):
+    ConversationSummary.objects.bulk_create([
+        ConversationSummary(
+            conversation=conversation,
+            user_id=conversation.participant1_id,
+            other_user_id=conversation.participant2_id,
+        ),
+        ConversationSummary(
+            conversation=conversation,
+            user_id=conversation.participant2_id,
+            other_user_id=conversation.participant1_id,
+        ),
+    ], ignore_conflicts=True)
+
+
+def record_message(message):
+    """Registra un mensaje nuevo como último de la conversación y suma un no leído al destinatario"""
+    ensure_summaries(message.conversation)
+    summaries = ConversationSummary.objects.filter(conversation_id=message.conversation_id)
+    last = {
+        'last_message': message,
+        'last_message_text': message_preview(message),
+        'last_message_at': message.created_at,
+        'last_sender_uid': message.sender_id,
+    }
+    summaries.filter(user_id=message.sender_id).update(**last)
+    summaries.exclude(user_id=message.sender_id).update(unread_count=F('unread_count') + 1, **last)
+
+
+def record_read(conversation, reader_uid, count):
+    """Descuenta `count` mensajes leídos por `reader_uid`"""
+    if count <= 0:
+        return
+    ConversationSummary.objects.filter(conversation=conversation, user_id=reader_uid).update(
+        unread_count=Greatest(F('unread_count') - count, 0)
+    )
+
+
+def rebuild(conversations=None):
+    """Recalcula los resúmenes desde la tabla de mensajes; devuelve cuántas filas escribió"""
+    if conversations is None:
+        conversations = Conversation.objects.all()
+    written = 0
+    for conversation in conversations.iterator():
+        ensure_summaries(conversation)
+        last = conversation.messages.order_by('-id').defer('attachment').first()
+        unread = dict(
+            conversation.messages.filter(is_read=False)
+            .order_by()
+            .values('sender_id')
+            .annotate(n=Count('id'))
+            .values_list('sender_id', 'n')
+        )
+        for summary in ConversationSummary.objects.filter(conversation=conversation):
+            summary.unread_count = unread.get(summary.other_user_id, 0)
+            summary.last_message = last
+            summary.last_message_text = message_preview(last) if last else ''
+            summary.last_message_at = last.created_at if last else None
+            summary.last_sender_uid = last.sender_id if last else ''
+            summary.save()
+            written += 1
+    return written
@@ -1,3 +1,284 @@
-from django.test import TestCase
+import base64
+import importlib
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+from django.apps import apps as django_apps
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from authentication.models import UserProfile
+from . import attachments, summaries, views
+from .models import Conversation, ConversationSummary, Message
 
-# Create your tests here.
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+
+
+def _api(method, uid, data=None, **params):
+    factory = APIRequestFactory()
+    if method == 'post':
+        request = factory.post('/', data or {}, format='json')
+    else:
+        request = factory.get('/', params)
+    request.firebase_user = {'uid': uid, 'email': f'{uid}@hotel.pe'}
+    return request
+
+
+class MessagingTestCase(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        settings_override = override_settings(MESSAGING_ATTACHMENT_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        attachments.get_store.cache_clear()
+        self.addCleanup(attachments.get_store.cache_clear)
+        for uid in ('ana', 'beto', 'carla'):
+            UserProfile.objects.create(firebase_uid=uid, email=f'{uid}@hotel.pe', display_name=uid.title())
+
+    def send(self, sender, recipient, text='', **data):
+        response = views.send_message(_api('post', sender, dict(data, text=text)), recipient)
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['message']
+
+    def send_file(self, body, content_type, name):
+        encoded = f'data:{content_type};base64,' + base64.b64encode(body).decode()
+        data = self.send('ana', 'beto', message_type='file', attachment=encoded, attachment_name=name)
+        return Message.objects.get(id=data['id'])
+
+    def download(self, msg, sig=None, uid=None, **headers):
+        params = {'sig': attachments.sign_message_id(msg.id) if sig is None else sig}
+        request = RequestFactory().get('/', params, **headers)
+        if uid:
+            request.firebase_user = {'uid': uid}
+        return views.download_attachment(request, msg.id)
+
+
+class AttachmentContentTypeTests(MessagingTestCase):
+    def test_scriptable_uploads_are_stored_and_served_as_downloads(self):
+        for content_type, name in (('text/html', 'x.html'), ('image/svg+xml', 'x.svg'), ('text/html', '')):
+            with self.subTest(content_type=content_type, name=name):
+                msg = self.send_file(b'<script>alert(1)</script>', content_type, name)
+                self.assertEqual(msg.attachment_content_type, 'application/octet-stream')
+                response = self.download(msg)
+                self.assertEqual(response['Content-Type'], 'application/octet-stream')
+                self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+                self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+
+    def test_raster_images_are_served_inline(self):
+        msg = self.send_file(PNG, 'image/png', 'foto.png')
+        self.assertEqual(msg.attachment_content_type, 'image/png')
+        response = self.download(msg)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+
+    def test_legacy_rows_with_client_type_are_normalised_on_download(self):
+        msg = self.send_file(b'<svg onload="alert(1)"/>', 'image/png', 'x.png')
+        Message.objects.filter(id=msg.id).update(attachment_content_type='image/svg+xml')
+        msg.refresh_from_db()
+        response = self.download(msg)
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+
+
+class LegacyAttachmentUrlTests(MessagingTestCase):
+    def test_serializing_legacy_rows_does_not_load_the_attachment_column(self):
+        conversation = Conversation.get_or_create_conversation('ana', 'beto')
+        legacy = {
+            'https://cdn.hotel.pe/a.png': 'https://cdn.hotel.pe/a.png',
+            'data:image/png;base64,' + base64.b64encode(PNG).decode(): 'sig=',
+            None: None,
+        }
+        for value in legacy:
+            Message.objects.create(conversation=conversation, sender_id='ana', text='x', attachment=value)
+        request = RequestFactory().get('/')
+        with self.assertNumQueries(1):
+            urls = [
+                views._attachment_url(request, msg)
+                for msg in views._with_attachment_fields(conversation.messages.order_by('id'))
+            ]
+        for url, expected in zip(urls, legacy.values()):
+            if expected is None:
+                self.assertIsNone(url)
+            else:
+                self.assertIn(expected, url)
+
+
+class MessagePagingTests(MessagingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ids = [self.send('beto', 'ana', f'm{i}')['id'] for i in range(5)]
+
+    def page(self, uid='ana', other='beto', **params):
+        response = views.get_messages(_api('get', uid, **params), other)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def ids_of(self, data):
+        return [m['id'] for m in data['messages']]
+
+    def test_latest_page_and_before(self):
+        latest = self.page(uid='beto', other='ana', limit=2)
+        self.assertEqual(self.ids_of(latest), self.ids[3:])
+        self.assertTrue(latest['has_more'])
+        older = self.page(uid='beto', other='ana', limit=2, before=latest['first_id'])
+        self.assertEqual(self.ids_of(older), self.ids[1:3])
+        oldest = self.page(uid='beto', other='ana', limit=2, before=older['first_id'])
+        self.assertEqual(self.ids_of(oldest), self.ids[:1])
+        self.assertFalse(oldest['has_more'])
+
+    def test_after_and_since_sync_forward(self):
+        data = self.page(uid='beto', other='ana', limit=2, after=self.ids[1])
+        self.assertEqual(self.ids_of(data), self.ids[2:4])
+        self.assertTrue(data['has_more'])
+        Message.objects.filter(id__lte=self.ids[2]).update(created_at=timezone.now() - timedelta(hours=1))
+        since = (timezone.now() - timedelta(minutes=30)).isoformat()
+        self.assertEqual(self.ids_of(self.page(uid='beto', other='ana', since=since)), self.ids[3:])
+
+    def test_invalid_cursors_are_rejected(self):
+        for params in ({'before': 'x'}, {'after': '1.5'}, {'since': 'ayer'}):
+            with self.subTest(params=params):
+                response = views.get_messages(_api('get', 'ana', **params), 'beto')
+                self.assertEqual(response.status_code, 400)
+
+    def test_mark_as_read_stops_at_the_last_delivered_message(self):
+        data = self.page(limit=2, after=0)
+        self.assertEqual(self.ids_of(data), self.ids[:2])
+        self.assertTrue(all(m['is_read'] for m in data['messages']))
+        unread = list(Message.objects.filter(is_read=False).values_list('id', flat=True).order_by('id'))
+        self.assertEqual(unread, self.ids[2:])
+        self.assertEqual(ConversationSummary.objects.get(user_id='ana').unread_count, 3)
+
+    def test_own_messages_are_not_marked_read(self):
+        self.page(uid='beto', other='ana')
+        self.assertEqual(Message.objects.filter(is_read=False).count(), 5)
+
+
+class ConversationSummaryTests(MessagingTestCase):
+    def summary(self, uid, other):
+        return ConversationSummary.objects.get(user_id=uid, other_user_id=other)
+
+    def state(self):
+        return {
+            (s.user_id, s.other_user_id): (s.unread_count, s.last_message_id, s.last_message_text, s.last_sender_uid)
+            for s in ConversationSummary.objects.all()
+        }
+
+    def test_send_and_read_keep_counts_and_last_message(self):
+        self.send('ana', 'beto', 'hola')
+        last = self.send('ana', 'beto', 'cómo estás')
+        self.assertEqual(self.summary('beto', 'ana').unread_count, 2)
+        self.assertEqual(self.summary('ana', 'beto').unread_count, 0)
+        for uid, other in (('ana', 'beto'), ('beto', 'ana')):
+            summary = self.summary(uid, other)
+            self.assertEqual((summary.last_message_id, summary.last_message_text, summary.last_sender_uid),
+                             (last['id'], 'cómo estás', 'ana'))
+
+        views.get_messages(_api('get', 'beto'), 'ana')
+        self.assertEqual(self.summary('beto', 'ana').unread_count, 0)
+        reply = self.send('beto', 'ana', 'bien')
+        self.assertEqual(self.summary('ana', 'beto').unread_count, 1)
+        self.assertEqual(self.summary('ana', 'beto').last_message_id, reply['id'])
+        # Una relectura no deja el contador en negativo
+        views.get_messages(_api('get', 'beto'), 'ana')
+        self.assertEqual(self.summary('beto', 'ana').unread_count, 0)
+
+    def test_inbox_is_served_from_the_summary(self):
+        self.send('ana', 'beto', 'hola')
+        self.send('carla', 'beto', 'recepción')
+        response = views.list_conversations(_api('get', 'beto'))
+        inbox = [(c['other_user']['uid'], c['unread_count'], c['last_message']['text']) for c in response.data['conversations']]
+        self.assertEqual(sorted(inbox), [('ana', 1, 'hola'), ('carla', 1, 'recepción')])
+
+    def test_backfill_and_rebuild_match_the_incremental_summary(self):
+        self.send('ana', 'beto', 'hola')
+        self.send('beto', 'ana', 'hola ana')
+        self.send('ana', 'beto', 'adjunto', attachment='data:image/png;base64,' + base64.b64encode(PNG).decode(),
+                  attachment_name='foto.png')
+        self.send('carla', 'ana', 'turno')
+        views.get_messages(_api('get', 'ana'), 'beto')
+        self.send('beto', 'ana', 'ok')
+        Conversation.get_or_create_conversation('beto', 'carla')
+        expected = self.state()
+
+        ConversationSummary.objects.all().delete()
+        backfill = importlib.import_module('messaging.migrations.0004_conversation_summary').backfill_summaries
+        backfill(django_apps, None)
+        self.assertEqual(self.state(), expected)
+
+        ConversationSummary.objects.update(unread_count=99, last_message_text='')
+        summaries.rebuild()
+        self.assertEqual(self.state(), expected)
+
+
+class AttachmentDownloadTests(MessagingTestCase):
+    BODY = bytes(range(100))
+
+    def setUp(self):
+        super().setUp()
+        self.msg = self.send_file(self.BODY, 'application/pdf', 'factura.pdf')
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_parse_range_forms(self):
+        cases = {
+            None: None,
+            'bytes=0-': (0, 99),
+            'bytes=10-19': (10, 19),
+            'bytes=90-500': (90, 99),
+            'bytes=-10': (90, 99),
+            'bytes=-500': (0, 99),
+            'bytes=100-': False,
+            'bytes=20-10': False,
+            'bytes=-0': False,
+            'bytes=0-1,5-6': None,
+            'items=0-1': None,
+            'bytes=a-b': None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(views._parse_range(header, 100), expected)
+
+    def test_range_responses(self):
+        response = self.download(self.msg, HTTP_RANGE='bytes=0-')
+        self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 0-99/100'))
+        self.assertEqual(self.body(response), self.BODY)
+
+        response = self.download(self.msg, HTTP_RANGE='bytes=-10')
+        self.assertEqual((response.status_code, response['Content-Length']), (206, '10'))
+        self.assertEqual(self.body(response), self.BODY[-10:])
+
+        response = self.download(self.msg, HTTP_RANGE='bytes=100-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */100'))
+
+    def test_zero_length_body(self):
+        key, size = attachments.get_store().save([b''])
+        msg = Message.objects.create(
+            conversation=self.msg.conversation, sender_id='ana', message_type='file',
+            attachment_key=key, attachment_size=size, attachment_name='vacio.txt',
+        )
+        response = self.download(msg)
+        self.assertEqual((response.status_code, response['Content-Length']), (200, '0'))
+        self.assertEqual(self.body(response), b'')
+        self.assertEqual(self.download(msg, HTTP_RANGE='bytes=0-').status_code, 416)
+
+    def test_expired_or_foreign_signature_requires_a_participant(self):
+        other = self.send_file(b'otro', 'text/plain', 'otro.txt')
+        foreign = attachments.sign_message_id(other.id)
+        self.assertEqual(self.download(self.msg, sig=foreign).status_code, 401)
+        self.assertEqual(self.download(self.msg, sig='basura').status_code, 401)
+
+        with override_settings(MESSAGING_ATTACHMENT_URL_MAX_AGE=60):
+            signature = attachments.sign_message_id(self.msg.id)
+            later = time.time() + 120
+            with mock.patch('django.core.signing.time.time', return_value=later):
+                self.assertFalse(attachments.verify_signature(self.msg.id, signature))
+                self.assertEqual(self.download(self.msg, sig=signature).status_code, 401)
+                self.assertEqual(self.download(self.msg, sig=signature, uid='beto').status_code, 200)
+
+    def test_non_participant_gets_403(self):
+        self.assertEqual(self.download(self.msg, sig='', uid='carla').status_code, 403)
+        self.assertEqual(self.download(self.msg, sig='', uid='ana').status_code, 200)
@@ -13,4 +13,7 @@ urlpatterns = [
     
     # Enviar mensaje
     path('send/<str:other_user_uid>/', views.send_message, name='send_message'),
+    
+    # Descargar adjunto de un mensaje (streaming con soporte de Range)
+    path('attachments/<int:message_id>/', views.download_attachment, name='download_attachment'),
 ]
@@ -1,11 +1,78 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Q, Max, Count, Case, When, F
-from .models import Conversation, Message
+import io
+from django.db import transaction
+from django.db.models import Case, F, FilteredRelation, Q, TextField, Value, When
+from django.db.models.functions import Substr
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import content_disposition_header
+from django.views.decorators.http import require_GET
+from .models import Conversation, ConversationSummary, Message
+from . import attachments, summaries
 from authentication.models import UserProfile
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from presence import groups as presence_groups
+from reservations import pagination
+
+
+def _with_attachment_fields(messages):
+    """Mensajes listos para _serialize_message sin leer los cuerpos antiguos en base64:
+    solo el prefijo del adjunto y, si era una URL, la URL completa"""
+    is_url = Q(attachment__startswith='http://') | Q(attachment__startswith='https://')
+    return messages.defer('attachment').annotate(
+        attachment_prefix=Substr('attachment', 1, 8),
+        legacy_attachment_url=Case(When(is_url, then='attachment'), default=Value(None), output_field=TextField()),
+    )
+
+
+def _attachment_url(request, msg):
+    """URL firmada de descarga del adjunto (los antiguos que ya eran una URL se devuelven tal cual)"""
+    if not msg.attachment_key:
+        if getattr(msg, 'legacy_attachment_url', None):
+            return msg.legacy_attachment_url
+        if not getattr(msg, 'attachment_prefix', None):
+            return None
+    url = reverse('download_attachment', args=[msg.id])
+    return request.build_absolute_uri(f"{url}?sig={attachments.sign_message_id(msg.id)}")
+
+
+def _serialize_message(request, msg, sender_uid):
+    return {
+        'id': msg.id,
+        'sender_uid': sender_uid,
+        'text': msg.text,
+        'message_type': msg.message_type,
+        'attachment': _attachment_url(request, msg),
+        'attachment_name': msg.attachment_name,
+        'attachment_size': msg.attachment_size,
+        'attachment_content_type': msg.attachment_content_type,
+        'is_read': msg.is_read,
+        'timestamp': msg.created_at.isoformat()
+    }
+
+
+def _store_attachment(request):
+    """Guarda el adjunto de la petición (multipart `file` o base64 en `attachment`).
+
+    Devuelve (clave, tamaño, content_type) o None si no hay adjunto.
+    """
+    store = attachments.get_store()
+    max_bytes = attachments.max_attachment_bytes()
+    upload = request.FILES.get('file') if hasattr(request, 'FILES') else None
+    if upload is not None:
+        if upload.size > max_bytes:
+            raise attachments.AttachmentTooLarge(upload.size)
+        key, size = store.save(upload.chunks(attachments.CHUNK_SIZE), max_bytes=max_bytes)
+        return key, size, upload.content_type
+    encoded = request.data.get('attachment', '')
+    if not encoded:
+        return None
+    body, content_type = attachments.decode_base64(encoded)
+    key, size = store.save([body], max_bytes=max_bytes)
+    return key, size, content_type
 
 @api_view(['GET'])
 def list_conversations(request):
@@ -21,30 +88,17 @@ def list_conversations(request):
         uid = request.firebase_user['uid']
         user = UserProfile.objects.get(firebase_uid=uid)
         
-        # Obtener conversaciones donde el usuario es participante
-        conversations = Conversation.objects.filter(
-            Q(participant1=user) | Q(participant2=user)
-        ).annotate(
-            last_message_time=Max('messages__created_at'),
-            unread_count=Count(
-                Case(
-                    When(
-                        messages__is_read=False,
-                        messages__sender__firebase_uid__ne=uid,
-                        then=1
-                    )
-                )
-            )
-        ).order_by('-last_message_time')
+        # Bandeja de entrada desde el resumen desnormalizado (una sola consulta)
+        inbox = (
+            ConversationSummary.objects.filter(user=user)
+            .select_related('conversation', 'other_user')
+            .order_by(F('last_message_at').desc(nulls_last=True))
+        )
         
         result = []
-        for conv in conversations:
-            # Determinar el otro participante
-            other_user = conv.participant2 if conv.participant1.firebase_uid == uid else conv.participant1
-            
-            # Obtener último mensaje
-            last_msg = conv.messages.last()
-            
+        for summary in inbox:
+            other_user = summary.other_user
+            conv = summary.conversation
             result.append({
                 'conversation_id': conv.id,
                 'other_user': {
@@ -55,11 +109,11 @@ def list_conversations(request):
                     'photo': other_user.profile_photo_url or ''
                 },
                 'last_message': {
-                    'text': last_msg.text if last_msg else '',
-                    'timestamp': last_msg.created_at.isoformat() if last_msg else conv.created_at.isoformat(),
-                    'sender_uid': last_msg.sender.firebase_uid if last_msg else ''
-                } if last_msg else None,
-                'unread_count': conv.unread_count,
+                    'text': summary.last_message_text,
+                    'timestamp': summary.last_message_at.isoformat(),
+                    'sender_uid': summary.last_sender_uid
+                } if summary.last_message_at else None,
+                'unread_count': summary.unread_count,
                 'updated_at': conv.updated_at.isoformat()
             })
         
@@ -79,7 +133,15 @@ def list_conversations(request):
 @api_view(['GET'])
 def get_messages(request, other_user_uid):
     """
-    Obtener todos los mensajes de una conversación con otro usuario
+    Obtener los mensajes de una conversación con otro usuario, paginados por id.
+
+    Parámetros opcionales:
+    - limit: tamaño de página (por defecto 50, máximo 200)
+    - before: id de mensaje; devuelve la página anterior (historial más antiguo)
+    - after: id de mensaje; devuelve los mensajes posteriores (sincronización incremental)
+    - since: fecha ISO; devuelve los mensajes creados después de ese instante
+    Sin parámetros devuelve la página más reciente. Los mensajes siempre van
+    en orden cronológico.
     """
     if not hasattr(request, 'firebase_user'):
         return Response({
@@ -88,33 +150,69 @@ def get_messages(request, other_user_uid):
     
     try:
         uid = request.firebase_user['uid']
+        limit = pagination.parse_limit(request.query_params.get('limit'))
+        before = request.query_params.get('before')
+        after = request.query_params.get('after')
+        since = request.query_params.get('since')
+        try:
+            before = int(before) if before else None
+            after = int(after) if after else None
+        except ValueError:
+            return Response({
+                'error': 'before y after deben ser ids de mensaje'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if since:
+            since = parse_datetime(since)
+            if since is None:
+                return Response({
+                    'error': 'since debe ser una fecha ISO 8601'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
         
         # Obtener o crear conversación
         conversation = Conversation.get_or_create_conversation(uid, other_user_uid)
         
-        # Obtener mensajes
-        messages = conversation.messages.all()
+        # Obtener mensajes (sin cargar los cuerpos de adjuntos antiguos en base64)
+        messages = _with_attachment_fields(conversation.messages.all())
+        if after is not None or since is not None:
+            # Sincronización incremental: del más antiguo al más nuevo
+            if after is not None:
+                messages = messages.filter(id__gt=after)
+            if since is not None:
+                messages = messages.filter(created_at__gt=since)
+            page = list(messages.order_by('id')[:limit + 1])
+            has_more = len(page) > limit
+            page = page[:limit]
+        else:
+            if before is not None:
+                messages = messages.filter(id__lt=before)
+            page = list(messages.order_by('-id')[:limit + 1])
+            has_more = len(page) > limit
+            page = page[:limit][::-1]
         
-        # Marcar mensajes como leídos
-        messages.filter(sender__firebase_uid=other_user_uid, is_read=False).update(is_read=True)
+        # Marcar como leídos solo los mensajes recibidos hasta el último entregado
+        received_ids = [msg.id for msg in page if msg.sender_id == other_user_uid and not msg.is_read]
+        if received_ids:
+            with transaction.atomic():
+                marked = conversation.messages.filter(
+                    sender_id=other_user_uid, is_read=False, id__lte=max(received_ids)
+                ).update(is_read=True)
+                summaries.record_read(conversation, uid, marked)
+            for msg in page:
+                if msg.sender_id == other_user_uid:
+                    msg.is_read = True
         
         result = []
-        for msg in messages:
-            result.append({
-                'id': msg.id,
-                'sender_uid': msg.sender.firebase_uid,
-                'text': msg.text,
-                'message_type': msg.message_type,
-                'attachment': msg.attachment,
-                'attachment_name': msg.attachment_name,
-                'attachment_size': msg.attachment_size,
-                'is_read': msg.is_read,
-                'timestamp': msg.created_at.isoformat()
-            })
+        for msg in page:
+            result.append(_serialize_message(request, msg, msg.sender_id))
         
         return Response({
             'conversation_id': conversation.id,
-            'messages': result
+            'messages': result,
+            'has_more': has_more,
+            'first_id': page[0].id if page else None,
+            'last_id': page[-1].id if page else None,
         })
         
     except UserProfile.DoesNotExist:
@@ -140,66 +238,71 @@ def send_message(request, other_user_uid):
         uid = request.firebase_user['uid']
         text = request.data.get('text', '').strip()
         message_type = request.data.get('message_type', 'text')
-        attachment = request.data.get('attachment', '')
         attachment_name = request.data.get('attachment_name', '')
-        attachment_size = request.data.get('attachment_size', 0)
         
-        # Validar que al menos haya texto o archivo adjunto
-        if not text and not attachment:
+        # Guardar el adjunto en el almacén; el mensaje solo conserva la clave
+        try:
+            stored = _store_attachment(request)
+        except attachments.AttachmentTooLarge:
             return Response({
-                'error': 'El mensaje debe contener texto o un archivo adjunto'
+                'error': 'El archivo es demasiado grande. Máximo 10MB'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Validar tamaño de archivo (máximo 10MB en base64)
-        if attachment and attachment_size > 10 * 1024 * 1024:
+        # Validar que al menos haya texto o archivo adjunto
+        if not text and not stored:
             return Response({
-                'error': 'El archivo es demasiado grande. Máximo 10MB'
+                'error': 'El mensaje debe contener texto o un archivo adjunto'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        attachment_key = attachment_size = attachment_content_type = None
+        if stored:
+            attachment_key, attachment_size, attachment_content_type = stored
+            if not attachment_name and 'file' in request.FILES:
+                attachment_name = request.FILES['file'].name
+            attachment_content_type = attachments.safe_content_type(
+                attachment_content_type or attachments.guess_content_type(attachment_name)
+            )
+        
         # Obtener o crear conversación
         conversation = Conversation.get_or_create_conversation(uid, other_user_uid)
         
         # Obtener usuario remitente
         sender = UserProfile.objects.get(firebase_uid=uid)
         
-        # Crear mensaje
-        message = Message.objects.create(
-            conversation=conversation,
-            sender=sender,
-            text=text,
-            message_type=message_type,
-            attachment=attachment,
-            attachment_name=attachment_name,
-            attachment_size=attachment_size
-        )
-        
-        # Actualizar timestamp de la conversación
-        conversation.save()  # Esto actualiza el updated_at
+        with transaction.atomic():
+            # Crear mensaje
+            message = Message.objects.create(
+                conversation=conversation,
+                sender=sender,
+                text=text,
+                message_type=message_type,
+                attachment_key=attachment_key,
+                attachment_content_type=attachment_content_type,
+                attachment_name=attachment_name or None,
+                attachment_size=attachment_size
+            )
+            
+            # Actualizar timestamp de la conversación y los resúmenes de ambos participantes
+            conversation.save()  # Esto actualiza el updated_at
+            summaries.record_message(message)
         
-        # Datos del mensaje
-        message_data = {
-            'id': message.id,
-            'sender_uid': message.sender.firebase_uid,
-            'text': message.text,
-            'message_type': message.message_type,
-            'attachment': message.attachment,
-            'attachment_name': message.attachment_name,
-            'attachment_size': message.attachment_size,
-            'is_read': message.is_read,
-            'timestamp': message.created_at.isoformat()
-        }
+        # Datos del mensaje (el adjunto viaja como URL, no como contenido)
+        message_data = _serialize_message(request, message, uid)
         
         # Notificar al destinatario via WebSocket
         try:
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                'presence',
+            presence_groups.send_event(
                 {
                     'type': 'new_message',
                     'target_uid': other_user_uid,
                     'sender_uid': uid,
                     'message': message_data,
-                }
+                },
+                uids=[other_user_uid],
             )
         except Exception:
             pass  # Si falla WebSocket, continuar normalmente
@@ -230,45 +333,30 @@ def list_users_for_messaging(request):
     
     try:
         uid = request.firebase_user['uid']
-        current_user = UserProfile.objects.get(firebase_uid=uid)
         
-        # Obtener todos los usuarios excepto el actual
-        users = UserProfile.objects.exclude(firebase_uid=uid)
+        # Todos los usuarios excepto el actual, unidos a su resumen de conversación con él
+        users = UserProfile.objects.exclude(firebase_uid=uid).annotate(
+            summary=FilteredRelation(
+                'conversation_summaries_as_other',
+                condition=Q(conversation_summaries_as_other__user_id=uid),
+            )
+        ).values(
+            'firebase_uid', 'display_name', 'email', 'role', 'profile_photo_url',
+            'summary__unread_count', 'summary__last_message_text', 'summary__last_message_at',
+        )
         
         result = []
         for user in users:
-            # Buscar conversación con este usuario
-            conversation = Conversation.objects.filter(
-                (Q(participant1=current_user) & Q(participant2=user)) |
-                (Q(participant1=user) & Q(participant2=current_user))
-            ).first()
-            
-            unread_count = 0
-            last_message = None
-            last_message_time = None
-            
-            if conversation:
-                # Contar mensajes no leídos de este usuario
-                unread_count = conversation.messages.filter(
-                    sender=user,
-                    is_read=False
-                ).count()
-                
-                # Obtener último mensaje
-                last_msg = conversation.messages.last()
-                if last_msg:
-                    last_message = last_msg.text
-                    last_message_time = last_msg.created_at.isoformat()
-            
+            last_message_time = user['summary__last_message_at']
             result.append({
-                'uid': user.firebase_uid,
-                'name': user.display_name or user.email.split('@')[0],
-                'email': user.email,
-                'role': user.role,
-                'photo': user.profile_photo_url or '',
-                'unread_count': unread_count,
-                'last_message': last_message,
-                'last_message_time': last_message_time
+                'uid': user['firebase_uid'],
+                'name': user['display_name'] or user['email'].split('@')[0],
+                'email': user['email'],
+                'role': user['role'],
+                'photo': user['profile_photo_url'] or '',
+                'unread_count': user['summary__unread_count'] or 0,
+                'last_message': user['summary__last_message_text'] if last_message_time else None,
+                'last_message_time': last_message_time.isoformat() if last_message_time else None
             })
         
         return Response({
@@ -280,3 +368,102 @@ def list_users_for_messaging(request):
             'error': f'Error listando usuarios: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+def _parse_range(header, size):
+    """Devuelve (inicio, fin) de un Range 'bytes=a-b' simple, None si no aplica o False si es insatisfacible"""
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start, _, end = header[6:].strip().partition('-')
+    try:
+        if start == '':
+            length = int(end)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+@require_GET
+def download_attachment(request, message_id):
+    """
+    Descargar el adjunto de un mensaje en streaming, con soporte de Range.
+    Acepta el token de Firebase de un participante o la firma `sig` de la URL.
+    """
+    try:
+        msg = Message.objects.select_related('conversation').get(id=message_id)
+    except Message.DoesNotExist:
+        return JsonResponse({'error': 'Mensaje no encontrado'}, status=404)
+
+    signature = request.GET.get('sig')
+    if not (signature and attachments.verify_signature(msg.id, signature)):
+        user = getattr(request, 'firebase_user', None)
+        if not user:
+            return JsonResponse({'error': 'Usuario no autenticado'}, status=401)
+        if user['uid'] not in (msg.conversation.participant1_id, msg.conversation.participant2_id):
+            return JsonResponse({'error': 'Sin acceso a este adjunto'}, status=403)
+
+    if msg.attachment_key:
+        store = attachments.get_store()
+        if not store.exists(msg.attachment_key):
+            return JsonResponse({'error': 'Adjunto no encontrado'}, status=404)
+        size = store.size(msg.attachment_key)
+        etag = f'"{msg.attachment_key}"'
+        content_type = msg.attachment_content_type or attachments.guess_content_type(msg.attachment_name)
+
+        def open_body():
+            return store.open(msg.attachment_key)
+    elif msg.attachment and not msg.attachment.startswith(('http://', 'https://')):
+        # Adjunto antiguo guardado en base64 dentro de la fila
+        try:
+            body, content_type = attachments.decode_base64(msg.attachment)
+        except ValueError:
+            return JsonResponse({'error': 'Adjunto dañado'}, status=500)
+        size = len(body)
+        etag = f'"m{msg.id}-{size}"'
+        content_type = content_type or attachments.guess_content_type(msg.attachment_name)
+
+        def open_body():
+            return io.BytesIO(body)
+    else:
+        return JsonResponse({'error': 'El mensaje no tiene adjunto'}, status=404)
+
+    # Las filas anteriores guardaban el tipo que mandó el cliente: se normaliza también al servir
+    content_type = attachments.safe_content_type(content_type)
+
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    byte_range = _parse_range(request.headers.get('Range'), size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            attachments.iter_file(open_body(), start, end - start + 1),
+            status=206, content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = StreamingHttpResponse(attachments.iter_file(open_body()), content_type=content_type)
+        response['Content-Length'] = str(size)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    # El contenido de una clave nunca cambia
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    response['X-Content-Type-Options'] = 'nosniff'
+    response['Content-Disposition'] = content_disposition_header(
+        content_type not in attachments.INLINE_CONTENT_TYPES, msg.attachment_name or f'adjunto-{msg.id}'
+    )
+    return response
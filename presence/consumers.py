@@ -2,15 +2,17 @@ import json
 from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from asgiref.sync import sync_to_async
 import firebase_admin
-from firebase_admin import auth as firebase_auth
+from authentication.token_cache import verify_id_token
+from . import groups, registry
 
 @database_sync_to_async
 def verify_firebase_token(token):
     """Verifica el token de Firebase de forma asíncrona"""
     if not firebase_admin._apps:
         raise Exception("Firebase no está inicializado")
-    return firebase_auth.verify_id_token(token)
+    return verify_id_token(token)
 
 class PresenceConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -28,12 +30,12 @@ class PresenceConsumer(AsyncWebsocketConsumer):
             decoded_token = await verify_firebase_token(token)
             self.user_uid = decoded_token.get('uid')
             self.user_email = decoded_token.get('email')
+            self.user_role = decoded_token.get('role', 'admin')
             
-            # Agregar al grupo de presencia
-            await self.channel_layer.group_add(
-                'presence',
-                self.channel_name
-            )
+            # Agregar al grupo de presencia, al grupo propio del usuario y al de su rol
+            self.groups_joined = groups.connection_groups(self.user_uid, self.user_role)
+            for group in self.groups_joined:
+                await self.channel_layer.group_add(group, self.channel_name)
             
             await self.accept()
             
@@ -43,9 +45,20 @@ class PresenceConsumer(AsyncWebsocketConsumer):
                 'status': 'connected',
             }))
             
-            # Notificar que el usuario está online
+            # Registrar la conexión y enviar quién está online ahora mismo
+            became_online = await sync_to_async(registry.get_registry().connect)(
+                self.user_uid, self.channel_name, self.user_email
+            )
+            await self.send(text_data=json.dumps({
+                'type': 'presence_snapshot',
+                'users': await sync_to_async(registry.online_users)(),
+            }))
+            
+            # Notificar que el usuario está online (solo con su primera conexión)
+            if not became_online:
+                return
             await self.channel_layer.group_send(
-                'presence',
+                groups.PRESENCE_GROUP,
                 {
                     'type': 'user_online',
                     'user_uid': self.user_uid,
@@ -57,16 +70,21 @@ class PresenceConsumer(AsyncWebsocketConsumer):
             await self.close(code=4003)
 
     async def disconnect(self, close_code):
-        # Remover del grupo de presencia
+        # Remover de los grupos a los que se unió la conexión
         if hasattr(self, 'user_uid'):
-            await self.channel_layer.group_discard(
-                'presence',
-                self.channel_name
+            for group in getattr(self, 'groups_joined', [groups.PRESENCE_GROUP]):
+                await self.channel_layer.group_discard(group, self.channel_name)
+            
+            # Otras pestañas del mismo usuario siguen conectadas: no está offline
+            went_offline = await sync_to_async(registry.get_registry().disconnect)(
+                self.user_uid, self.channel_name
             )
+            if not went_offline:
+                return
             
             # Notificar que el usuario está offline
             await self.channel_layer.group_send(
-                'presence',
+                groups.PRESENCE_GROUP,
                 {
                     'type': 'user_offline',
                     'user_uid': self.user_uid,
@@ -79,6 +97,11 @@ class PresenceConsumer(AsyncWebsocketConsumer):
         try:
             data = json.loads(text_data)
             if data.get('type') == 'ping':
+                # El ping renueva el latido de esta conexión en el registro de presencia
+                if hasattr(self, 'user_uid'):
+                    await sync_to_async(registry.get_registry().heartbeat)(self.user_uid, self.channel_name)
+                    # Aprovechar el ping para avisar de las conexiones que murieron sin disconnect
+                    await sync_to_async(registry.prune_expired)()
                 await self.send(text_data=json.dumps({
                     'type': 'pong',
                     'status': 'connected'
@@ -120,20 +143,22 @@ class PresenceConsumer(AsyncWebsocketConsumer):
         }))
 
     async def new_message(self, event):
-        # Enviar notificación de nuevo mensaje solo al destinatario
-        target_uid = event.get('target_uid')
-        if hasattr(self, 'user_uid') and self.user_uid == target_uid:
-            await self.send(text_data=json.dumps({
-                'type': 'new_message',
-                'message': event.get('message'),
-                'sender_uid': event.get('sender_uid'),
-            }))
+        # Llega por el grupo 'user.<uid>' del destinatario, no hace falta filtrar
+        await self.send(text_data=json.dumps({
+            'type': 'new_message',
+            'message': event.get('message'),
+            'sender_uid': event.get('sender_uid'),
+        }))
 
     async def general_notification(self, event):
         # Enviar notificación general (incidencias, bloqueos, etc.)
         # Solo enviar si el usuario actual no es el que creó la notificación
         created_by_uid = event.get('created_by_uid')
         current_user_uid = getattr(self, 'user_uid', None)
+
+        # Ya recibida a través del grupo de su rol
+        if getattr(self, 'user_role', None) in event.get('skip_roles', []):
+            return
         
         print(f"general_notification recibida - Usuario actual: {current_user_uid}, Creada por: {created_by_uid}")
         
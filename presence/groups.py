@@ -0,0 +1,65 @@
+"""
+Grupos de Channels para entregar eventos solo a quien corresponde.
+
+Cada conexión de PresenceConsumer se une a:
+- 'presence': todos los usuarios conectados (online/offline, avisos globales)
+- 'user.<uid>': todas las pestañas abiertas de un usuario
+- 'role.<rol>': los usuarios conectados con ese rol
+
+Así un mensaje directo o una notificación dirigida cuesta un envío por
+destinatario en lugar de uno por cada usuario conectado.
+"""
+import re
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+PRESENCE_GROUP = 'presence'
+
+# Channels solo admite ASCII alfanumérico, '-', '_' y '.' en nombres de grupo
+_INVALID_CHARS = re.compile(r'[^0-9A-Za-z_.\-]')
+
+
+def _safe(value):
+    return _INVALID_CHARS.sub('_', str(value))[:80]
+
+
+def user_group(uid):
+    return f'user.{_safe(uid)}'
+
+
+def role_group(role):
+    return f'role.{_safe(role)}'
+
+
+def connection_groups(uid, role):
+    """Grupos a los que se une una conexión autenticada"""
+    groups = [PRESENCE_GROUP, user_group(uid)]
+    if role:
+        groups.append(role_group(role))
+    return groups
+
+
+def send_event(event, uids=None, roles=None):
+    """Envía un evento de Channels a usuarios y/o roles concretos.
+
+    Sin `uids` ni `roles` se envía a todo el grupo 'presence'. Cuando se
+    indican ambos, los usuarios listados que ya pertenecen a uno de los roles
+    lo descartan (`skip_roles`) para no recibirlo dos veces.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return False
+    send = async_to_sync(channel_layer.group_send)
+    roles = [r for r in (roles or []) if r]
+    uids = [u for u in dict.fromkeys(uids or []) if u]
+
+    if not roles and not uids:
+        send(PRESENCE_GROUP, event)
+        return True
+    for role in roles:
+        send(role_group(role), event)
+    if uids:
+        user_event = dict(event, skip_roles=roles) if roles else event
+        for uid in uids:
+            send(user_group(uid), user_event)
+    return True
@@ -8,6 +8,7 @@ from datetime import datetime
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from mantenimiento.models import WaterHeatingSystem
+from presence.groups import PRESENCE_GROUP
 import time
 
 
@@ -44,7 +45,7 @@ class Command(BaseCommand):
                         
                         # Enviar a todos los usuarios conectados en el grupo 'presence'
                         async_to_sync(channel_layer.group_send)(
-                            'presence',
+                            PRESENCE_GROUP,
                             {
                                 'type': 'maintenance_notification',
                                 'title': 'Recordatorio de Mantenimiento',
@@ -0,0 +1,251 @@
+"""
+Registro de presencia: quién está conectado ahora mismo.
+
+Se lleva la cuenta de conexiones por usuario (una por pestaña/canal) con un
+latido que renueva cada `ping` del cliente. Una conexión sin latido durante
+PRESENCE_TTL_SECONDS se da por muerta aunque no haya llegado su disconnect
+(p. ej. si el worker se reinició); prune_expired() la retira y avisa
+`user_offline` igual que un disconnect.
+
+Backends:
+- MemoryPresenceRegistry: un solo proceso (desarrollo)
+- RedisPresenceRegistry: compartido entre workers, usa PRESENCE_REDIS_URL,
+  REDIS_URL o el Redis de la capa de canales si está configurada
+"""
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from django.conf import settings
+
+
+def presence_ttl():
+    return getattr(settings, 'PRESENCE_TTL_SECONDS', 90)
+
+
+class MemoryPresenceRegistry:
+    """Registro en memoria del proceso"""
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl or presence_ttl()
+        self._connections = {}  # uid -> {channel_name: último latido}
+        self._info = {}
+        self._lock = threading.Lock()
+
+    def _live(self, uid, now):
+        channels = self._connections.get(uid, {})
+        for channel in [c for c, seen in channels.items() if seen <= now - self.ttl]:
+            del channels[channel]
+        if not channels:
+            self._connections.pop(uid, None)
+            self._info.pop(uid, None)
+        return channels
+
+    def connect(self, uid, channel_name, email=None):
+        """Registra una conexión; devuelve True si el usuario pasa a estar online"""
+        now = time.time()
+        with self._lock:
+            was_online = bool(self._live(uid, now))
+            self._connections.setdefault(uid, {})[channel_name] = now
+            self._info[uid] = {'email': email}
+            return not was_online
+
+    def heartbeat(self, uid, channel_name):
+        now = time.time()
+        with self._lock:
+            self._connections.setdefault(uid, {})[channel_name] = now
+
+    def disconnect(self, uid, channel_name):
+        """Quita una conexión; devuelve True si era la última del usuario"""
+        now = time.time()
+        with self._lock:
+            channels = self._connections.get(uid, {})
+            channels.pop(channel_name, None)
+            return not self._live(uid, now)
+
+    def prune(self):
+        """Retira las conexiones vencidas; devuelve los usuarios que quedaron offline"""
+        now = time.time()
+        with self._lock:
+            pruned = []
+            for uid in list(self._connections):
+                info = self._info.get(uid, {})
+                if self._connections[uid] and not self._live(uid, now):
+                    pruned.append({'uid': uid, 'email': info.get('email')})
+            return pruned
+
+    def snapshot(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            result = []
+            for uid, channels in self._connections.items():
+                live = [seen for seen in channels.values() if seen > cutoff]
+                if live:
+                    result.append({
+                        'uid': uid,
+                        'email': self._info.get(uid, {}).get('email'),
+                        'connections': len(live),
+                        'last_seen': max(live),
+                    })
+            return result
+
+
+class RedisPresenceRegistry:
+    """Registro compartido en Redis.
+
+    presence:conn:<uid>  ZSET canal -> último latido
+    presence:users       ZSET uid -> último latido de cualquiera de sus canales
+    presence:info        HASH uid -> JSON con el email
+    """
+
+    PREFIX = 'presence'
+
+    def __init__(self, url=None, ttl=None):
+        import redis
+        self.ttl = ttl or presence_ttl()
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def _conn_key(self, uid):
+        return f'{self.PREFIX}:conn:{uid}'
+
+    def _users_key(self):
+        return f'{self.PREFIX}:users'
+
+    def _info_key(self):
+        return f'{self.PREFIX}:info'
+
+    def _touch(self, pipe, uid, channel_name, now):
+        pipe.zadd(self._conn_key(uid), {channel_name: now})
+        pipe.expire(self._conn_key(uid), self.ttl * 2)
+        pipe.zadd(self._users_key(), {uid: now})
+
+    def connect(self, uid, channel_name, email=None):
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(self._conn_key(uid), '-inf', now - self.ttl)
+        pipe.zcard(self._conn_key(uid))
+        self._touch(pipe, uid, channel_name, now)
+        pipe.hset(self._info_key(), uid, json.dumps({'email': email}))
+        results = pipe.execute()
+        return results[1] == 0
+
+    def heartbeat(self, uid, channel_name):
+        pipe = self.client.pipeline()
+        self._touch(pipe, uid, channel_name, time.time())
+        pipe.execute()
+
+    def disconnect(self, uid, channel_name):
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.zrem(self._conn_key(uid), channel_name)
+        pipe.zremrangebyscore(self._conn_key(uid), '-inf', now - self.ttl)
+        pipe.zcard(self._conn_key(uid))
+        remaining = pipe.execute()[2]
+        if remaining == 0:
+            pipe = self.client.pipeline()
+            pipe.zrem(self._users_key(), uid)
+            pipe.hdel(self._info_key(), uid)
+            pipe.execute()
+        return remaining == 0
+
+    def prune(self):
+        """Retira los usuarios sin latido vigente; devuelve los que quedaron offline.
+
+        Solo el worker cuyo ZREM quita al usuario lo reporta, así el aviso no se duplica.
+        """
+        cutoff = time.time() - self.ttl
+        pruned = []
+        for uid in self.client.zrangebyscore(self._users_key(), '-inf', cutoff):
+            pipe = self.client.pipeline()
+            pipe.zremrangebyscore(self._conn_key(uid), '-inf', cutoff)
+            pipe.zcard(self._conn_key(uid))
+            if pipe.execute()[1]:
+                continue
+            # Un latido recién llegado sube la puntuación y el ZREM condicionado no lo quita
+            removed = self.client.eval(
+                "if tonumber(redis.call('ZSCORE', KEYS[1], ARGV[1]) or '0') <= tonumber(ARGV[2]) "
+                "then return redis.call('ZREM', KEYS[1], ARGV[1]) end return 0",
+                1, self._users_key(), uid, cutoff,
+            )
+            if not removed:
+                continue
+            info = self.client.hget(self._info_key(), uid)
+            self.client.hdel(self._info_key(), uid)
+            pruned.append({'uid': uid, 'email': json.loads(info).get('email') if info else None})
+        return pruned
+
+    def snapshot(self):
+        cutoff = time.time() - self.ttl
+        uids = self.client.zrangebyscore(self._users_key(), cutoff, '+inf', withscores=True)
+        if not uids:
+            return []
+        pipe = self.client.pipeline()
+        for uid, _ in uids:
+            pipe.zcount(self._conn_key(uid), cutoff, '+inf')
+        pipe.hmget(self._info_key(), [uid for uid, _ in uids])
+        *counts, infos = pipe.execute()
+        result = []
+        for (uid, last_seen), count, info in zip(uids, counts, infos):
+            if count:
+                result.append({
+                    'uid': uid,
+                    'email': json.loads(info).get('email') if info else None,
+                    'connections': count,
+                    'last_seen': last_seen,
+                })
+        return result
+
+
+def _channel_layer_redis_url():
+    """URL del Redis de la capa de canales, si el backend configurado es Redis"""
+    layer = getattr(settings, 'CHANNEL_LAYERS', {}).get('default', {})
+    if 'redis' not in layer.get('BACKEND', '').lower():
+        return None
+    hosts = layer.get('CONFIG', {}).get('hosts') or [('localhost', 6379)]
+    host = hosts[0]
+    if isinstance(host, dict):
+        host = host.get('address')
+    if isinstance(host, (list, tuple)):
+        return f'redis://{host[0]}:{host[1]}'
+    return host
+
+
+@lru_cache(maxsize=1)
+def get_registry():
+    url = (
+        getattr(settings, 'PRESENCE_REDIS_URL', None)
+        or getattr(settings, 'REDIS_URL', None)
+        or _channel_layer_redis_url()
+    )
+    if url:
+        return RedisPresenceRegistry(url)
+    return MemoryPresenceRegistry()
+
+
+def prune_expired():
+    """Retira las conexiones sin latido y avisa `user_offline` por cada usuario que se fue"""
+    from . import groups
+
+    pruned = get_registry().prune()
+    for entry in pruned:
+        groups.send_event({
+            'type': 'user_offline',
+            'user_uid': entry['uid'],
+            'user_email': entry['email'],
+        })
+    return pruned
+
+
+def online_users():
+    """Snapshot serializable: usuarios online con su número de conexiones"""
+    prune_expired()
+    return [
+        {
+            'uid': entry['uid'],
+            'email': entry['email'],
+            'connections': entry['connections'],
+            'last_seen': datetime.fromtimestamp(entry['last_seen'], tz=timezone.utc).isoformat(),
+        }
+        for entry in sorted(get_registry().snapshot(), key=lambda e: e['uid'])
+    ]
@@ -0,0 +1,50 @@
+import time
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from . import registry
+
+
+class MemoryRegistryPruneTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = registry.MemoryPresenceRegistry(ttl=60)
+
+    def test_expired_user_is_pruned_once(self):
+        self.registry.connect('u1', 'c1', 'u1@hotel.pe')
+        self.registry.connect('u2', 'c2', 'u2@hotel.pe')
+        self.registry._connections['u1']['c1'] = time.time() - 120
+        self.assertEqual([e['uid'] for e in self.registry.snapshot()], ['u2'])
+        self.assertEqual(self.registry.prune(), [{'uid': 'u1', 'email': 'u1@hotel.pe'}])
+        self.assertEqual(self.registry.prune(), [])
+
+    def test_user_with_a_live_tab_is_not_pruned(self):
+        self.registry.connect('u1', 'c1')
+        self.registry.connect('u1', 'c2')
+        self.registry._connections['u1']['c1'] = time.time() - 120
+        self.assertEqual(self.registry.prune(), [])
+        self.assertEqual(self.registry.snapshot()[0]['connections'], 1)
+
+    def test_prune_broadcasts_user_offline(self):
+        self.registry.connect('u1', 'c1', 'u1@hotel.pe')
+        self.registry._connections['u1']['c1'] = time.time() - 120
+        with mock.patch.object(registry, 'get_registry', return_value=self.registry), \
+                mock.patch('presence.groups.send_event') as send_event:
+            self.assertEqual(registry.online_users(), [])
+        send_event.assert_called_once_with({'type': 'user_offline', 'user_uid': 'u1', 'user_email': 'u1@hotel.pe'})
+
+
+class RegistryBackendTests(SimpleTestCase):
+    @override_settings(CHANNEL_LAYERS={'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer', 'CONFIG': {'hosts': ['redis://cache:6379/1']},
+    }})
+    def test_redis_channel_layer_url(self):
+        self.assertEqual(registry._channel_layer_redis_url(), 'redis://cache:6379/1')
+
+    @override_settings(CHANNEL_LAYERS={'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer', 'CONFIG': {'hosts': [('cache', 6380)]},
+    }})
+    def test_redis_channel_layer_host_tuple(self):
+        self.assertEqual(registry._channel_layer_redis_url(), 'redis://cache:6380')
+
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    def test_in_memory_channel_layer_has_no_url(self):
+        self.assertIsNone(registry._channel_layer_redis_url())
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # Usuarios conectados ahora mismo
+    path('online/', views.online_users, name='online_users'),
+]
@@ -0,0 +1,15 @@
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework import status
+from . import registry
+
+
+@api_view(['GET'])
+def online_users(request):
+    """
+    Snapshot de los usuarios conectados ahora mismo (con su número de conexiones)
+    """
+    if not getattr(request, 'firebase_user', None):
+        return Response({'error': 'Usuario no autenticado'}, status=status.HTTP_401_UNAUTHORIZED)
+    users = registry.online_users()
+    return Response({'users': users, 'total': len(users)})
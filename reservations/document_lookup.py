@@ -0,0 +1,263 @@
+"""
+Consulta de documentos (DNI, RUC, CE) con caché persistente.
+
+Las respuestas del proveedor se guardan en la tabla document_lookups por
+(tipo, número): las encontradas durante LOOKUP_CACHE_TTL segundos y las
+inexistentes durante LOOKUP_NEGATIVE_TTL, así un huésped o empresa que vuelve
+no genera otra llamada externa. Los errores de red o del proveedor no se
+guardan.
+
+El proveedor se elige con LOOKUP_PROVIDER (ruta a una clase con fetch()):
+- HttpProvider: conexiones keep-alive reutilizadas por host, con timeout
+  LOOKUP_TIMEOUT en cada conexión y lectura.
+- StubProvider: respuestas locales deterministas para desarrollo y pruebas.
+
+Las consultas concurrentes del mismo documento en un proceso se agrupan: solo
+una llama al proveedor y el resto espera su resultado.
+"""
+import http.client
+import json
+import os
+import queue
+import re
+import socket
+import threading
+from datetime import timedelta
+from functools import lru_cache
+from urllib.parse import quote, urlsplit
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import DocumentLookup
+
+DOC_TYPES = ('DNI', 'RUC', 'CE')
+# Formato de cada documento: se valida antes de consultar, guardar o armar la URL del proveedor
+NUMBER_PATTERNS = {
+    'DNI': re.compile(r'^\d{8}$'),
+    'RUC': re.compile(r'^\d{11}$'),
+    'CE': re.compile(r'^[A-Z0-9]{1,12}$'),
+}
+DEFAULT_URLS = {
+    'DNI': 'https://api.factiliza.com/v1/dni/info/{number}',
+    'RUC': 'https://api.factiliza.com/v1/ruc/info/{number}',
+    'CE': 'https://api.factiliza.com/v1/cee/info/{number}',
+}
+
+
+class ProviderError(Exception):
+    """El proveedor no respondió o respondió con un error (no se guarda en caché)"""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def lookup_timeout():
+    return _setting('LOOKUP_TIMEOUT', 5)
+
+
+def normalize_number(doc_type, number):
+    """Número sin espacios (y en mayúsculas); ValueError si no tiene el formato del tipo de documento"""
+    number = ''.join((number or '').split()).upper()
+    pattern = NUMBER_PATTERNS.get(doc_type)
+    if pattern is None:
+        raise ValueError(f'Tipo de documento no soportado: {doc_type}')
+    if not pattern.match(number):
+        raise ValueError(f'Número de {doc_type} inválido')
+    return number
+
+
+def extract_name(doc_type, data):
+    """Nombre completo o razón social según el tipo de documento"""
+    full = ' '.join(
+        (data.get(key) or '').strip() for key in ('nombres', 'apellido_paterno', 'apellido_materno')
+    ).strip()
+    if doc_type == 'DNI':
+        return data.get('nombre_completo') or full
+    if doc_type == 'RUC':
+        return data.get('nombre_o_razon_social')
+    return full
+
+
+class HttpProvider:
+    """Cliente HTTP con un pool de conexiones keep-alive por host"""
+
+    def __init__(self, pool_size=None, timeout=None):
+        self.pool_size = pool_size or _setting('LOOKUP_POOL_SIZE', 4)
+        self.timeout = timeout or lookup_timeout()
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def url_for(self, doc_type, number):
+        url = os.environ.get(f'LOOKUP_{doc_type}_URL') or DEFAULT_URLS[doc_type]
+        for placeholder in ('{number}', '{dni}', '{ruc}', '{cee}'):
+            url = url.replace(placeholder, quote(number, safe=''))
+        return url
+
+    def _pool(self, origin):
+        with self._lock:
+            if origin not in self._pools:
+                self._pools[origin] = queue.LifoQueue(maxsize=self.pool_size)
+            return self._pools[origin]
+
+    def _connect(self, scheme, host, port):
+        cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return cls(host, port, timeout=self.timeout)
+
+    def _release(self, pool, conn):
+        try:
+            pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def fetch(self, doc_type, number):
+        """Devuelve (status, payload) con el JSON del proveedor"""
+        parts = urlsplit(self.url_for(doc_type, number))
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        origin = (parts.scheme, parts.hostname, parts.port)
+        pool = self._pool(origin)
+        headers = {'Accept': 'application/json', 'Connection': 'keep-alive'}
+        token = _setting('LOOKUP_API_TOKEN', None)
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
+
+        # Una conexión reutilizada puede haber sido cerrada por el servidor: se reintenta una vez con una nueva
+        for attempt in range(2):
+            try:
+                conn = pool.get_nowait()
+                reused = True
+            except queue.Empty:
+                conn = self._connect(*origin)
+                reused = False
+            try:
+                conn.request('GET', path, headers=headers)
+                resp = conn.getresponse()
+                raw = resp.read()
+            except socket.timeout:
+                conn.close()
+                raise ProviderError('Tiempo de espera agotado')
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise ProviderError('No se pudo conectar al proveedor') from e
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(pool, conn)
+            break
+
+        try:
+            payload = json.loads(raw.decode('utf-8'))
+        except ValueError:
+            payload = None
+        if resp.status == 404:
+            return resp.status, payload if isinstance(payload, dict) else {'success': False}
+        if resp.status >= 400 or not isinstance(payload, dict):
+            raise ProviderError(f'HTTP {resp.status}')
+        return resp.status, payload
+
+
+class StubProvider:
+    """Proveedor local: números que empiezan con 0000 no existen, el resto devuelve un nombre de prueba"""
+
+    def fetch(self, doc_type, number):
+        if number.startswith('0000'):
+            return 404, {'success': False, 'message': 'Documento no encontrado'}
+        if doc_type == 'RUC':
+            data = {'numero': number, 'nombre_o_razon_social': f'EMPRESA DE PRUEBA {number} S.A.C.'}
+        else:
+            data = {'numero': number, 'nombres': 'HUESPED', 'apellido_paterno': 'DE', 'apellido_materno': f'PRUEBA {number}'}
+            if doc_type == 'DNI':
+                data['nombre_completo'] = f'HUESPED DE PRUEBA {number}'
+        return 200, {'success': True, 'message': 'Exito', 'data': data}
+
+
+@lru_cache(maxsize=1)
+def get_provider():
+    backend = _setting('LOOKUP_PROVIDER', 'reservations.document_lookup.HttpProvider')
+    return import_string(backend)()
+
+
+def _as_result(entry, cached):
+    return {
+        'found': entry.found,
+        'name': entry.name,
+        'message': entry.message,
+        'payload': entry.payload,
+        'cached': cached,
+    }
+
+
+def _fetch_and_store(doc_type, number):
+    status, payload = get_provider().fetch(doc_type, number)
+    found = bool(payload.get('success'))
+    now = timezone.now()
+    ttl = _setting('LOOKUP_CACHE_TTL', 30 * 24 * 3600) if found else _setting('LOOKUP_NEGATIVE_TTL', 3600)
+    values = {
+        'found': found,
+        'name': extract_name(doc_type, payload.get('data') or {}) if found else None,
+        'message': None if found else (payload.get('message') or 'Consulta fallida')[:255],
+        'payload': payload,
+        'fetched_at': now,
+        'expires_at': now + timedelta(seconds=ttl),
+    }
+    try:
+        entry, _ = DocumentLookup.objects.update_or_create(doc_type=doc_type, number=number, defaults=values)
+    except IntegrityError:
+        # Otro proceso guardó el mismo documento a la vez; el resultado es equivalente
+        entry = DocumentLookup(doc_type=doc_type, number=number, **values)
+    return _as_result(entry, cached=False)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def lookup(doc_type, number):
+    """Resultado de la consulta: {found, name, message, payload, cached}.
+
+    Lanza ValueError si el tipo o el número no son válidos y ProviderError si falla el proveedor.
+    """
+    doc_type = doc_type.upper()
+    number = normalize_number(doc_type, number)
+
+    entry = DocumentLookup.objects.filter(
+        doc_type=doc_type, number=number, expires_at__gt=timezone.now()
+    ).first()
+    if entry:
+        return _as_result(entry, cached=True)
+
+    key = (doc_type, number)
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = _Call()
+
+    if not leader:
+        # Consulta idéntica en curso: se espera su resultado (acotado por el timeout del proveedor)
+        if not call.done.wait(lookup_timeout() * 2 + 1):
+            raise ProviderError('Tiempo de espera agotado')
+        if call.error:
+            raise call.error
+        return dict(call.result, cached=True)
+
+    try:
+        call.result = _fetch_and_store(doc_type, number)
+        return call.result
+    except Exception as e:
+        call.error = e if isinstance(e, ProviderError) else ProviderError(str(e))
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        call.done.set()
@@ -0,0 +1,15 @@
+"""
+Comando de Django para reconstruir el índice de noches ocupadas (room_nights)
+Ejecutar con: python manage.py rebuild_room_nights
+"""
+from django.core.management.base import BaseCommand
+from reservations import room_nights
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de ocupación por habitación y noche desde reservas y bloqueos'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Reconstruyendo índice de noches ocupadas...'))
+        total = room_nights.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f'✓ Índice reconstruido: {total} noches registradas'))
@@ -0,0 +1,40 @@
+"""
+Management command para aplicar las transiciones de estado de reservas y habitaciones
+Ejecutar con: python manage.py sync_reservation_statuses [--once] [--interval 30]
+"""
+from django.core.management.base import BaseCommand
+from reservations import status_engine, room_status
+import time
+
+
+class Command(BaseCommand):
+    help = 'Aplica periódicamente las transiciones de estado vencidas (Confirmada, Check-in, Check-out) y sincroniza las habitaciones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Ejecutar una sola pasada y terminar')
+        parser.add_argument('--interval', type=int, default=30, help='Segundos entre pasadas (por defecto 30)')
+
+    def run_once(self):
+        changed = status_engine.apply_due_transitions()
+        room_changes = room_status.sync_room_statuses()
+        for res in changed:
+            self.stdout.write(self.style.SUCCESS(f'Reserva {res.reservation_id} -> {res.status}'))
+        for change in room_changes:
+            self.stdout.write(self.style.SUCCESS(f"Habitación {change['code']}: {change['old_status']} -> {change['status']}"))
+
+    def handle(self, *args, **options):
+        if options['once']:
+            self.run_once()
+            return
+
+        self.stdout.write(self.style.SUCCESS('Iniciando motor de transiciones de estado...'))
+        while True:
+            try:
+                self.run_once()
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING('\nDeteniendo motor de transiciones...'))
+                break
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Error: {e}'))
+                time.sleep(options['interval'])
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:17
+
+import django.db.models.deletion
+from datetime import timedelta
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_room_nights(apps, schema_editor):
+    """Pobla el índice de noches con las reservas y bloqueos existentes"""
+    Reservation = apps.get_model('reservations', 'Reservation')
+    ReservationRoom = apps.get_model('reservations', 'ReservationRoom')
+    RoomNight = apps.get_model('reservations', 'RoomNight')
+    BlockedRoom = apps.get_model('mantenimiento', 'BlockedRoom')
+
+    assigned = {}
+    for reservation_id, room_code in ReservationRoom.objects.values_list('reservation_id', 'room_code'):
+        assigned.setdefault(reservation_id, set()).add(str(room_code or '').strip())
+
+    rows = []
+    for r in Reservation.objects.exclude(status='Cancelada'):
+        if not r.check_in or not r.check_out:
+            continue
+        codes = set(assigned.get(r.pk, set()))
+        if r.room_label:
+            codes.add(str(r.room_label).strip())
+        codes.discard('')
+        nights = max((r.check_out - r.check_in).days, 1)
+        for code in codes:
+            for i in range(nights):
+                rows.append(RoomNight(room_code=code, date=r.check_in + timedelta(days=i), reservation_id=r.pk))
+
+    for br in BlockedRoom.objects.all():
+        code = str(br.room or '').strip()
+        if not code or not br.blocked_until:
+            continue
+        d = timezone.localtime(br.created_at).date() if br.created_at else br.blocked_until
+        while d <= br.blocked_until:
+            rows.append(RoomNight(room_code=code, date=d, blocked_room_id=br.pk))
+            d += timedelta(days=1)
+
+    RoomNight.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mantenimiento', '0001_initial'),
+        ('reservations', '0013_reservation_departure_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room_code', models.CharField(max_length=100)),
+                ('date', models.DateField()),
+                ('blocked_room', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='room_nights', to='mantenimiento.blockedroom')),
+                ('reservation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='room_nights', to='reservations.reservation')),
+            ],
+            options={
+                'db_table': 'room_nights',
+                'ordering': ['date', 'room_code'],
+                'indexes': [models.Index(fields=['date', 'room_code'], name='room_nights_date_room_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_room_nights, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:18
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_active_reservations_due(apps, schema_editor):
+    """Marca las reservas activas como vencidas para que el motor calcule su próxima transición"""
+    Reservation = apps.get_model('reservations', 'Reservation')
+    Reservation.objects.exclude(status='Cancelada').update(next_status_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0014_roomnight'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='next_status_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(mark_active_reservations_due, migrations.RunPython.noop),
+    ]
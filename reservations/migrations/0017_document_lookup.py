@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0016_reservation_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentLookup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(max_length=10)),
+                ('number', models.CharField(max_length=20)),
+                ('found', models.BooleanField(default=True)),
+                ('name', models.CharField(blank=True, max_length=255, null=True)),
+                ('message', models.CharField(blank=True, max_length=255, null=True)),
+                ('payload', models.JSONField(blank=True, null=True)),
+                ('fetched_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'document_lookups',
+                'unique_together': {('doc_type', 'number')},
+            },
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from .status_engine import next_transition_at
+from sequences import allocator as sequence_allocator
 
 
 class Reservation(models.Model):
@@ -31,17 +33,28 @@ class Reservation(models.Model):
     business_condition = models.CharField(max_length=50, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Próximo instante en que el estado automático cambia (ver status_engine)
+    next_status_at = models.DateTimeField(blank=True, null=True, db_index=True)
 
     def save(self, *args, **kwargs):
-        creating = not self.pk
+        if not self.pk and not self.reservation_id:
+            self.reservation_id = sequence_allocator.next_reservation_id()
+        self.next_status_at = next_transition_at(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'next_status_at' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['next_status_at']
         super().save(*args, **kwargs)
-        if creating and not self.reservation_id:
-            self.reservation_id = f"RES-{self.pk:03d}"
-            super().save(update_fields=['reservation_id'])
 
     class Meta:
         db_table = 'reservations'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='reservations_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='reservations_status_idx'),
+            models.Index(fields=['channel', 'created_at'], name='reservations_channel_idx'),
+            models.Index(fields=['paid', 'created_at'], name='reservations_paid_idx'),
+            models.Index(fields=['check_in', 'check_out'], name='reservations_stay_idx'),
+        ]
 
     def __str__(self):
         return f"{self.reservation_id} - {self.guest_name}"
@@ -106,3 +119,40 @@ class DayNote(models.Model):
 
     def __str__(self):
         return f"{self.date}"
+
+
+class RoomNight(models.Model):
+    """Índice de ocupación: una fila por habitación y noche ocupada o bloqueada"""
+    room_code = models.CharField(max_length=100)
+    date = models.DateField()
+    reservation = models.ForeignKey(Reservation, related_name='room_nights', on_delete=models.CASCADE, blank=True, null=True)
+    blocked_room = models.ForeignKey('mantenimiento.BlockedRoom', related_name='room_nights', on_delete=models.CASCADE, blank=True, null=True)
+
+    class Meta:
+        db_table = 'room_nights'
+        ordering = ['date', 'room_code']
+        indexes = [
+            models.Index(fields=['date', 'room_code'], name='room_nights_date_room_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.room_code} - {self.date}"
+
+
+class DocumentLookup(models.Model):
+    """Caché persistente de consultas de DNI/RUC/CE al proveedor externo (ver document_lookup.py)"""
+    doc_type = models.CharField(max_length=10)
+    number = models.CharField(max_length=20)
+    found = models.BooleanField(default=True)
+    name = models.CharField(max_length=255, blank=True, null=True)
+    message = models.CharField(max_length=255, blank=True, null=True)
+    payload = models.JSONField(blank=True, null=True)
+    fetched_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'document_lookups'
+        unique_together = ('doc_type', 'number')
+
+    def __str__(self):
+        return f"{self.doc_type} {self.number}"
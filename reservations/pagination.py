@@ -0,0 +1,54 @@
+"""
+Paginación por cursor (keyset) sobre (campo de fecha, id), de más reciente a más antiguo.
+
+El cursor es opaco para el cliente: codifica el valor del campo y el id de la
+última fila devuelta. Cada página se resuelve con una consulta indexada
+independiente de cuántas filas haya antes.
+"""
+import base64
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, maximum))
+
+
+def encode_cursor(value, pk):
+    raw = f"{value.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Devuelve (datetime, id) o lanza ValueError si el cursor no es válido"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        value, pk = raw.rsplit('|', 1)
+        dt = parse_datetime(value)
+        if dt is None:
+            raise ValueError(value)
+        return dt, int(pk)
+    except Exception as e:
+        raise ValueError(f'Cursor inválido: {cursor}') from e
+
+
+def paginate_keyset(qs, cursor=None, limit=DEFAULT_PAGE_SIZE, field='created_at'):
+    """Devuelve (filas, next_cursor) ordenando por -field, -id"""
+    qs = qs.order_by(f'-{field}', '-id')
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        qs = qs.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk}))
+    rows = list(qs[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return rows, next_cursor
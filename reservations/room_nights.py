@@ -0,0 +1,119 @@
+"""
+Índice de ocupación por habitación y noche (tabla room_nights).
+
+Cada reserva no cancelada se expande en una fila por habitación y noche
+(check_in <= noche < check_out) y cada bloqueo en una fila por noche desde
+su creación hasta blocked_until. La disponibilidad de un rango de fechas se
+resuelve con una sola consulta indexada sobre (date, room_code).
+"""
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import Reservation, Room, RoomNight
+
+
+def _date_range(start, end):
+    d = start
+    while d < end:
+        yield d
+        d += timedelta(days=1)
+
+
+def reservation_nights(reservation):
+    """Noches ocupadas por una reserva. Las reservas de un solo día ocupan su fecha de check-in."""
+    ci = reservation.check_in
+    co = reservation.check_out
+    if not ci or not co:
+        return []
+    if co <= ci:
+        return [ci]
+    return list(_date_range(ci, co))
+
+
+def reservation_room_codes(reservation):
+    """Códigos de habitación de una reserva (habitación principal + asignadas)"""
+    codes = set()
+    if reservation.room_label:
+        codes.add(str(reservation.room_label).strip())
+    for code in reservation.assigned_rooms.values_list('room_code', flat=True):
+        if code:
+            codes.add(str(code).strip())
+    codes.discard('')
+    return codes
+
+
+def block_nights(blocked_room):
+    """Noches bloqueadas: desde la fecha de creación del bloqueo hasta blocked_until (inclusive)"""
+    if not blocked_room.blocked_until:
+        return []
+    start = timezone.localtime(blocked_room.created_at).date() if blocked_room.created_at else timezone.localdate()
+    return list(_date_range(start, blocked_room.blocked_until + timedelta(days=1)))
+
+
+@transaction.atomic
+def rebuild_reservation_nights(reservation):
+    """Reconstruye las noches de una reserva en el índice"""
+    RoomNight.objects.filter(reservation_id=reservation.pk).delete()
+    if (reservation.status or '').lower() == 'cancelada':
+        return 0
+    rows = [
+        RoomNight(room_code=code, date=d, reservation_id=reservation.pk)
+        for code in reservation_room_codes(reservation)
+        for d in reservation_nights(reservation)
+    ]
+    RoomNight.objects.bulk_create(rows)
+    return len(rows)
+
+
+@transaction.atomic
+def rebuild_block_nights(blocked_room):
+    """Reconstruye las noches de un bloqueo en el índice"""
+    RoomNight.objects.filter(blocked_room_id=blocked_room.pk).delete()
+    code = str(blocked_room.room or '').strip()
+    if not code:
+        return 0
+    rows = [
+        RoomNight(room_code=code, date=d, blocked_room_id=blocked_room.pk)
+        for d in block_nights(blocked_room)
+    ]
+    RoomNight.objects.bulk_create(rows)
+    return len(rows)
+
+
+@transaction.atomic
+def rebuild_all():
+    """Reconstruye el índice completo desde reservas y bloqueos"""
+    from mantenimiento.models import BlockedRoom
+
+    RoomNight.objects.all().delete()
+    total = 0
+    for reservation in Reservation.objects.exclude(status='Cancelada').prefetch_related('assigned_rooms'):
+        total += rebuild_reservation_nights(reservation)
+    for blocked_room in BlockedRoom.objects.all():
+        total += rebuild_block_nights(blocked_room)
+    return total
+
+
+def _nights_in_range(check_in, check_out):
+    # Un rango vacío (check_in == check_out) consulta al menos la noche de check_in
+    if check_out <= check_in:
+        check_out = check_in + timedelta(days=1)
+    return RoomNight.objects.filter(date__gte=check_in, date__lt=check_out)
+
+
+def occupied_room_codes(check_in, check_out):
+    """Códigos ocupados por reservas en el rango [check_in, check_out)"""
+    qs = _nights_in_range(check_in, check_out).filter(reservation__isnull=False)
+    return set(qs.values_list('room_code', flat=True).distinct())
+
+
+def blocked_room_codes(check_in, check_out):
+    """Códigos bloqueados por mantenimiento en el rango [check_in, check_out)"""
+    qs = _nights_in_range(check_in, check_out).filter(blocked_room__isnull=False)
+    return set(qs.values_list('room_code', flat=True).distinct())
+
+
+def available_rooms_qs(check_in, check_out):
+    """Habitaciones libres en el rango, resuelto con una sola consulta"""
+    taken = _nights_in_range(check_in, check_out).values('room_code')
+    return Room.objects.exclude(code__in=taken).order_by('floor', 'code')
@@ -0,0 +1,59 @@
+"""
+Servicio compartido de estado de habitaciones (Disponible, Ocupada, Bloqueada).
+
+Calcula los códigos bloqueados y ocupados con consultas agregadas y aplica los
+cambios con un UPDATE por estado, en lugar de un save() por habitación.
+"""
+from django.db import transaction
+from .models import Reservation, ReservationRoom, Room
+
+
+def blocked_codes(today=None):
+    """Habitaciones con un bloqueo vigente"""
+    from mantenimiento.models import BlockedRoom
+
+    codes = BlockedRoom.active(today).order_by().values_list('room', flat=True)
+    return {str(c).strip() for c in codes if c}
+
+
+def occupied_codes():
+    """Habitaciones de reservas en estado Check-in (principal + asignadas)"""
+    labels = Reservation.objects.filter(status='Check-in').exclude(room_label='').order_by().values_list('room_label', flat=True)
+    assigned = ReservationRoom.objects.filter(reservation__status='Check-in').order_by().values_list('room_code', flat=True)
+    return {str(c).strip() for c in list(labels) + list(assigned) if c}
+
+
+def compute_room_status(code, blocked, occupied):
+    code = str(code).strip()
+    if code in blocked:
+        return 'Bloqueada'
+    if code in occupied:
+        return 'Ocupada'
+    return 'Disponible'
+
+
+@transaction.atomic
+def sync_room_statuses(codes=None, today=None):
+    """Sincroniza el estado de las habitaciones y devuelve las que cambiaron.
+
+    Si se indica `codes`, solo se revisan esas habitaciones. El resultado es una
+    lista de dicts {'code', 'old_status', 'status'}.
+    """
+    blocked = blocked_codes(today)
+    occupied = occupied_codes()
+
+    rooms = Room.objects.all()
+    if codes is not None:
+        rooms = rooms.filter(code__in=[str(c).strip() for c in codes])
+
+    changes = []
+    by_status = {}
+    for code, old_status in rooms.values_list('code', 'status'):
+        new_status = compute_room_status(code, blocked, occupied)
+        if old_status != new_status:
+            changes.append({'code': code, 'old_status': old_status, 'status': new_status})
+            by_status.setdefault(new_status, []).append(code)
+
+    for new_status, changed_codes in by_status.items():
+        Room.objects.filter(code__in=changed_codes).update(status=new_status)
+    return changes
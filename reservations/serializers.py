@@ -25,7 +25,7 @@ class ReservationSerializer(serializers.ModelSerializer):
             'channel': data['channel'],
             'guest': data['guest_name'],
             'room': data['room_label'],
-            'rooms': self.get_rooms(instance),
+            'rooms': data['rooms'],
             'checkIn': data['check_in'],
             'checkOut': data['check_out'],
             'total': f"S/ {data['total_amount']}",
@@ -39,7 +39,7 @@ class ReservationSerializer(serializers.ModelSerializer):
             'numAdults': data.get('num_adults'),
             'numChildren': data.get('num_children'),
             'numRooms': data.get('num_rooms'),
-            'companions': self.get_companions(instance),
+            'companions': data['companions'],
             'address': data.get('address'),
             'department': data.get('department'),
             'province': data.get('province'),
@@ -50,6 +50,7 @@ class ReservationSerializer(serializers.ModelSerializer):
             'businessCondition': data.get('business_condition'),
         }
 
+    # companions y assigned_rooms se leen con .all() para aprovechar prefetch_related
     def get_companions(self, instance):
         items = []
         for c in instance.companions.all():
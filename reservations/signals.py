@@ -0,0 +1,37 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from mantenimiento.models import BlockedRoom
+from .models import Reservation, ReservationRoom
+from . import room_nights
+
+# Campos de Reservation que afectan al índice de noches ocupadas
+NIGHT_FIELDS = {'check_in', 'check_out', 'room_label', 'status'}
+
+
+@receiver(post_save, sender=Reservation)
+def reservation_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not NIGHT_FIELDS.intersection(update_fields):
+        return
+    room_nights.rebuild_reservation_nights(instance)
+
+
+@receiver(post_save, sender=ReservationRoom)
+def reservation_room_saved(sender, instance, **kwargs):
+    room_nights.rebuild_reservation_nights(instance.reservation)
+
+
+@receiver(post_delete, sender=ReservationRoom)
+def reservation_room_deleted(sender, instance, origin=None, **kwargs):
+    # En un borrado en cascada de la reserva, sus noches se eliminan con ella
+    if isinstance(origin, Reservation):
+        return
+    try:
+        reservation = Reservation.objects.get(pk=instance.reservation_id)
+    except Reservation.DoesNotExist:
+        return
+    room_nights.rebuild_reservation_nights(reservation)
+
+
+@receiver(post_save, sender=BlockedRoom)
+def blocked_room_saved(sender, instance, **kwargs):
+    room_nights.rebuild_block_nights(instance)
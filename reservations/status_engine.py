@@ -0,0 +1,154 @@
+"""
+Motor de transiciones de estado de reservas.
+
+El estado automático de una reserva (Confirmada -> Check-in -> Check-out) solo
+cambia en instantes concretos derivados de check_in, arrival_time, check_out y
+departure_time. Cada reserva guarda en next_status_at el próximo de esos
+instantes, de modo que el motor solo procesa las transiciones vencidas.
+"""
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.utils import timezone
+
+
+def get_auto_status(reservation, now=None):
+    """Calcula el estado automático basado en fechas y horas (igual que el frontend)"""
+    s = reservation.status
+    if s and s.lower() == 'cancelada':
+        return 'Cancelada'
+
+    ci = reservation.check_in
+    co = reservation.check_out
+    if not ci or not co:
+        return s or 'Confirmada'
+
+    now = timezone.localtime(now) if now else timezone.localtime()
+    today = now.date()
+    now_hm = now.strftime('%H:%M')
+
+    arr_time = reservation.arrival_time
+    arr_hm = arr_time.strftime('%H:%M') if arr_time else ''
+    dep_time = reservation.departure_time
+    dep_hm = dep_time.strftime('%H:%M') if dep_time else ''
+
+    # Antes del check-in
+    if today < ci:
+        return 'Confirmada'
+
+    # Si hay hora de salida configurada
+    if dep_hm:
+        if today < co:
+            if today >= ci:
+                if today == ci and arr_hm and now_hm < arr_hm:
+                    return 'Confirmada'
+                return 'Check-in'
+            return 'Confirmada'
+
+        if today >= co:
+            if today == co:
+                if now_hm >= dep_hm:
+                    return 'Check-out'
+                else:
+                    return 'Check-in'
+            return 'Check-out'
+
+    # Si NO hay hora de salida configurada
+    if ci == co:
+        if today < ci:
+            return 'Confirmada'
+        if today == ci:
+            if arr_hm and now_hm < arr_hm:
+                return 'Confirmada'
+            return 'Check-in'
+        if today > ci:
+            return 'Check-out'
+    else:
+        if today == ci:
+            if arr_hm and now_hm < arr_hm:
+                return 'Confirmada'
+            return 'Check-in'
+        if today > ci and today < co:
+            return 'Check-in'
+        if today >= co:
+            return 'Check-out'
+
+    return 'Check-in'
+
+
+def _local_datetime(d, t=None):
+    t = time(t.hour, t.minute) if t else time(0, 0)
+    return timezone.make_aware(datetime.combine(d, t), timezone.get_current_timezone())
+
+
+def _breakpoints(reservation):
+    """Instantes en los que el estado automático puede cambiar"""
+    ci = reservation.check_in
+    co = reservation.check_out
+    points = {
+        _local_datetime(ci),
+        _local_datetime(ci + timedelta(days=1)),
+        _local_datetime(co),
+        _local_datetime(co + timedelta(days=1)),
+    }
+    if reservation.arrival_time:
+        points.add(_local_datetime(ci, reservation.arrival_time))
+    if reservation.departure_time:
+        points.add(_local_datetime(co, reservation.departure_time))
+    return sorted(points)
+
+
+def next_transition_at(reservation, now=None):
+    """Próximo instante en que el estado guardado dejará de coincidir con el automático.
+
+    Devuelve None si la reserva ya no tendrá más transiciones (cancelada o con
+    check-out), y `now` si el estado guardado ya está desfasado.
+    """
+    if (reservation.status or '').lower() == 'cancelada':
+        return None
+    if not reservation.check_in or not reservation.check_out:
+        return None
+    now = now or timezone.now()
+    current = reservation.status
+    if get_auto_status(reservation, now) != current:
+        return now
+    for point in _breakpoints(reservation):
+        if point > now and get_auto_status(reservation, point) != current:
+            return point
+    return None
+
+
+def apply_due_transitions(now=None):
+    """Aplica las transiciones vencidas y devuelve las reservas modificadas.
+
+    Cada reserva se actualiza con un UPDATE condicionado al estado y al
+    next_status_at leídos: si otro proceso (el cron, otra petición o una
+    edición manual) la cambió entretanto, la fila no coincide y se deja tal cual.
+    Como update() no dispara post_save, aquí mismo se sincronizan las
+    habitaciones afectadas y se invalida el contexto del chatbot.
+    """
+    from chatbot import context as chatbot_context
+    from . import room_status
+    from .models import Reservation, ReservationRoom
+
+    now = now or timezone.now()
+    due = Reservation.objects.filter(next_status_at__lte=now).exclude(status='Cancelada')
+    changed = []
+    for res in due:
+        new_status = get_auto_status(res, now)
+        old_status, old_next = res.status, res.next_status_at
+        res.status = new_status
+        res.next_status_at = next_transition_at(res, now)
+        updated = Reservation.objects.filter(
+            pk=res.pk, status=old_status, next_status_at=old_next
+        ).update(status=res.status, next_status_at=res.next_status_at)
+        if updated and old_status != new_status:
+            changed.append(res)
+
+    if changed:
+        codes = {res.room_label for res in changed if res.room_label}
+        codes.update(
+            ReservationRoom.objects.filter(reservation__in=changed).values_list('room_code', flat=True)
+        )
+        room_status.sync_room_statuses(codes=codes)
+        transaction.on_commit(chatbot_context.invalidate)
+    return changed
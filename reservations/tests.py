@@ -1,3 +1,146 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from . import document_lookup, status_engine, views
+from chatbot import context as chatbot_context
+from .models import Reservation, ReservationRoom, Companion, Room, DocumentLookup
 
-# Create your tests here.
+
+class ListReservationsQueryCountTests(TestCase):
+    def _create_reservations(self, count):
+        for i in range(count):
+            reservation = Reservation.objects.create(
+                channel='Venta Directa',
+                guest_name=f'Huésped {i}',
+                room_label='111',
+                check_in=date(2030, 1, 1),
+                check_out=date(2030, 1, 3),
+            )
+            ReservationRoom.objects.create(reservation=reservation, room_code='112')
+            Companion.objects.create(reservation=reservation, name=f'Acompañante {i}')
+
+    def _list(self):
+        response = self.client.get('/api/reservations/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['reservations']
+
+    def test_query_count_does_not_grow_with_reservations(self):
+        self._create_reservations(2)
+        with self.assertNumQueries(3):
+            self.assertEqual(len(self._list()), 2)
+
+        self._create_reservations(8)
+        with self.assertNumQueries(3):
+            data = self._list()
+        self.assertEqual(len(data), 10)
+        self.assertEqual(data[0]['rooms'], ['112'])
+        self.assertEqual(len(data[0]['companions']), 1)
+
+
+class StatusTransitionTests(TestCase):
+    def setUp(self):
+        self.reservation = Reservation.objects.create(
+            channel='Venta Directa',
+            guest_name='Huésped',
+            room_label='111',
+            check_in=date(2030, 1, 1),
+            check_out=date(2030, 1, 3),
+        )
+        self.now = timezone.make_aware(datetime(2030, 1, 1, 12, 0))
+
+    def test_applies_due_transition_once(self):
+        changed = status_engine.apply_due_transitions(self.now)
+        self.assertEqual([res.pk for res in changed], [self.reservation.pk])
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'Check-in')
+        self.assertGreater(self.reservation.next_status_at, self.now)
+        self.assertEqual(status_engine.apply_due_transitions(self.now), [])
+
+    def test_transition_syncs_rooms_and_invalidates_chatbot_context(self):
+        Room.objects.create(code='111', floor=1, status='Disponible')
+        Room.objects.create(code='112', floor=1, status='Disponible')
+        Room.objects.create(code='113', floor=1, status='Disponible')
+        ReservationRoom.objects.create(reservation=self.reservation, room_code='112')
+        version = chatbot_context.get_version()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            status_engine.apply_due_transitions(self.now)
+        self.assertIn(chatbot_context.invalidate, callbacks)
+        self.assertGreater(chatbot_context.get_version(), version)
+        statuses = dict(Room.objects.values_list('code', 'status'))
+        self.assertEqual(statuses, {'111': 'Ocupada', '112': 'Ocupada', '113': 'Disponible'})
+
+    def test_concurrent_change_is_not_overwritten(self):
+        real = status_engine.get_auto_status
+
+        def cancel_meanwhile(reservation, now=None):
+            # Otro proceso cancela la reserva después de que el motor la leyó
+            Reservation.objects.filter(pk=reservation.pk).update(status='Cancelada', next_status_at=None)
+            return real(reservation, now)
+
+        with mock.patch.object(status_engine, 'get_auto_status', side_effect=cancel_meanwhile):
+            changed = status_engine.apply_due_transitions(self.now)
+        self.assertEqual(changed, [])
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'Cancelada')
+
+
+@override_settings(LOOKUP_PROVIDER='reservations.document_lookup.StubProvider')
+class DocumentLookupTests(TestCase):
+    def setUp(self):
+        document_lookup.get_provider.cache_clear()
+        self.addCleanup(document_lookup.get_provider.cache_clear)
+
+    def fetches(self):
+        return mock.patch.object(
+            document_lookup.StubProvider, 'fetch', autospec=True, side_effect=document_lookup.StubProvider.fetch
+        )
+
+    def test_repeat_lookup_is_served_from_cache(self):
+        with self.fetches() as fetch:
+            first = document_lookup.lookup('dni', '12345678')
+            second = document_lookup.lookup('DNI', ' 1234 5678 ')
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual((first['cached'], second['cached']), (False, True))
+        self.assertEqual(second['name'], 'HUESPED DE PRUEBA 12345678')
+
+    def test_missing_document_is_negatively_cached(self):
+        with self.fetches() as fetch:
+            first = document_lookup.lookup('RUC', '00001234567')
+            second = document_lookup.lookup('RUC', '00001234567')
+        self.assertEqual(fetch.call_count, 1)
+        self.assertFalse(first['found'])
+        self.assertTrue(second['cached'])
+        entry = DocumentLookup.objects.get(doc_type='RUC', number='00001234567')
+        self.assertLess(entry.expires_at, timezone.now() + timedelta(days=1))
+
+    def test_expired_entry_is_fetched_again(self):
+        document_lookup.lookup('CE', 'AB123')
+        DocumentLookup.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        with self.fetches() as fetch:
+            result = document_lookup.lookup('CE', 'AB123')
+        self.assertEqual(fetch.call_count, 1)
+        self.assertFalse(result['cached'])
+        self.assertGreater(DocumentLookup.objects.get().expires_at, timezone.now())
+
+    def test_provider_errors_are_not_stored(self):
+        error = document_lookup.ProviderError('Tiempo de espera agotado')
+        with mock.patch.object(document_lookup.StubProvider, 'fetch', side_effect=error):
+            with self.assertRaises(document_lookup.ProviderError):
+                document_lookup.lookup('DNI', '12345678')
+        self.assertFalse(DocumentLookup.objects.exists())
+
+    def test_invalid_numbers_are_rejected_before_the_provider(self):
+        invalid = [('DNI', '1234567'), ('DNI', '123456789'), ('RUC', '2060123456X'),
+                   ('CE', 'ABC-123'), ('CE', 'A' * 13), ('DNI', '12345678/../x')]
+        with self.fetches() as fetch:
+            for doc_type, number in invalid:
+                with self.subTest(doc_type=doc_type, number=number):
+                    request = APIRequestFactory().get('/', {'type': doc_type, 'number': number})
+                    request.firebase_user = {'uid': 'u1', 'email': 'test@hotel.pe'}
+                    self.assertEqual(views.lookup_document(request).status_code, 400)
+                    with self.assertRaises(ValueError):
+                        document_lookup.lookup(doc_type, number)
+        fetch.assert_not_called()
+        self.assertFalse(DocumentLookup.objects.exists())
@@ -3,13 +3,9 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import Reservation, Room, ReservationRoom, DayNote
 from .serializers import ReservationSerializer
+from . import room_nights, pagination, document_lookup
 from django.utils.dateparse import parse_date, parse_time
 from .models import Companion
-import os
-import json
-from urllib.request import Request, urlopen
-from urllib.error import URLError, HTTPError
-from django.conf import settings
 from django.db.models import Sum
 
 
@@ -18,46 +14,49 @@ def list_reservations(request):
     if not hasattr(request, 'firebase_user'):
         return Response({'error': 'Usuario no autenticado'}, status=status.HTTP_401_UNAUTHORIZED)
     
-    # Sincronizar estados de reservas y habitaciones antes de devolverlas
-    from django.utils import timezone
-    from mantenimiento.models import BlockedRoom
-    
-    # Sincronizar estados de reservas
-    active_reservations = Reservation.objects.exclude(status='Cancelada')
-    for res in active_reservations:
-        # Importar función de sincronización del dashboard
-        from dashboard.views import sync_reservation_status
-        sync_reservation_status(res)
-    
-    # Sincronizar estados de habitaciones
-    today = timezone.localtime().date()
-    blocked_rooms = set()
-    for br in BlockedRoom.objects.filter(blocked_until__gte=today):
-        blocked_rooms.add(str(br.room).strip())
-    
-    occupied_rooms = set()
-    checkin_reservations = Reservation.objects.filter(status='Check-in')
-    for res in checkin_reservations:
-        if res.room_label:
-            occupied_rooms.add(str(res.room_label).strip())
-        for ar in res.assigned_rooms.all():
-            occupied_rooms.add(str(ar.room_code).strip())
+    # Los estados los mantiene el motor de transiciones (sync_reservation_statuses)
+    qs = Reservation.objects.all()
     
-    for room in Room.objects.all():
-        room_code = str(room.code).strip()
-        if room_code in blocked_rooms:
-            new_status = 'Bloqueada'
-        elif room_code in occupied_rooms:
-            new_status = 'Ocupada'
-        else:
-            new_status = 'Disponible'
-        if room.status != new_status:
-            room.status = new_status
-            room.save(update_fields=['status'])
+    # Filtros: status, channel, from/to (estadía), paid, guest
+    status_param = request.GET.get('status')
+    if status_param:
+        qs = qs.filter(status__in=[s.strip() for s in status_param.split(',') if s.strip()])
+    channel = request.GET.get('channel')
+    if channel:
+        qs = qs.filter(channel=channel)
+    date_from = request.GET.get('from')
+    date_to = request.GET.get('to')
+    if date_from or date_to:
+        try:
+            df = parse_date(date_from) if date_from else None
+            dt = parse_date(date_to) if date_to else None
+        except ValueError:
+            # Fechas bien formadas pero imposibles (p. ej. 2024-02-30)
+            df = dt = None
+        if (date_from and not df) or (date_to and not dt):
+            return Response({'error': 'Fechas inválidas'}, status=status.HTTP_400_BAD_REQUEST)
+        if df:
+            qs = qs.filter(check_out__gte=df)
+        if dt:
+            qs = qs.filter(check_in__lte=dt)
+    paid = request.GET.get('paid')
+    if paid is not None and paid != '':
+        qs = qs.filter(paid=paid.lower() in ('1', 'true', 'si', 'sí'))
+    guest = (request.GET.get('guest') or '').strip()
+    if guest:
+        qs = qs.filter(guest_name__icontains=guest)
     
-    qs = Reservation.objects.all()
-    data = ReservationSerializer(qs, many=True).data
-    return Response({'reservations': data})
+    limit = pagination.parse_limit(request.GET.get('limit'))
+    try:
+        page, next_cursor = pagination.paginate_keyset(
+            qs.prefetch_related('companions', 'assigned_rooms'),
+            cursor=request.GET.get('cursor'),
+            limit=limit,
+        )
+    except ValueError:
+        return Response({'error': 'Cursor inválido'}, status=status.HTTP_400_BAD_REQUEST)
+    data = ReservationSerializer(page, many=True).data
+    return Response({'reservations': data, 'nextCursor': next_cursor})
 
 
 @api_view(['POST'])
@@ -290,43 +289,13 @@ def available_rooms(request):
     if not check_in or not check_out:
         return Response({'error': 'Fechas inválidas'}, status=status.HTTP_400_BAD_REQUEST)
     
-    occupied = set()
-    for r in Reservation.objects.all():
-        if not r.check_in or not r.check_out:
-            continue
-        # Excluir reservas canceladas
-        if (r.status or '').lower() == 'cancelada':
-            continue
-        if r.check_in < check_out and r.check_out > check_in:
-            if r.room_label:
-                occupied.add(str(r.room_label).strip())
-            for ar in r.assigned_rooms.all():
-                occupied.add(str(ar.room_code).strip())
-    
-    # Obtener habitaciones bloqueadas durante el rango de fechas
-    from django.utils import timezone
-    from mantenimiento.models import BlockedRoom
-    blocked = set()
-    # Verificar habitaciones bloqueadas que se solapan con el rango de fechas
-    # Una habitación está bloqueada si blocked_until >= check_in (aún está bloqueada cuando comienza la reserva)
-    for br in BlockedRoom.objects.filter(blocked_until__gte=check_in):
-        blocked.add(str(br.room).strip())
-    
+    # Disponibilidad resuelta sobre el índice de noches ocupadas (room_nights)
     items = []
-    all_rooms = Room.objects.all()
-    total_rooms_count = all_rooms.count()
-    
-    # Debug: convertir todos los códigos a strings para comparación consistente
-    occupied_str = {str(code).strip() for code in occupied}
-    blocked_str = {str(code).strip() for code in blocked}
-    
-    for rm in all_rooms:
-        room_code_str = str(rm.code).strip()
-        if room_code_str not in occupied_str and room_code_str not in blocked_str:
-            items.append({'code': rm.code, 'floor': rm.floor, 'type': rm.type})
+    for rm in room_nights.available_rooms_qs(check_in, check_out):
+        items.append({'code': rm.code, 'floor': rm.floor, 'type': rm.type})
     
     # Si no hay habitaciones en total, puede ser que la migración no se ejecutó
-    if total_rooms_count == 0:
+    if not items and not Room.objects.exists():
         return Response({
             'rooms': [],
             'debug': {
@@ -335,14 +304,18 @@ def available_rooms(request):
             }
         })
     
+    debug = None
+    if request.GET.get('debug') == 'true':
+        debug = {
+            'total_rooms': Room.objects.count(),
+            'available': len(items),
+            'occupied': list(room_nights.occupied_room_codes(check_in, check_out)),
+            'blocked': list(room_nights.blocked_room_codes(check_in, check_out)),
+        }
+    
     return Response({
         'rooms': items,
-        'debug': {
-            'total_rooms': total_rooms_count,
-            'available': len(items),
-            'occupied': list(occupied_str),
-            'blocked': list(blocked_str)
-        } if request.GET.get('debug') == 'true' else None
+        'debug': debug
     })
 
 @api_view(['GET'])
@@ -351,41 +324,7 @@ def all_rooms(request):
     if not hasattr(request, 'firebase_user'):
         return Response({'error': 'Usuario no autenticado'}, status=status.HTTP_401_UNAUTHORIZED)
     
-    # Sincronizar estados de habitaciones antes de devolverlas
-    from django.utils import timezone
-    from mantenimiento.models import BlockedRoom
-    
-    today = timezone.localtime().date()
-    
-    # Obtener habitaciones bloqueadas actualmente
-    blocked_rooms = set()
-    for br in BlockedRoom.objects.filter(blocked_until__gte=today):
-        blocked_rooms.add(str(br.room).strip())
-    
-    # Obtener habitaciones ocupadas (reservas con estado Check-in)
-    occupied_rooms = set()
-    checkin_reservations = Reservation.objects.filter(status='Check-in')
-    for res in checkin_reservations:
-        if res.room_label:
-            occupied_rooms.add(str(res.room_label).strip())
-        for ar in res.assigned_rooms.all():
-            occupied_rooms.add(str(ar.room_code).strip())
-    
-    # Actualizar estado de cada habitación
-    for room in Room.objects.all():
-        room_code = str(room.code).strip()
-        
-        if room_code in blocked_rooms:
-            new_status = 'Bloqueada'
-        elif room_code in occupied_rooms:
-            new_status = 'Ocupada'
-        else:
-            new_status = 'Disponible'
-        
-        if room.status != new_status:
-            room.status = new_status
-            room.save(update_fields=['status'])
-    
+    # Los estados de habitaciones los mantiene el motor de transiciones
     # Devolver habitaciones con su estado actualizado
     items = []
     for rm in Room.objects.all().order_by('floor', 'code'):
@@ -405,51 +344,20 @@ def lookup_document(request):
     number = request.GET.get('number') or ''
     if not doc_type or not number:
         return Response({'error': 'Parámetros incompletos'}, status=status.HTTP_400_BAD_REQUEST)
-    token = getattr(settings, 'LOOKUP_API_TOKEN', None)
-    urls = {
-        'DNI': os.environ.get('LOOKUP_DNI_URL'),
-        'RUC': os.environ.get('LOOKUP_RUC_URL'),
-        'CE': os.environ.get('LOOKUP_CE_URL'),
-    }
-    url = urls.get(doc_type)
-    if not url:
-        if doc_type == 'DNI':
-            url = f"https://api.factiliza.com/v1/dni/info/{number}"
-        elif doc_type == 'RUC':
-            url = f"https://api.factiliza.com/v1/ruc/info/{number}"
-        elif doc_type == 'CE':
-            url = f"https://api.factiliza.com/v1/cee/info/{number}"
-        else:
-            return Response({'error': 'Proveedor no configurado'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    else:
-        url = url.replace('{number}', number).replace('{dni}', number).replace('{ruc}', number).replace('{cee}', number)
-    headers = {}
-    if token:
-        headers['Authorization'] = f"Bearer {token}"
+    if doc_type not in document_lookup.DOC_TYPES:
+        return Response({'error': 'Proveedor no configurado'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     try:
-        req = Request(url, headers=headers)
-        with urlopen(req) as resp:
-            raw = resp.read().decode('utf-8')
-            payload = json.loads(raw)
-    except HTTPError as e:
-        return Response({'error': f'HTTP {e.code}'}, status=status.HTTP_502_BAD_GATEWAY)
-    except URLError:
-        return Response({'error': 'No se pudo conectar al proveedor'}, status=status.HTTP_502_BAD_GATEWAY)
-    success = bool(payload.get('success'))
-    data = payload.get('data') or {}
-    if not success:
-        return Response({'error': payload.get('message') or 'Consulta fallida'}, status=status.HTTP_400_BAD_REQUEST)
-    if doc_type == 'DNI':
-        name = data.get('nombre_completo') or (
-            ((data.get('nombres') or '') + ' ' + (data.get('apellido_paterno') or '') + ' ' + (data.get('apellido_materno') or '')).strip()
-        )
-    elif doc_type == 'RUC':
-        name = data.get('nombre_o_razon_social')
-    else:
-        name = (
-            ((data.get('nombres') or '') + ' ' + (data.get('apellido_paterno') or '') + ' ' + (data.get('apellido_materno') or '')).strip()
-        )
-    return Response({'name': name, 'raw': payload})
+        number = document_lookup.normalize_number(doc_type, number)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    # Caché persistente + pool de conexiones con timeout (ver document_lookup.py)
+    try:
+        result = document_lookup.lookup(doc_type, number)
+    except document_lookup.ProviderError as e:
+        return Response({'error': str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+    if not result['found']:
+        return Response({'error': result['message'] or 'Consulta fallida'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'name': result['name'], 'raw': result['payload'], 'cached': result['cached']})
 
 
 @api_view(['GET'])
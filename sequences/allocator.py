@@ -0,0 +1,67 @@
+"""
+Asignador de números correlativos respaldado por la base de datos.
+
+Cada secuencia es una fila de la tabla `sequences` que se incrementa bajo
+SELECT ... FOR UPDATE, por lo que dos cajeros concurrentes nunca obtienen el
+mismo número. Opcionalmente cada worker reserva bloques de SEQUENCE_BLOCK_SIZE
+números y los reparte en memoria, con una sola escritura por bloque.
+"""
+import threading
+from django.conf import settings
+from django.utils import timezone
+from django.db import connection, transaction
+from .models import Sequence
+
+TRANSACTION_ID = 'payments.transaction_id'
+RESERVATION_ID = 'reservations.reservation_id'
+RECEIPT_NUMBER = 'receipts.numero'
+LAUNDRY_ORDER = 'lavanderia.order_code'
+
+_blocks = {}
+_lock = threading.Lock()
+
+
+def _block_size():
+    return max(1, int(getattr(settings, 'SEQUENCE_BLOCK_SIZE', 1)))
+
+
+def allocate(name, count=1):
+    """Reserva `count` números consecutivos y devuelve el primero"""
+    with transaction.atomic():
+        seq, _ = Sequence.objects.select_for_update().get_or_create(name=name)
+        first = seq.value + 1
+        seq.value += count
+        seq.save(update_fields=['value', 'updated_at'])
+    return first
+
+
+def next_value(name):
+    """Siguiente número de la secuencia `name`"""
+    size = _block_size()
+    # Dentro de una transacción el incremento podría revertirse: no se cachean bloques
+    if size == 1 or connection.in_atomic_block:
+        return allocate(name)
+    with _lock:
+        current, limit = _blocks.get(name, (1, 0))
+        if current > limit:
+            current = allocate(name, size)
+            limit = current + size - 1
+        _blocks[name] = (current + 1, limit)
+        return current
+
+
+def next_transaction_id():
+    return f"TXN-{str(next_value(TRANSACTION_ID)).zfill(3)}"
+
+
+def next_reservation_id():
+    return f"RES-{next_value(RESERVATION_ID):03d}"
+
+
+def next_receipt_number():
+    return str(next_value(RECEIPT_NUMBER)).zfill(6)
+
+
+def next_laundry_order_code():
+    """Marca de tiempo (formato histórico) + correlativo: única aunque dos envíos caigan en el mismo segundo"""
+    return f"{timezone.now().strftime('%Y%m%d%H%M%S')}-{next_value(LAUNDRY_ORDER)}"
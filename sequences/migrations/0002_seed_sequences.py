@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+def _max_suffix(values, prefix):
+    max_n = 0
+    for value in values:
+        raw = str(value or '')
+        if prefix:
+            if not raw.startswith(prefix):
+                continue
+            raw = raw[len(prefix):]
+        if raw.isdigit():
+            max_n = max(max_n, int(raw))
+    return max_n
+
+
+def seed_sequences(apps, schema_editor):
+    """Arranca cada secuencia después del mayor número ya emitido"""
+    Sequence = apps.get_model('sequences', 'Sequence')
+    Payment = apps.get_model('cajacobros', 'Payment')
+    Receipt = apps.get_model('cajacobros', 'Receipt')
+    Reservation = apps.get_model('reservations', 'Reservation')
+
+    txn = _max_suffix(Payment.objects.values_list('transaction_id', flat=True), 'TXN-')
+    numero = _max_suffix(Receipt.objects.values_list('numero', flat=True), '')
+    # Los RES-xxx se derivaban del pk: se parte del mayor entre ambos
+    res = max(
+        _max_suffix(Reservation.objects.values_list('reservation_id', flat=True), 'RES-'),
+        Reservation.objects.order_by('-pk').values_list('pk', flat=True).first() or 0,
+    )
+    for name, value in (
+        ('payments.transaction_id', txn),
+        ('receipts.numero', numero),
+        ('reservations.reservation_id', res),
+    ):
+        Sequence.objects.update_or_create(name=name, defaults={'value': value})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sequences', '0001_initial'),
+        ('cajacobros', '0002_dailyrevenue'),
+        ('reservations', '0016_reservation_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class Sequence(models.Model):
+    """Contador con nombre para numeraciones correlativas (TXN, RES, recibos)"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'sequences'
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"